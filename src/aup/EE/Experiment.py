@@ -17,16 +17,22 @@ APIs
 import json
 import logging
 import os
+import queue
 import signal
 import sys
 import _thread
 import threading
 import time
+from collections import deque
 
 from ..Proposer import get_proposer, SPECIAL_EXIT_PROPOSERS
+from ..Proposer.ProposerProcess import ProposerProcess
 from .Job import Job
+from .Journal import Journal
+from .ResultCache import ResultCache
 from .Resource import get_resource_manager
 from ..aup import BasicConfig
+from ..metrics import MetricsExporter, PROPOSER_GET, PROPOSER_UPDATE
 from ..utils import set_default_keyvalue, check_missing_key, get_default_connector, get_default_username
 from ..compression.utils import *
 from ..Proposer import ProposerStatus
@@ -59,8 +65,14 @@ class Experiment:
     :type connector: AbstractConnector
     :param auppath: Auptimizer env.ini file folder, default is either ``./.aup`` or ``~/.aup``
     :type auppath: str
-    :param sleep_time: time to pause between jobs
+    :param sleep_time: max time to wait for job updates before handling pending signals in :func:`finish`
     :type sleep_time: int
+    :param eid: experiment ID, to restart an existing experiment
+    :type eid: int
+    :param resume: keep the finished jobs of the experiment ``eid``, to resume it with :func:`resume`
+    :type resume: bool
+    :param scheduler: scheduler granting the resources, when the experiment shares them with others
+    :type scheduler: aup.EE.Scheduler.Scheduler
     """
 
     def __init__(self,
@@ -71,7 +83,9 @@ class Experiment:
                  sleep_time=1,
                  eid=None,
                  start=True,
-                 request_stop_time=5):
+                 request_stop_time=5,
+                 resume=False,
+                 scheduler=None):
         self.sleep_time = sleep_time
         self.fail_safe = False
         self.job_retries = 0
@@ -84,6 +98,10 @@ class Experiment:
         self.request_stop_thr = None
         self.request_stop_time = request_stop_time
         self.submitted = False
+        self.deferred = False  # jobs deferred by the admission control of the resource manager
+        self.scheduler = scheduler
+        self.prefetch_depth = 0
+        self.stale_after = 0
 
         if "job_failure" in self.exp_config:
             set_default_keyvalue("ignore_fail", False, self.exp_config["job_failure"], log=logger)
@@ -91,6 +109,12 @@ class Experiment:
             self.fail_safe = self.exp_config["job_failure"]["ignore_fail"]
             self.job_retries = self.exp_config["job_failure"]["job_retries"]
 
+        if "prefetch" in self.exp_config:
+            set_default_keyvalue("depth", 1, self.exp_config["prefetch"], log=logger)
+            set_default_keyvalue("stale_after", 2, self.exp_config["prefetch"], log=logger)
+            self.prefetch_depth = self.exp_config["prefetch"]["depth"]
+            self.stale_after = self.exp_config["prefetch"]["stale_after"]
+
         if "compression" in self.exp_config:
             self.is_compression_exp = True
             self.exp_config, self.compression_params = translate_compression_config(self.exp_config)
@@ -100,7 +124,14 @@ class Experiment:
         set_default_keyvalue("n_parallel", 1, self.exp_config, log=logger)
         check_missing_key(self.exp_config, "target", "Specify max/min for target", log=logger)
         check_missing_key(self.exp_config, "proposer", "Specify the optimization `proposer`", log=logger)
-        self.proposer = get_proposer(self.exp_config['proposer'])(self.exp_config)
+        history = self._load_history() if "warm_start" in self.exp_config else None
+        if "proposer_process" in self.exp_config:
+            self.proposer = ProposerProcess(self.exp_config, history=history)
+        else:
+            self.proposer = get_proposer(self.exp_config['proposer'])(self.exp_config)
+            if history:
+                self.proposer.warm_start(history)
+        self.result_cache = ResultCache(self.connector, self.exp_config) if "result_cache" in self.exp_config else None
         if "resource_args" in self.exp_config:
             if "early_stop" in self.exp_config["resource_args"]:
                 self.exp_config["resource_args"]["track_intermediate_results"] = True
@@ -110,7 +141,8 @@ class Experiment:
                                                          **self.exp_config["resource_args"],
                                                          workingdir=self.exp_config['workingdir'],
                                                          script=self.exp_config['script'],
-                                                         runtime_args = exp_config.get('runtime_args', {}))
+                                                         runtime_args = exp_config.get('runtime_args', {}),
+                                                         shared=scheduler is not None)
             self.resource_args = self.exp_config["resource_args"]
         else:
             self.resource_manager = get_resource_manager(self.exp_config["resource"], self.connector,
@@ -118,7 +150,8 @@ class Experiment:
                                                          maximize=(self.exp_config["target"] == "max"),
                                                          workingdir=self.exp_config['workingdir'],
                                                          script=self.exp_config['script'],
-                                                         runtime_args = exp_config.get('runtime_args', {}))
+                                                         runtime_args = exp_config.get('runtime_args', {}),
+                                                         shared=scheduler is not None)
         if eid is None:
             if start is True:
                 self.eid = self.resource_manager.connector.start_experiment(self.username, self.exp_config["name"], \
@@ -126,11 +159,30 @@ class Experiment:
             else:
                 self.eid = self.resource_manager.connector.create_experiment(self.username, self.exp_config["name"], \
                                 json.dumps(self.exp_config))
+        elif resume:
+            self.eid = eid
+            self.resource_manager.connector.resume_experiment(self.eid)
         else:
             self.eid = eid
             self.resource_manager.connector.start_experiment_by_eid(self.eid)
         self.resource_manager.eid = self.eid
+        self.journal = Journal(self.eid, self.exp_config["journal"]) if "journal" in self.exp_config else None
         self.pending_jobs = {}
+        self.proposals = deque()  # proposed by batch, but not submitted yet
+        self.retry_jobs = deque()  # failed jobs waiting for a free resource to be retried, kept in pending_jobs
+        self.proposal_times = dict()  # id of fetched proposal -> time, for the queue time of the job
+        self.proposal_results = dict()  # id of fetched proposal -> n_results when fetched, see _check_stale_proposals
+        self.proposal_time = None  # of the latest proposal from :func:`_next_proposal`
+        self.results = queue.Queue()  # (score, jid) of finished jobs, see :func:`update`
+        self.lock = threading.RLock()  # guards pending_jobs, proposals and job submission
+        # guards the calls changing the proposer, taken after self.lock, so the prefetcher computes without self.lock
+        self.proposer_lock = threading.RLock()
+        self.status_changed = threading.Condition(self.lock)
+        self.dispatcher = None
+        self.prefetcher = None
+        self.prefetch_request = threading.Event()
+        self.n_results = 0  # results fed to the proposer, see _check_stale_proposals
+        self.metrics = MetricsExporter(self.exp_config["metrics"]) if "metrics" in self.exp_config else None
         if 'runtime_args' in exp_config:
             self.runtime_args = exp_config['runtime_args']
         else:
@@ -138,6 +190,20 @@ class Experiment:
         logger.info("Experiment %d is created" % self.eid)
         logger.debug("Experiment config is %s" % json.dumps(self.exp_config))
 
+    def _load_history(self):
+        """
+        Load finished jobs of previous experiments for ``warm_start``
+
+        :return: job configurations and scores
+        :rtype: [(dict, float)]
+        """
+        set_default_keyvalue("eids", [], self.exp_config["warm_start"], log=logger)
+        set_default_keyvalue("max_points", 100, self.exp_config["warm_start"], log=logger)
+        eids = self.exp_config["warm_start"]["eids"]
+        history = self.connector.get_finished_jobs(eids, self.exp_config["warm_start"]["max_points"]) if eids else []
+        logger.info("Load %d previous jobs from experiments %s" % (len(history), eids))
+        return history
+
     def add_suspend_signal(self):
         signal.signal(signal.SIGINT, lambda x, y: self._suspend(x, y))
 
@@ -151,63 +217,271 @@ class Experiment:
         :return: job id, best score
         :rtype: (int, float)
         """
-        while self.proposer.get_status() == ProposerStatus.RUNNING:
-            logger.debug("Waiting for proposer")
-            time.sleep(self.sleep_time)
-
-        while len(self.pending_jobs) != 0:
-            # resource manager will prevent experiment shutdown with pending jobs.
-            # but just in case
-            logger.debug("Waiting for pending job")
-            time.sleep(self.sleep_time)
+        with self.status_changed:
+            # woken up by the dispatcher, the timeout only lets the main thread handle signals (e.g. stop requests)
+            while self.proposer.get_status() == ProposerStatus.RUNNING or len(self.pending_jobs) != 0:
+                logger.debug("Waiting for proposer or pending jobs")
+                self.status_changed.wait(self.sleep_time)
+        self._stop_dispatcher()
+        self._stop_prefetcher()
+        if self.journal is not None:
+            self.journal.close()
 
         result = self.resource_manager.finish(status=self.proposer.get_status().name)
         self.connector.close()
+        if self.metrics is not None:
+            self.metrics.log()
+            self.metrics.close()
 
         if self.request_stop_thr is not None:
             self.request_stop_thr.join()
 
         if result is None or len(result) == 0:
             logger.warning("No result so far")
+            self._close_proposer()
             return None, -1
         else:
             logger.info("Finished")
             logger.critical("Best job (%d) with score %f in experiment %d" % (result[0], result[1], self.eid))
             try:
-                self.proposer.save(os.path.join(".", "exp%d.pkl" % self.eid))
+                with self.proposer_lock:
+                    self.proposer.save(os.path.join(".", "exp%d.pkl" % self.eid))
             except NotImplementedError:
                 pass
+            self._close_proposer()
             return result[:2]
 
-    def resume(self, filename):
+    def _close_proposer(self):
+        if isinstance(self.proposer, ProposerProcess):
+            self.proposer.close()
+
+    def resume(self, filename=None):
         """
         Restore previous experiment, previous job during suspension won't be run in this round
 
-        :param filename: filename (saved by pickle as exp%d.pkl)
+        :param filename: filename (saved by pickle as exp%d.pkl),
+            or None to rebuild the proposer from the journal of the experiment (see :mod:`aup.EE.Journal`)
         :type filename: str
         """
-        self.proposer.reload(filename)   # Note: previously failed jobs won't be execute again.
+        if filename is None:
+            self._replay_journal()
+        else:
+            self.proposer.reload(filename)   # Note: previously failed jobs won't be execute again.
         self.start()
 
+    def _replay_journal(self):
+        """
+        Replay the journal of the experiment, the proposals without result are run first
+        """
+        if self.journal is None:
+            raise ValueError("Experiment %d can't be resumed without `journal` in its configuration" % self.eid)
+        convert = None
+        if self.is_compression_exp:
+            convert = lambda proposal: deserialize_compression_proposal(self.exp_config, self.compression_params,
+                                                                        proposal)
+        with self.lock:
+            self.proposals.extend(self.journal.replay(self.proposer, self._make_job, convert=convert))
+            self.proposer.check_termination()
+
+    def _make_job(self, config, jid):
+        job = Job(self.exp_config["script"], BasicConfig(**config), self.exp_config["workingdir"],
+                  retries=self.job_retries)
+        job.jid = jid
+        return job
+
+    def _checkpoint(self):
+        if self.journal is not None:
+            with self.proposer_lock:
+                self.journal.checkpoint(self.proposer)
+
     def start(self):
         """
-        Start experiment
+        Start experiment, or fill up the free slots with new jobs
+        """
+        with self.status_changed:
+            if self.request_stop_thr is None:
+                self.request_stop_thr = threading.Thread(target=self._check_status)
+                self.request_stop_thr.start()
+            if self.dispatcher is None:
+                self.dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+                self.dispatcher.start()
+            if self.prefetcher is None and self.prefetch_depth > 0:
+                self.prefetcher = threading.Thread(target=self._prefetch, daemon=True)
+                self.prefetcher.start()
+            if self.scheduler is not None:
+                # jobs wait for the scheduler to grant resources, see :func:`run_scheduled_job`
+                self.scheduler.notify()
+                self.prefetch_request.set()
+                return
+
+            remaining_jobs = self.proposer.get_remaining_jobs()
+            parallel_jobs = min(remaining_jobs, self.resource_manager.parallel_limit(self.exp_config.n_parallel))
+
+            self.deferred = False
+            self._submit_retries()
+            if self.proposer.get_status() != ProposerStatus.RUNNING:
+                self.status_changed.notify_all()
+                return
+            n_jobs = parallel_jobs - len(self.pending_jobs)
+            self.fetch_proposals(n_jobs)
+            try:
+                for i in range(n_jobs):
+                    if not self.resource_manager.admit(len(self.pending_jobs)):
+                        # retried when a job finishes, or by the dispatcher after sleep_time
+                        self.deferred = True
+                        break
+                    rc = self.submit_job()
+                    self.submitted = self.submitted or rc
+                    if not self.submitted:
+                        logger.fatal("No job is running; quit")
+                        self.proposer.set_status(ProposerStatus.FAILED)
+                        raise Exception("Cannot run experiment!")
+                    elif not rc:
+                        logger.warning("Job submission failed, keep running")
+            finally:
+                self.prefetch_request.set()
+                self.status_changed.notify_all()
+
+    def wanted_jobs(self):
+        """
+        :return: number of jobs the experiment can run now
+        :rtype: int
         """
-        remaining_jobs = self.proposer.get_remaining_jobs()
-        parallel_jobs = min(remaining_jobs, self.exp_config.n_parallel)
+        with self.lock:
+            if self.proposer.get_status() != ProposerStatus.RUNNING:
+                return len(self.retry_jobs)
+            return len(self.retry_jobs) + min(self.proposer.get_remaining_jobs(),
+                       self.resource_manager.parallel_limit(self.exp_config.n_parallel)) - len(self.pending_jobs)
 
-        self.request_stop_thr = threading.Thread(target=self._check_status)
-        self.request_stop_thr.start()
+    def run_scheduled_job(self):
+        """
+        Submit one job, called by the scheduler once a resource is granted to the experiment
 
-        for i in range(parallel_jobs - len(self.pending_jobs)):
-            rc = self.submit_job()
-            self.submitted = self.submitted or rc
-            if not self.submitted:
-                logger.fatal("No job is running; quit")
-                self.proposer.set_status(ProposerStatus.FAILED)
-                raise Exception("Cannot run experiment!")
-            elif not rc:
-                logger.warning("Job submission failed, keep running")
+        :return: True if a new job is running
+        :rtype: bool
+        """
+        with self.status_changed:
+            if not self.resource_manager.admit(len(self.pending_jobs)) or \
+                    self.resource_manager.get_available(self.username, self.exp_config["resource"]) is None:
+                return False
+            if self.retry_jobs:
+                return self._submit_retries() > 0
+            n_jobs = len(self.pending_jobs)
+            try:
+                self.submitted = self.submit_job() or self.submitted
+            finally:
+                self.prefetch_request.set()
+                self.status_changed.notify_all()
+            return len(self.pending_jobs) > n_jobs
+
+    def fetch_proposals(self, n):
+        """
+        Get proposals for up to ``n`` jobs from the proposer in one batch, see :func:`AbstractProposer.get_batch`.
+
+        :param n: number of proposals needed, including those already fetched
+        :type n: int
+        :return: number of new proposals
+        :rtype: int
+        """
+        n = min(n, self.proposer.get_remaining_jobs()) - len(self.proposals)
+        if n <= 0:
+            return 0
+        batch = self._get_batch(n)
+        self._add_proposals(batch, self.n_results)
+        return len(batch)
+
+    def _get_batch(self, n):
+        with PROPOSER_GET.time(call="get_batch"), self.proposer_lock:
+            batch = self.proposer.get_batch(n)
+        if self.is_compression_exp:
+            batch = [deserialize_compression_proposal(self.exp_config, self.compression_params, proposal)
+                     for proposal in batch]
+        return batch
+
+    def _add_proposals(self, batch, n_results):
+        if self.journal is not None and batch:
+            self.journal.proposed(batch)
+        now = time.time()
+        self.proposal_times.update((id(proposal), now) for proposal in batch)
+        self.proposal_results.update((id(proposal), n_results) for proposal in batch)
+        self.proposals.extend(batch)
+
+    def discard_proposals(self, proposals=None):
+        """
+        Give fetched proposals back to the proposer, see :func:`AbstractProposer.discard`
+
+        :param proposals: proposals to discard, all the fetched proposals if None
+        :type proposals: [dict]
+        """
+        proposals = list(self.proposals) if proposals is None else proposals
+        if proposals:
+            logger.debug("Discard %d proposals" % len(proposals))
+            if self.journal is not None:
+                self.journal.discarded(proposals)
+            with self.proposer_lock:
+                self.proposer.discard(proposals)
+            discarded = set(id(proposal) for proposal in proposals)
+            self.proposals = deque(proposal for proposal in self.proposals if id(proposal) not in discarded)
+            for i in discarded:
+                self.proposal_times.pop(i, None)
+                self.proposal_results.pop(i, None)
+
+    def _prefetch(self):
+        """
+        Prefetcher thread, keep ``prefetch_depth`` proposals ready for the next free slots.
+
+        It is woken up after each call of :func:`start`,
+        and fetches one proposal at a time without holding ``self.lock``, so results are processed in between.
+        """
+        while True:
+            self.prefetch_request.wait()
+            self.prefetch_request.clear()
+            if self.prefetcher is not threading.current_thread():
+                return
+            while True:
+                with self.lock:
+                    if self.prefetcher is not threading.current_thread() or \
+                            self.proposer.get_status() != ProposerStatus.RUNNING or \
+                            len(self.proposals) >= min(self.prefetch_depth, self.proposer.get_remaining_jobs()):
+                        break
+                    n_results = self.n_results
+                try:
+                    batch = self._get_batch(1)
+                except Exception as ex:
+                    logger.warning("Failed to prefetch proposal: %s" % ex)
+                    break
+                with self.lock:
+                    if self.prefetcher is not threading.current_thread():
+                        # stopped while computing, the proposal is not needed anymore
+                        self.discard_proposals(batch)
+                        return
+                    if not batch:
+                        break
+                    self._add_proposals(batch, n_results)
+
+    def _stop_prefetcher(self):
+        if self.prefetcher is not None:
+            self.prefetcher = None
+            self.prefetch_request.set()
+        with self.lock:
+            self.discard_proposals()
+
+    def _check_stale_proposals(self):
+        """
+        Discard the fetched proposals which missed ``stale_after`` results or more,
+        if the proposer tells they are outdated by the results (see :func:`AbstractProposer.is_prefetch_stale`)
+        """
+        self.n_results += 1
+        if self.stale_after <= 0:
+            return
+        stale = [proposal for proposal in self.proposals
+                 if self.n_results - self.proposal_results.get(id(proposal), self.n_results) >= self.stale_after]
+        if not stale:
+            return
+        with self.proposer_lock:
+            if not self.proposer.is_prefetch_stale():
+                return
+        self.discard_proposals(stale)
 
     def submit_job(self, job=None, rid_blacklist=None):
         """
@@ -219,18 +493,25 @@ class Experiment:
 
         :return: True if job submitted, else False
         """
-        rid = self.resource_manager.get_available(self.username, self.exp_config["resource"], rid_blacklist=rid_blacklist)
+        rid = self.resource_manager.take_available(self.username, self.exp_config["resource"],
+                                                   rid_blacklist=rid_blacklist,
+                                                   config=job.config if job is not None else None)
         if rid is None:
             self.resource_manager.log_error_message("Not enough resources!")
             logger.warning("Increase resource or reduce n_parallel, no enough resources")
             return False
 
+        job_hash = None
         if job is None:
-            proposal = self.proposer.get()
-            if proposal is not None and self.is_compression_exp:
-                proposal = deserialize_compression_proposal(self.exp_config, self.compression_params, proposal)
-            self.proposer.increment_job_counter()
+            while True:
+                proposal = self._next_proposal()
+                if proposal is None or self.result_cache is None:
+                    break
+                job_hash = self.result_cache.key(proposal)
+                if not self._reuse_result(proposal, job_hash):
+                    break
         if job is None and proposal is None:
+            self.resource_manager.connector.free_used_resource(rid)
             if self.exp_config['proposer'] in SPECIAL_EXIT_PROPOSERS:
                 logger.info("%s is waiting to finish." % self.exp_config['proposer'])
                 return True
@@ -241,67 +522,211 @@ class Experiment:
         else:
             if job is None:
                 job_config = BasicConfig(**proposal)
+                if self.resource_manager.placement.needs_config:
+                    # place the job now that its configuration is known, e.g. on the host of its previous run
+                    rid = self.resource_manager.move_to_better(rid, self.username, self.exp_config["resource"],
+                                                               job_config)
                 job = Job(self.exp_config["script"], job_config, self.exp_config["workingdir"], retries=self.job_retries)
-                job.jid = self.resource_manager.connector.job_started(self.eid, rid, job_config)
+                # the resource is taken already, by take_available
+                job.jid = self.resource_manager.connector.start_job(self.eid, rid, job_config, job_hash=job_hash)
+                job.proposed_at = self.proposal_time
             else:
-                self.resource_manager.connector.job_retry(rid, job.jid)
+                self.resource_manager.connector.start_job_attempt(rid, job.jid)
             logger.info("Submitting job %d with resource %d in experiment %d" % (job.jid, rid, self.eid))
             job.was_executed = False
             self.pending_jobs[job.jid] = job
             # update the status, but after appending to pending_jobs
             # to avoid premature termination
             self.proposer.check_termination()
-            self.resource_manager.run_job(job, rid, self.exp_config, self.update, **self.runtime_args)
+            self.resource_manager.run_job(job, rid, self.exp_config, self.update, taken=True, **self.runtime_args)
             return True
 
+    def _resubmit(self, job):
+        # preferably on another resource than the failed attempts
+        return self.submit_job(job, rid_blacklist=job.rid_blacklist) or \
+            (len(job.rid_blacklist) > 0 and self.submit_job(job))
+
+    def _retry_job(self, job):
+        """
+        Submit a failed job again, or defer it until a resource is free (see :func:`_submit_retries`)
+
+        :param job: failed job
+        :type job: aup.EE.Job.Job
+        """
+        if self.retry_jobs or not self._resubmit(job):
+            logger.info("Retry of job %d is deferred until a resource is free" % job.jid)
+            self.pending_jobs[job.jid] = job  # the experiment waits for it
+            self.retry_jobs.append(job)
+            self.deferred = True
+
+    def _submit_retries(self):
+        """
+        Submit the deferred retries in order, while resources are free
+
+        :return: number of jobs submitted
+        :rtype: int
+        """
+        n_jobs = 0
+        while self.retry_jobs:
+            if not self._resubmit(self.retry_jobs[0]):
+                self.deferred = True
+                break
+            self.retry_jobs.popleft()
+            n_jobs += 1
+        return n_jobs
+
+    def _next_proposal(self):
+        if self.proposals:
+            proposal = self.proposals.popleft()
+            self.proposal_time = self.proposal_times.pop(id(proposal), time.time())
+            self.proposal_results.pop(id(proposal), None)
+        else:
+            with PROPOSER_GET.time(call="get"), self.proposer_lock:
+                proposal = self.proposer.get()
+            self.proposal_time = time.time()
+            if proposal is not None and self.is_compression_exp:
+                proposal = deserialize_compression_proposal(self.exp_config, self.compression_params, proposal)
+            if proposal is not None and self.journal is not None:
+                self.journal.proposed([proposal])
+        self.proposer.increment_job_counter()
+        return proposal
+
+    def _reuse_result(self, proposal, job_hash):
+        """
+        Feed the proposer with the score of a previous job with the same hash, instead of running the job
+
+        :param proposal: job configuration
+        :type proposal: dict
+        :param job_hash: key of the job in the result cache
+        :type job_hash: str
+        :return: True if a previous score is found
+        :rtype: bool
+        """
+        cached = self.result_cache.lookup(job_hash)
+        if cached is None:
+            return False
+        job_config = BasicConfig(**proposal)
+        job = Job(self.exp_config["script"], job_config, self.exp_config["workingdir"], retries=self.job_retries)
+        job.jid = self.resource_manager.connector.save_cached_job(self.eid, job_config, cached[1])
+        logger.info("Job %d reuses the score %s of job %d" % (job.jid, cached[1], cached[0]))
+        self.submitted = True
+        if self.journal is not None:
+            self.journal.result(job.config, cached[1], job.jid)
+        with PROPOSER_UPDATE.time(), self.proposer_lock:
+            self.proposer.update(cached[1], job)
+        self._check_stale_proposals()
+        self.proposer.check_termination()
+        self._checkpoint()
+        return True
+
     def update(self, score, jid):
         """
         Callback function passed to :mod:`aup.EE.Resource.AbstractResourceManager` to
-         update the job history (also proposer and connector)
+         update the job history (also proposer and connector).
+
+        It only queues the result, which is processed by the dispatcher thread (see :func:`_dispatch`),
+        so the job threads are not blocked by the proposer or new job submissions.
 
         :param score: score returned from job (using :func:`aup.utils.print_result`)
         :type score: float
         :param jid: job id
         :type jid: int
         """
+        self.results.put((score, jid))
+
+    def _dispatch(self):
+        """
+        Dispatcher thread, process finished jobs queued by :func:`update` in order until :func:`_stop_dispatcher`
+        """
+        while True:
+            try:
+                result = self.results.get(timeout=self.sleep_time)
+            except queue.Empty:
+                with self.status_changed:
+                    if self.deferred and (self.proposer.get_status() == ProposerStatus.RUNNING or self.retry_jobs):
+                        try:
+                            self.start()
+                        except Exception as ex:
+                            logger.fatal("Failed to submit deferred jobs: %s" % ex)
+                continue
+            if result is None:
+                return
+            score, jid = result
+            with self.status_changed:
+                try:
+                    self._process_result(score, jid)
+                except Exception as ex:
+                    logger.fatal("Failed to process result of job %d: %s" % (jid, ex))
+                    self.pending_jobs.pop(jid, None)
+                    self.proposer.set_status(ProposerStatus.FAILED)
+                finally:
+                    self.status_changed.notify_all()
+
+    def _stop_dispatcher(self, wait=True):
+        if self.dispatcher is not None:
+            self.results.put(None)
+            if wait:
+                self.dispatcher.join()
+            self.dispatcher = None
+
+    def _process_result(self, score, jid):
+        """
+        Update the job history (also proposer and connector), then retry the failed job or submit new ones
+
+        :param score: score returned from job, or "ERROR" / "EARLY STOPPED"
+        :type score: float | str
+        :param jid: job id
+        :type jid: int
+        """
         if score == "ERROR":
             job = self.pending_jobs.pop(jid)
             if job.jid in self.resource_manager.jobs and \
                 job.curr_retries < job.retries:
-                rid = self.resource_manager.jobs[jid]
+                rid = self.resource_manager.job_failed(jid)
                 job.rid_blacklist.add(rid)
-                self.resource_manager.connector.job_failed(rid, jid)
                 job.curr_retries += 1
                 logger.info("Retrying job %d (%d/%d)" % (jid, job.curr_retries, job.retries))
-                self.submit_job(job, rid_blacklist=job.rid_blacklist)
+                self._retry_job(job)
             elif not self.fail_safe:
                 self.resource_manager.finish_job(jid, None, "FAILED")
                 self.proposer.set_status(ProposerStatus.FAILED)
                 logger.fatal("Stop Experiment due to job failure (ignore_fail flag set to false)")
             else:
                 self.resource_manager.finish_job(jid, None, "FAILED")
+                if self.journal is not None:
+                    self.journal.failed(job.config, jid)
                 try:
-                    self.proposer.failed(job)
+                    with self.proposer_lock:
+                        self.proposer.failed(job)
                 except Exception as ex:
                     self.proposer.set_status(ProposerStatus.FAILED)
                     logger.fatal("Stop Experiment due to job failure (failed jobs unsupported by proposer)")
                 logger.info("Job %d is finished (failed)" % (jid))
-                if self.proposer.get_status() == ProposerStatus.RUNNING:
+                if self.proposer.get_status() == ProposerStatus.RUNNING or self.retry_jobs:
                     self.start()
         elif score == "EARLY STOPPED":
-            self.pending_jobs.pop(jid)
+            job = self.pending_jobs.pop(jid)
+            if self.journal is not None:
+                self.journal.skipped(job.config, jid)
             self.resource_manager.finish_job(jid, score, "EARLY_STOPPED")
             logger.info("Job %d was early stopped" % (jid))
-            if self.proposer.get_status() == ProposerStatus.RUNNING:
+            if self.proposer.get_status() == ProposerStatus.RUNNING or self.retry_jobs:
                 self.start()
         else:
-            self.proposer.update(score, self.pending_jobs[jid])
+            if self.journal is not None:
+                self.journal.result(self.pending_jobs[jid].config, score, jid)
+            with PROPOSER_UPDATE.time(), self.proposer_lock:
+                self.proposer.update(score, self.pending_jobs[jid])
+            self._check_stale_proposals()
             self.pending_jobs.pop(jid)
             self.resource_manager.finish_job(jid, score, "FINISHED")
             logger.info("Job %d is finished with result %s" % (jid, score))
 
-            if self.proposer.get_status() == ProposerStatus.RUNNING:
+            if self.proposer.get_status() == ProposerStatus.RUNNING or self.retry_jobs:
                 self.start()
+        self._checkpoint()
+        if self.scheduler is not None:
+            self.scheduler.notify()  # the resource of the job is free
 
     def _suspend(self, sig, frame):
         """
@@ -310,10 +735,16 @@ class Experiment:
         logger.fatal("Experiment ended at user's request")
         for i in self.pending_jobs:
             logger.warning("Job with ID %d is cancelled" % i)         # Note: cancelled job won't be run again.
+        self._stop_prefetcher()
+        if self.journal is not None:
+            self.journal.close()
         try:
-            self.proposer.save(os.path.join(".", "exp%d.pkl" % self.eid))
+            with self.proposer_lock:
+                self.proposer.save(os.path.join(".", "exp%d.pkl" % self.eid))
         except NotImplementedError:
             pass
+        self._close_proposer()
+        self._stop_dispatcher(wait=False)  # the dispatcher may be waiting for the main thread
         self.resource_manager.suspend()
         result = self.resource_manager.finish(status="STOPPED")
         self.connector.close()
@@ -345,7 +776,14 @@ class Experiment:
 
                 status = self.connector.maybe_get_experiment_status(self.eid)
                 if status == "REQUEST_STOP":
-                    return _thread.interrupt_main()
+                    if self.scheduler is None:
+                        return _thread.interrupt_main()
+                    # other experiments keep running in this process
+                    logger.fatal("Experiment %d ends at user's request, after its running jobs" % self.eid)
+                    self.proposer.set_status(ProposerStatus.FINISHED)
+                    with self.status_changed:
+                        self.status_changed.notify_all()
+                    return
 
                 time.sleep(self.request_stop_time)
             except Exception as ex:
@@ -55,6 +55,7 @@ class Job:
         self.was_executed = False
         self.retries = retries
         self.curr_retries = 0
+        self.proposed_at = None  # time of the proposal, until the job process is started
         self.rid_blacklist = set()
 
         # if true, it means this is the best job
@@ -0,0 +1,264 @@
+"""
+..
+  Copyright (c) 2018 LG Electronics Inc.
+  SPDX-License-Identifier: GPL-3.0-or-later
+
+aup.EE.Journal
+==============
+
+Write-ahead journal of the proposer events, to rebuild the proposer of an experiment after a crash.
+
+Without it, the proposer is only saved (as ``exp<eid>.pkl``) when the experiment finishes or is suspended,
+and some proposers (e.g. BOHB, Hyperband, Spearmint) can not be saved at all.
+
+Each event is appended to ``exp<eid>.journal`` as a JSON line, synced to disk before the experiment goes on:
+
+* ``propose``: proposals returned by the proposer,
+* ``result``: configuration and score of a finished job, given to :func:`AbstractProposer.update`,
+* ``failed``: configuration of a failed job, given to :func:`AbstractProposer.failed`,
+* ``skip``: configuration of an early stopped job, which is not reported to the proposer,
+* ``discard``: proposals given back to the proposer, see :func:`AbstractProposer.discard`.
+
+Every ``snapshot_every`` events, the proposer is saved (if supported) to ``exp<eid>.journal.<n>``
+and the journal is compacted to a single ``snapshot`` event, with the proposals not finished yet.
+
+It is enabled in the experiment configuration by::
+
+  "journal": {
+    "path": ".",
+    "snapshot_every": 100
+  }
+
+and a crashed experiment is resumed by ``python -m aup experiment.json --resume <eid>``.
+The proposer is reloaded from the latest snapshot (or created again) and the following events are replayed in order,
+proposals without result are run again but finished jobs are not.
+To propose the same values again, the proposer created again draws from its own random generator seeded with
+``random_seed`` of the experiment configuration.
+The resume fails if the replayed proposer does not propose the values recorded in the journal.
+
+APIs
+----
+"""
+import json
+import logging
+import os
+
+from ..Proposer.AbstractProposer import point_key
+from ..utils import set_default_keyvalue
+
+logger = logging.getLogger(__name__)
+
+
+def _remove(proposals, config):
+    """
+    Remove the proposal of a job from the list, if found
+    """
+    key = point_key(config)
+    for i, proposal in enumerate(proposals):
+        if point_key(proposal) == key:
+            del proposals[i]
+            return
+
+
+class Journal(object):
+    """
+    Append-only journal of the proposer events of one experiment
+
+    :param eid: experiment ID
+    :type eid: int
+    :param config: experiment configuration of ``journal``
+    :type config: dict
+    """
+
+    def __init__(self, eid, config):
+        set_default_keyvalue("path", ".", config, log=logger)
+        set_default_keyvalue("snapshot_every", 100, config, log=logger)
+        self.path = os.path.join(config["path"], "exp%d.journal" % eid)
+        self.snapshot_every = int(config["snapshot_every"])
+        self.pending = []  # proposals without result, as recorded
+        self.n_events = 0  # since the latest snapshot
+        self.resolved = 0  # number of jobs with a result, failed or skipped
+        self.generation = 0  # of the latest snapshot
+        self.file = None
+        self.opened = False  # the journal is only truncated when it is opened for the first time
+
+    def is_open(self):
+        return self.file is not None
+
+    def open(self, append=False):
+        """
+        :param append: keep the previous events, to resume the experiment
+        :type append: bool
+        """
+        self.file = open(self.path, "a" if append or self.opened else "w")
+        self.opened = True
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def _write(self, event):
+        if self.file is None:
+            self.open()
+        self.file.write(json.dumps(event, default=str) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.n_events += 1
+
+    def proposed(self, proposals):
+        """
+        :param proposals: proposals returned by the proposer
+        :type proposals: [dict]
+        """
+        self._write({"event": "propose", "proposals": proposals})
+        self.pending.extend(proposals)
+
+    def result(self, config, score, jid):
+        """
+        :param config: job configuration
+        :type config: dict
+        :param score: score of the job
+        :type score: float
+        :param jid: job ID
+        :type jid: int
+        """
+        self._write({"event": "result", "config": config, "score": score, "jid": jid})
+        self._resolve(config)
+
+    def failed(self, config, jid):
+        self._write({"event": "failed", "config": config, "jid": jid})
+        self._resolve(config)
+
+    def skipped(self, config, jid):
+        self._write({"event": "skip", "config": config, "jid": jid})
+        self._resolve(config)
+
+    def _resolve(self, config):
+        _remove(self.pending, config)
+        self.resolved += 1
+
+    def discarded(self, proposals):
+        self._write({"event": "discard", "proposals": proposals})
+        for proposal in proposals:
+            _remove(self.pending, proposal)
+
+    def checkpoint(self, proposer):
+        """
+        Take a snapshot of the proposer if ``snapshot_every`` events were written since the latest one.
+        It must be called once the events are applied to the proposer.
+
+        :param proposer: proposer of the experiment
+        :type proposer: AbstractProposer
+        """
+        if 0 < self.snapshot_every <= self.n_events:
+            self.snapshot(proposer)
+
+    def snapshot(self, proposer):
+        """
+        Save the proposer, then replace the journal by a ``snapshot`` event.
+        Snapshots are disabled for proposers which can not be saved, the journal is then replayed from the start.
+
+        :param proposer: proposer of the experiment
+        :type proposer: AbstractProposer
+        :return: whether the snapshot is taken
+        :rtype: bool
+        """
+        generation = self.generation + 1
+        snapshot = "%s.%d" % (self.path, generation)
+        try:
+            proposer.save(snapshot)
+        except NotImplementedError:
+            logger.info("Proposer can not be saved, the journal is not compacted")
+            self.snapshot_every = 0
+            return False
+
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(json.dumps({"event": "snapshot", "path": os.path.basename(snapshot), "generation": generation,
+                                "resolved": self.resolved, "pending": self.pending}, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.close()
+        os.replace(tmp, self.path)  # the previous snapshot is used until the journal is replaced
+        self.open(append=True)
+        previous = "%s.%d" % (self.path, self.generation)
+        if os.path.isfile(previous):
+            os.remove(previous)
+        self.generation = generation
+        self.n_events = 0
+        logger.debug("Proposer snapshot %s with %d pending proposals" % (snapshot, len(self.pending)))
+        return True
+
+    def load(self):
+        """
+        :return: events in the journal, an incomplete last event (e.g. crash while writing) is ignored
+        :rtype: [dict]
+        """
+        events = []
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    logger.warning("Ignore incomplete event in %s: %s" % (self.path, line.strip()))
+        return events
+
+    def replay(self, proposer, make_job, convert=None):
+        """
+        Rebuild the proposer from the journal, then keep appending to it.
+
+        :param proposer: newly created proposer of the experiment
+        :type proposer: AbstractProposer
+        :param make_job: create the job given to the proposer, from the job configuration and job ID
+        :type make_job: function object
+        :param convert: applied to the proposals before they are run (e.g. for compression experiments)
+        :type convert: function object
+        :return: proposals without result, to be run again
+        :rtype: [dict]
+        :raises RuntimeError: if the proposer does not propose the values of the journal again
+        """
+        if not os.path.isfile(self.path):
+            raise FileNotFoundError("Journal %s is missing" % self.path)
+        pending = []
+        resolved = 0
+        events = self.load()
+        for i, event in enumerate(events):
+            kind = event["event"]
+            if kind == "snapshot":
+                proposer.reload(os.path.join(os.path.dirname(self.path), event["path"]))
+                # the proposals of running jobs were counted, but they are counted again when they are run
+                proposer.reset()
+                for _ in range(event["resolved"]):
+                    proposer.increment_job_counter()
+                pending = list(event["pending"])
+                resolved = event["resolved"]
+                self.generation = event["generation"]
+            elif kind == "propose":
+                batch = proposer.get_batch(len(event["proposals"]))
+                if convert is not None:
+                    batch = [convert(proposal) for proposal in batch]
+                if [point_key(p) for p in batch] != [point_key(p) for p in event["proposals"]]:
+                    # the proposer would not match the journal anymore, e.g. with another random state
+                    raise RuntimeError("Replayed proposals differ from event %d of %s, check `random_seed` in the "
+                                       "experiment configuration" % (i + 1, self.path))
+                pending.extend(event["proposals"])
+            elif kind == "discard":
+                proposer.discard(event["proposals"])
+                for proposal in event["proposals"]:
+                    _remove(pending, proposal)
+            else:
+                job = make_job(event["config"], event["jid"])
+                if kind == "result":
+                    proposer.update(event["score"], job)
+                elif kind == "failed":
+                    proposer.failed(job)
+                proposer.increment_job_counter()
+                _remove(pending, event["config"])
+                resolved += 1
+        logger.info("Replayed %d events from %s, %d proposals to run again" % (len(events), self.path, len(pending)))
+        self.pending = list(pending)
+        self.resolved = resolved
+        self.n_events = len(events)
+        self.open(append=True)
+        return pending
@@ -16,24 +16,45 @@ APIs
 ----
 """
 import abc
-import copy
 import importlib
 import logging
-import random
+import multiprocessing
+import os
+import signal
 import threading
 import time
 import numpy as np
 import math
 import warnings
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
+from ...metrics import EARLY_STOP_TICK
 from ...utils import DEFAULT_AUPTIMIZER_PATH
-from .utils.curve_fitting import CurveModel
+from .utils.curve_fitting import CurveFittingCache, predict_final
+from .utils.EarlyStopIndex import EarlyStopIndex
+from .utils.Placement import get_placement
 
 ABC = abc.ABCMeta('ABC', (object,), {'__slots__': ()})
 EARLY_STOPPING_SLEEP = 1
 CURVE_FITTING_MIN_ITS = 4
+CURVE_FITTING_KILL_WAIT = 10  # seconds for the workers of the running fits to report their pid
 logger = logging.getLogger(__name__)
 
+def _curve_fitting_context():
+    # not fork, the resource managers are multithreaded
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([predict_final.__module__])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def _report_pid(pids):
+    # initializer of the curve fitting workers, their pids are needed to terminate a fit running for too long
+    pids.put(os.getpid())
+
+
 _SupportResource = {"gpu": "GPUResourceManager",
                     "cpu": "CPUResourceManager",
                     "node": "SSHResourceManager",
@@ -84,8 +105,12 @@ class AbstractResourceManager(ABC):
         self.stopped_jobs = None
         self.stopped_jobs_lock = threading.Lock()
         self.n_parallel = n_parallel
+        self.early_stop_index = None
+        self.early_stop_loaded = None  # experiment whose finished jobs are in early_stop_index
         self.eid = kwargs.get("eid", None)
         self.result_labels = kwargs.get('multi_res_labels', None)
+        self.placement = get_placement(kwargs.get("placement", "random"), connector, self.host_of,
+                                       refresh=kwargs.get("placement_refresh", 1))
 
         self.track_intermediate_results = kwargs.get("track_intermediate_results", False)
         self.interm_job_res = None
@@ -102,12 +127,21 @@ class AbstractResourceManager(ABC):
             self.curve_fitting_threshold = kwargs["early_stop"].get("curve_fitting_threshold", 0.95)
             self.curve_fitting_max_iters = kwargs["early_stop"].get("curve_fitting_max_iters", None)
             self.curve_fitting_timeout = kwargs["early_stop"].get("curve_fitting_timeout", 60)
+            self.curve_fitting_mcmc_iters = kwargs["early_stop"].get("curve_fitting_mcmc_iters", 10000)
+            self.curve_fitting_tolerance = kwargs["early_stop"].get("curve_fitting_tolerance", 1e-4)
+            self.curve_fitting_workers = kwargs["early_stop"].get("curve_fitting_workers", None)
+            self.curve_fitting_pool = None  # started with the first fit
+            self.curve_fitting_pids = None  # queue of the worker pids of the pool
+            self.curve_fitting_fits = dict()  # jid -> pending fit
+            self.curve_fitting_cache = CurveFittingCache()
             self.job_checked = dict()
             self.early_stop_daemon_finished = False
             self.stopped_jobs = set()
             if self.policy == "curve_fitting" and self.curve_fitting_max_iters is None:
                 raise ValueError("Curve fitting policy requires argument \"curve_fitting_max_iters\" representing " +
                                  "the total number of intermediate results that the script will provide.")
+            self.early_stop_index = EarlyStopIndex(self.maximize, self.policy_steps)
+            self._load_finished_jobs()
             self.early_stop_daemon = threading.Thread(target=AbstractResourceManager.early_stop_daemon_fun,
                                         args=(self,), daemon=True)
             self.early_stop_daemon.start()
@@ -118,8 +152,32 @@ class AbstractResourceManager(ABC):
             self.job_checked = dict()
             self.early_stop_daemon_finished = True
             self.early_stop_daemon = None
+            self.early_stop_index = None
+            self.curve_fitting_pool = None
+            self.curve_fitting_cache = None
             self.stopped_jobs = None
 
+    @property
+    def eid(self):
+        return self._eid
+
+    @eid.setter
+    def eid(self, eid):
+        # the experiment sets its ID after creating the resource manager
+        self._eid = eid
+        self._load_finished_jobs()
+
+    def _load_finished_jobs(self):
+        """
+        Add the jobs finished before, e.g. when the experiment is resumed, to the early stopping statistics
+        """
+        if self.early_stop_index is None or self.connector is None or self.eid is None or \
+                self.early_stop_loaded == self.eid:
+            return
+        self.early_stop_loaded = self.eid
+        for jid, vals in self.connector.get_intermediate_results_experiment(self.eid, "FINISHED").items():
+            self.early_stop_index.add_finished(jid, vals)
+
     def finish(self, status="FINISHED"):
         """
         Finish up the resource allocation.
@@ -133,6 +191,8 @@ class AbstractResourceManager(ABC):
         if self.early_stop_daemon != None:
             self.early_stop_daemon_finished = True
             self.early_stop_daemon.join()
+        if self.curve_fitting_pool is not None:
+            self.recycle_curve_fitting_pool()
         return self.connector.get_best_result(self.eid, maximize=self.maximize)
 
     def finish_job(self, jid, score, status=None):
@@ -147,10 +207,66 @@ class AbstractResourceManager(ABC):
         if jid in self.jobs:
             rid = self.jobs.pop(jid)
             self.connector.job_finished(rid, jid, score, status)
+            self.placement.finished(rid, failed=(status == "FAILED"))
+            if self.early_stop_index is not None:
+                if status == "FINISHED":
+                    self.early_stop_index.finish(jid)
+                    self.curve_fitting_cache.finish(jid)
+                else:
+                    self.early_stop_index.exclude(jid)
+                    self.curve_fitting_cache.drop(jid)
         else:
             logger.warning("Job %d finished after job suspension, result may lose" % jid)
 
-    def get_available(self, username, rtype, rid_blacklist=None):
+    def job_failed(self, jid):
+        """
+        Free the resource of a failed job before it is retried
+
+        :param jid: job ID
+        :type jid: int
+        :return: resource ID of the failed attempt
+        :rtype: int
+        """
+        rid = self.jobs[jid]
+        self.connector.job_failed(rid, jid)
+        self.placement.finished(rid, failed=True)
+        if self.early_stop_index is not None:
+            self.early_stop_index.exclude(jid)
+            self.curve_fitting_cache.drop(jid)
+        return rid
+
+    def admit(self, n_running):
+        """
+        Whether a new job can start now, in addition to the free resources
+
+        :param n_running: number of running jobs of the experiment
+        :type n_running: int
+        :return: True if the job can start
+        :rtype: bool
+        """
+        return True
+
+    def parallel_limit(self, n_parallel):
+        """
+        :param n_parallel: number of parallel jobs of the experiment
+        :type n_parallel: int
+        :return: max number of parallel jobs
+        :rtype: int
+        """
+        return n_parallel
+
+    def host_of(self, rid):
+        """
+        Host of a resource, for the placement policies (see :mod:`aup.EE.Resource.utils.Placement`)
+
+        :param rid: resource ID
+        :type rid: int
+        :return: host name
+        :rtype: str
+        """
+        return self.placement.view.name(rid)
+
+    def get_available(self, username, rtype, rid_blacklist=None, config=None):
         """
         method to get the available resource to run a job
 
@@ -160,14 +276,55 @@ class AbstractResourceManager(ABC):
         :type rtype: str
         :param rid_blacklist: resource ids to ignore
         :type rid_blacklist: [int]
-        :return: a random selection of all available resource IDs
+        :param config: configuration of the job, if known
+        :type config: dict
+        :return: available resource ID selected by the placement policy
         :rtype: int
         """
-        rids = self.connector.get_available_resource(username, rtype, rid_blacklist)
+        rids = self.placement.view.free(rtype, rid_blacklist)
         logger.debug("Request resource (%s) for user %s and get %s" % (rtype, username, rids.__str__()))
-        return random.choice(rids) if rids else None
+        return self.placement.select(rids, config) if rids else None
+
+    def take_available(self, username, rtype, rid_blacklist=None, config=None):
+        """
+        Get an available resource as :func:`get_available`, and mark it as used in the database.
+
+        The placement works on a copy of the resource table (see :class:`ResourceView`),
+        so the resource may be taken meanwhile by another process, then the placement is retried.
 
-    def run_job(self, job, rid, exp_config, call_back_func, **kwargs):
+        :return: resource ID taken for the job, None if no resource is available
+        :rtype: int
+        """
+        taken = set()  # by other processes
+        while True:
+            rid = self.get_available(username, rtype, rid_blacklist=rid_blacklist, config=config)
+            if rid is None or rid in taken:
+                return None
+            if self.connector.take_available_resource(rid):
+                return rid
+            logger.debug("Resource %d is taken by another process, retry" % rid)
+            taken.add(rid)
+
+    def move_to_better(self, rid, username, rtype, config):
+        """
+        Move a job to a free resource preferred by the placement policy for its configuration,
+        e.g. the host of its previous run.
+
+        :param rid: resource ID taken for the job, see :func:`take_available`
+        :type rid: int
+        :param config: configuration of the job
+        :type config: dict
+        :return: resource ID taken for the job
+        :rtype: int
+        """
+        better = self.get_available(username, rtype, config=config)
+        if better is None or self.placement.score(better, config) >= self.placement.score(rid, config) or \
+                not self.connector.take_available_resource(better):
+            return rid
+        self.connector.free_used_resource(rid)
+        return better
+
+    def run_job(self, job, rid, exp_config, call_back_func, taken=False, **kwargs):
         """
         Job running interface, this is called by :mod:`aup.EE.Experiment`.
 
@@ -181,18 +338,26 @@ class AbstractResourceManager(ABC):
         :type exp_config: BasicConfig
         :param call_back_func: call back function to update result
         :type call_back_func: function object
+        :param taken: whether the resource is already taken for the job, see :func:`take_available`
+        :type taken: bool
         """
-        self.connector.take_available_resource(rid)
+        if not taken:
+            self.connector.take_available_resource(rid)
+        self.placement.started(rid, job.config)
         self.jobs[job.jid] = rid
 
         if self.interm_job_res != None:
             self.interm_job_res[job.jid] = list()
             self.job_checked[job.jid] = list()
+            if self.early_stop_index is not None:
+                self.early_stop_index.start(job.jid)
+                self.curve_fitting_cache.drop(job.jid)
 
         try:
             self.run(job, rid, exp_config, call_back_func, **kwargs)
         except EnvironmentError as e:
             self.connector.free_used_resource(rid)
+            self.placement.finished(rid)
             logger.fatal("Experiment interrupted.")
             raise(e)
 
@@ -202,6 +367,8 @@ class AbstractResourceManager(ABC):
 
         if jid in self.interm_job_res:
             self.interm_job_res[jid].append(interm_res)
+            if self.early_stop_index is not None:
+                self.early_stop_index.append(jid, interm_res)
             if self.connector:
                 return self.connector.save_intermediate_result(jid, interm_res)
             else:
@@ -239,6 +406,8 @@ class AbstractResourceManager(ABC):
             logger.debug("Tried to stop job {} not in currently running jobs.".format(jid))
         with self.stopped_jobs_lock:
             self.stopped_jobs.add(jid)
+        self.early_stop_index.exclude(jid)
+        self.curve_fitting_cache.drop(jid)
 
     def is_job_stopped(self, jid):
         """
@@ -277,101 +446,158 @@ class AbstractResourceManager(ABC):
             self.finish_job(jid, None)
             logger.warning("Job %d is canceled" % jid)
 
-    def run_curve_fitting(self, interm_res, c_jid, step, comp_fn, curve_fitting_threshold, best_val):
-        curvemodel = CurveModel(self.curve_fitting_max_iters)
-        predict_y = curvemodel.predict(interm_res, timeout=self.curve_fitting_timeout)
-        if predict_y is None:
+    def run_curve_fitting(self, interm_res, c_jid, step, curve_fitting_threshold, best_val):
+        """
+        Predict the final value of a job in the process pool, see :func:`check_curve_fitting`
+
+        :param interm_res: intermediate results of the job, negated for minimization
+        :type interm_res: [float]
+        """
+        for _ in range(2):
+            if self.curve_fitting_pool is None:
+                context = _curve_fitting_context()
+                self.curve_fitting_pids = context.SimpleQueue()
+                self.curve_fitting_pool = ProcessPoolExecutor(max_workers=self.curve_fitting_workers,
+                                                              mp_context=context, initializer=_report_pid,
+                                                              initargs=(self.curve_fitting_pids,))
+            try:
+                future = self.curve_fitting_pool.submit(predict_final, interm_res, self.curve_fitting_max_iters,
+                                                        mcmc_iters=self.curve_fitting_mcmc_iters,
+                                                        tolerance=self.curve_fitting_tolerance,
+                                                        state=self.curve_fitting_cache.get(c_jid))
+                break
+            except BrokenProcessPool:  # e.g. a worker was killed, start a new pool
+                self.curve_fitting_pool.shutdown(wait=False)
+                self.curve_fitting_pool = None
+        else:
             return
-        if not comp_fn(predict_y, curve_fitting_threshold * best_val):
-            if self.is_job_stopped(c_jid):
-                return
-            self.stop_job(c_jid)
-            logger.info("Stopping job {} early (step {}): predicted end value {:.4f} is lower than the best value so far {:.4f} within the given {:.2f}% threshold (={:.4f})".format(
-                c_jid, step, predict_y, best_val, 100. * curve_fitting_threshold, curve_fitting_threshold * best_val))
+        self.curve_fitting_fits[c_jid] = (future, step, curve_fitting_threshold, best_val, time.time())
+
+    def check_curve_fitting(self):
+        """
+        Stop the jobs whose predicted final value is lower than the threshold of the best value, once predicted
+        """
+        for c_jid, (future, step, curve_fitting_threshold, best_val, start) in list(self.curve_fitting_fits.items()):
+            if not future.done():
+                if time.time() - start > self.curve_fitting_timeout:
+                    logger.warning("Curve fitting of job {} (step {}) did not finish within {}s".format(
+                        c_jid, step, self.curve_fitting_timeout))
+                    if not future.cancel():  # already running
+                        self.recycle_curve_fitting_pool()
+                        return
+                    del self.curve_fitting_fits[c_jid]
+                continue
+            del self.curve_fitting_fits[c_jid]
+            try:
+                predict_y, state = future.result()
+            except Exception as e:
+                logger.warning("Curve fitting of job {} (step {}) failed: {}".format(c_jid, step, e))
+                continue
+            if c_jid in self.jobs:
+                self.curve_fitting_cache.update(c_jid, state)
+            if predict_y is None or self.is_job_stopped(c_jid) or c_jid not in self.jobs:
+                continue
+            if not predict_y >= curve_fitting_threshold * best_val:
+                self.stop_job(c_jid)
+                logger.info("Stopping job {} early (step {}): predicted end value {:.4f} is lower than the best value so far {:.4f} within the given {:.2f}% threshold (={:.4f})".format(
+                    c_jid, step, predict_y, best_val, 100. * curve_fitting_threshold, curve_fitting_threshold * best_val))
+
+    def recycle_curve_fitting_pool(self):
+        """
+        Terminate the processes of the curve fitting pool, e.g. to stop a fit running for too long.
+        The pending fits are dropped, and submitted again to a new pool by the daemon.
+        """
+        pool = self.curve_fitting_pool
+        if pool is None:
+            return
+        self.curve_fitting_pool = None
+        # the fits which can't be canceled are sent to a worker already
+        running = [fit[0] for fit in self.curve_fitting_fits.values() if not fit[0].cancel()]
+        self.curve_fitting_fits.clear()
+        pool.shutdown(wait=False)
+        pids = self.curve_fitting_pids
+        deadline = time.time() + CURVE_FITTING_KILL_WAIT
+        while True:
+            while not pids.empty():
+                try:
+                    os.kill(pids.get(), signal.SIGTERM)
+                except OSError:  # already exited
+                    pass
+            # a worker reports its pid once started, maybe after a fit is sent to it
+            if all(future.done() for future in running) or time.time() > deadline:
+                break
+            time.sleep(0.1)
 
     def early_stop_daemon_fun(self):
+        index = self.early_stop_index
         while not self.early_stop_daemon_finished:
+            tick = time.perf_counter()
             # do not consider the early stopped jobs
             with self.stopped_jobs_lock:
                 current_jobs = set(self.jobs) - self.stopped_jobs
 
-            finished_interm_job_res = self.connector.get_intermediate_results_experiment(self.eid, "FINISHED")
-            current_interm_job_res = self.connector.get_intermediate_results_jobs(list(current_jobs))
-            interm_job_res = {**current_interm_job_res, **finished_interm_job_res}
-
-            best_fn = np.max if self.maximize else np.min
             comp_fn = (lambda x, target: x >= target) if self.maximize else \
                       (lambda x, target: x <= target)
 
-            curve_fitting_threads = []
+            if self.policy == "curve_fitting":
+                self.check_curve_fitting()
 
-            for c_jid, c_interm_res in current_interm_job_res.items():
-                if len(c_interm_res) < self.warmup:
+            for c_jid in current_jobs:
+                n_res = index.count(c_jid)
+                if n_res < self.warmup:
                     continue
 
                 if c_jid not in self.job_checked:
                     self.job_checked[c_jid] = []
 
-                k = len(c_interm_res) // self.policy_steps
+                k = n_res // self.policy_steps
                 if k < 1:
-                    time.sleep(EARLY_STOPPING_SLEEP)
                     continue
 
                 step = k * self.policy_steps
                 if step in self.job_checked[c_jid]: # job already compared up until this step, waiting for next k multiple
-                    time.sleep(EARLY_STOPPING_SLEEP)
                     continue
 
-                comp_interm_job_res = {jid: vals for jid, vals in interm_job_res.items() if len(vals) >= step and jid != c_jid}
-                if len(comp_interm_job_res) < 1: # too few jobs 
-                    time.sleep(EARLY_STOPPING_SLEEP)
+                n_comp = index.count_others(c_jid, step)
+                if n_comp < 1: # too few jobs
                     continue
 
                 if self.policy == "median":
-                    avgs = [np.average(vals[:step]) for vals in comp_interm_job_res.values()]
-                    median = np.median(avgs)
-                    best_val = np.average(c_interm_res[:step])
+                    median, best_val = index.median(c_jid, step)
                     if not comp_fn(best_val, median):
                         self.stop_job(c_jid)
                         logger.info("Stopping job {} early (step {}): best value so far {:.4f} worse than median of averages {:.4f} for {} other jobs".format(
-                            c_jid, step, best_val, median, len(comp_interm_job_res)))
+                            c_jid, step, best_val, median, n_comp))
                 elif self.policy == "bandit":
-                    bandit_best_val = best_fn([best_fn(vals[:step]) for vals in comp_interm_job_res.values()])
-                    best_val = best_fn(c_interm_res[:step])
+                    bandit_best_val, best_val = index.best(c_jid, step)
                     bandit_factor = self.bandit_factor if ((self.maximize and np.sign(bandit_best_val) == 1) or (not self.maximize and np.sign(bandit_best_val) == -1)) else \
                                     2 - self.bandit_factor
                     if not comp_fn(best_val, bandit_factor * bandit_best_val):
                         self.stop_job(c_jid)
                         logger.info("Stopping job {} early (step {}): best value so far {:.4f} worse than a factor {:.4f} of best overall value {:.4f} (={:.4f}) for {} other jobs".format(
-                            c_jid, step, best_val, bandit_factor, bandit_best_val, bandit_factor * bandit_best_val, len(comp_interm_job_res)))
+                            c_jid, step, best_val, bandit_factor, bandit_best_val, bandit_factor * bandit_best_val, n_comp))
                 elif self.policy == "truncation":
-                    best_vals = sorted([(jid, best_fn(vals[:step])) for jid, vals in (list(comp_interm_job_res.items()) + [(c_jid, c_interm_res)])], 
-                                        key=lambda t: t[1], reverse=not self.maximize)
-                    best_val_idx = next((idx for idx, (jid, val) in enumerate(best_vals) if jid == c_jid)) + 1
-                    perc = float(best_val_idx) / len(best_vals)
+                    best_val_idx, n_jobs, best_val = index.rank(c_jid, step)
+                    perc = float(best_val_idx) / n_jobs
                     if perc <= self.truncation_percentage:
                         self.stop_job(c_jid)
                         logger.info("Stopping job {} early (step {}): best value so far {:.4f} is in the bottom {:.2f}% of {} jobs, which is lower than the {:.2f}% cutoff".format(
-                            c_jid, step, best_vals[best_val_idx-1][1], 100. * best_val_idx / len(best_vals), len(best_vals), 100. * self.truncation_percentage))
+                            c_jid, step, best_val, 100. * perc, n_jobs, 100. * self.truncation_percentage))
                 elif self.policy == "curve_fitting":
-                    if len(finished_interm_job_res) < 1 or step <= CURVE_FITTING_MIN_ITS:
+                    best_val = index.finished_best()
+                    if best_val is None or step <= CURVE_FITTING_MIN_ITS or c_jid in self.curve_fitting_fits:
                         continue
-                    interm_res = copy.deepcopy(c_interm_res)
-                    best_val = best_fn([best_fn(vals) for vals in finished_interm_job_res.values()])
+                    interm_res = index.values(c_jid)[:step]
                     if not self.maximize:
-                        interm_res *= -1
+                        interm_res = [-val for val in interm_res]
                         best_val *= -1
                     curve_fitting_threshold = self.curve_fitting_threshold if np.sign(best_val) == 1 else \
                                               2 - self.curve_fitting_threshold
-                    cf_thread = threading.Thread(target=self.run_curve_fitting, 
-                        args=(interm_res[:step], c_jid, step, (lambda x, target: x >= target), curve_fitting_threshold, best_val))
-                    cf_thread.start()
-                    curve_fitting_threads += [cf_thread]
+                    self.run_curve_fitting(interm_res, c_jid, step, curve_fitting_threshold, best_val)
 
                 self.job_checked[c_jid] += [step]
-            
-            for thread in curve_fitting_threads:
-                thread.join()
+
+            EARLY_STOP_TICK.observe(time.perf_counter() - tick)
 
             time.sleep(EARLY_STOPPING_SLEEP)
 
@@ -10,31 +10,110 @@ Resource Manager for CPUs on a single machine.
 
 However, user can specify arbitrary number for parallel computing, no real control of resources (yet).
 
+Jobs are followed by one thread each by default.  Set ``"executor": "selector"`` in ``resource_args`` to follow
+all of them from a single thread instead (see :mod:`aup.EE.Resource.utils.ResourceSelectorExecutor`),
+which is preferred for a large ``n_parallel``.
+
+Set ``"cores_per_job"`` in ``resource_args`` to pin each job to its own cores and cap the threads of numerical
+libraries accordingly (see :mod:`aup.EE.Resource.utils.cpu_affinity`).
+
+Set ``"admission"`` in ``resource_args`` to start jobs only when the host load and memory allow it
+(see :mod:`aup.EE.Resource.utils.Admission`).
+
+Set ``"watchdog"`` in ``resource_args`` to kill hung jobs and run copies of stragglers
+(see :mod:`aup.EE.Resource.utils.Watchdog`).
+
+Set ``"fork_server"`` in ``resource_args`` to fork the jobs of :func:`aup.aup_args` scripts from a pre-imported
+copy of the script, instead of starting a new interpreter for each job
+(see :mod:`aup.EE.Resource.utils.ForkServer`).
+
+Set ``"config_channel"`` in ``resource_args`` to ``"stdin"`` or ``"fd"`` to send the job configurations over the
+standard input or an inherited pipe, instead of writing a ``jobs/<jid>.json`` file for each job.
+The job script gets ``-`` or ``/dev/fd/<n>`` instead of the file path, which is read by :func:`aup.BasicConfig.load`
+(and :func:`aup.aup_args`) as the file.
+
+Set ``"result_channel": true`` in ``resource_args`` to receive the results of :func:`aup.print_result` over a
+separate pipe (``AUP_RESULT_FD``) instead of parsing every output line; the output is then copied to the job log
+in chunks.  Only the last ``OUTPUT_TAIL`` bytes of the output are kept in memory, for the error messages.
+Until a job sends a result over the pipe (e.g. if it prints ``#Auptimizer:`` lines itself), its output is still
+parsed line by line as it streams, so intermediate results and early stopping work as without the pipe.
+
+Set ``"warm_workers"`` in ``resource_args`` to run the jobs of :func:`aup.aup_worker` scripts in a long-lived worker
+by resource, which runs the ``setup()`` of the script once (see :mod:`aup.EE.Resource.utils.WarmWorker`).
+
 APIs
 ----
 """
+import copy
 import logging
 import os
+import selectors
 import subprocess
 import threading
+import time
 import sys
 import json
+from concurrent.futures import Future
 from numpy import random
 
 from .AbstractResourceManager import AbstractResourceManager
-from ...utils import parse_result, parse_one_line
+from ...utils import parse_result, parse_one_line, parse_result_message
 from .AbstractResourceManager import _SupportResource
 from ...aup import BasicConfig
+from ...metrics import JOB_QUEUE, JOB_RUNTIME, RESULT_PARSE
 from ..Job import Job
 from .utils.ResourceThreadPoolExecutor import ResourceThreadPoolExecutor
+from .utils.ResourceSelectorExecutor import ResourceSelectorExecutor
+from .utils.cpu_affinity import CorePool, pin
+from .utils.Admission import AdmissionControl
+from .utils.Watchdog import Watchdog
+from .utils.ForkServer import ForkServerPool
+from .utils.WarmWorker import WarmWorkerPool
 
 logger = logging.getLogger(__name__)
 
+_SupportExecutor = ("thread", "selector")
+_SupportConfigChannel = ("file", "stdin", "fd")
+
+OUTPUT_TAIL = 65536  # bytes of the job output kept for the error message
+READ_SIZE = 65536
+SELECT_TIMEOUT = 1  # seconds, how often to check for early stopping of silent jobs
+
+
+def _copy_key(job):
+    # copies of stragglers run with the same job ID, see :func:`CPUResourceManager._speculate`
+    return job.jid, getattr(job, "copy_number", 0)
+
+
+class _OutputTail(object):
+    """
+    End of the output of a job, for the error message
+    """
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def append(self, data):
+        self.data += data
+        if len(self.data) > 2 * OUTPUT_TAIL:
+            del self.data[:-OUTPUT_TAIL]
+
+    def __str__(self):
+        encoding = sys.stdin.encoding if sys.stdin.encoding is not None else 'UTF-8'
+        return bytes(self.data[-OUTPUT_TAIL:]).decode(encoding, "replace")
+
 
 class CPUResourceManager(AbstractResourceManager):
     def __init__(self, connector, n_parallel, *args, **kwargs):
         super(CPUResourceManager, self).__init__(connector, n_parallel, *args, **kwargs)
-        self.executor = ResourceThreadPoolExecutor(max_workers=n_parallel)
+        executor = kwargs.get("executor", "thread")
+        if executor not in _SupportExecutor:
+            raise ValueError("Executor %s is not supported, choose from %s" % (executor, ", ".join(_SupportExecutor)))
+        self.result_channel = kwargs.get("result_channel", False)
+        self.config_channel = kwargs.get("config_channel", "file")
+        if self.config_channel not in _SupportConfigChannel:
+            raise ValueError("Config channel %s is not supported, choose from %s" %
+                             (self.config_channel, ", ".join(_SupportConfigChannel)))
         self.n_parallel = n_parallel
         self.lock = threading.Lock()
         self.running = []
@@ -43,12 +122,79 @@ class CPUResourceManager(AbstractResourceManager):
         self.workingdir = kwargs.get('workingdir', None)
         self.one_shot = kwargs.get("one_shot", False)
         self.runtime_args = kwargs.get('runtime_args', {})
+        self.shared = kwargs.get("shared", False)  # resources shared with other experiments by a scheduler
+        cores_per_job = kwargs.get("cores_per_job", None)
+        self.core_pool = CorePool(cores_per_job, n_parallel) if cores_per_job else None
+        self.admission = None
+        if "admission" in kwargs:
+            self.admission = AdmissionControl(kwargs["admission"], n_parallel,
+                                              cores_per_job=self.core_pool.cores_per_job if self.core_pool else 1)
+        self.watchdog = None
+        self.copies = dict()  # jid -> copy numbers of the running job
+        self.launched = dict()  # jid -> arguments of run_job, to start a copy of a straggler
+        self.copies_lock = threading.Lock()
+        self.started_at = dict()  # (jid, copy) -> start time of the job process
+        if "watchdog" in kwargs:
+            self.watchdog = Watchdog(kwargs["watchdog"], on_straggler=self._speculate)
+        self.fork_servers = ForkServerPool(kwargs["fork_server"]) if "fork_server" in kwargs else None
+        self.warm_workers = WarmWorkerPool(kwargs["warm_workers"]) if "warm_workers" in kwargs else None
+        if executor == "selector":
+            self.executor = ResourceSelectorExecutor()
+        else:
+            # one thread per running job, including jobs admitted beyond n_parallel and copies of stragglers
+            max_workers = self.parallel_limit(n_parallel)
+            if self.watchdog is not None and self.watchdog.speculative:
+                max_workers *= 2
+            self.executor = ResourceThreadPoolExecutor(max_workers=max_workers)
+
+    def admit(self, n_running):
+        return self.admission is None or self.admission.admit(n_running)
+
+    def parallel_limit(self, n_parallel):
+        return n_parallel if self.admission is None else self.admission.limit(n_parallel)
+
+    def _resource_type(self):
+        for res, cname in _SupportResource.items():
+            if cname == self.__class__.__name__:
+                return res
+        return None
+
+    def run_job(self, job, rid, exp_config, call_back_func, taken=False, **kwargs):
+        if self.watchdog is not None and self.watchdog.speculative:
+            self.launched[job.jid] = (job, exp_config, call_back_func, kwargs)
+        super(CPUResourceManager, self).run_job(job, rid, exp_config, call_back_func, taken=taken, **kwargs)
+
+    def _speculate(self, jid):
+        """
+        Run a copy of a straggler on another free resource, the first copy to finish wins
+
+        :param jid: job ID
+        :type jid: int
+        """
+        if jid not in self.launched or jid not in self.jobs:
+            return
+        job, exp_config, call_back_func, kwargs = self.launched[jid]
+        rid = self.take_available(None, self._resource_type(), rid_blacklist=[self.jobs[jid]])
+        if rid is None:
+            logger.debug("No free resource for a copy of job %d" % jid)
+            return
+        job_copy = copy.copy(job)
+        job_copy.copy_number = 1
+        logger.info("Run a copy of job %d on resource %d" % (jid, rid))
+        self.run(job_copy, rid, exp_config, call_back_func, **kwargs)
 
     def finish(self, maximize=True, status="FINISHED"):
         self.executor.shutdown(wait=True)
+        if self.admission is not None:
+            self.admission.close()
         best_result = super(CPUResourceManager, self).finish(status)
 
-        self.connector.free_all_resources()
+        if self.shared:
+            # the other experiments still run jobs on their resources
+            for rid in self.jobs.values():
+                self.connector.free_used_resource(rid)
+        else:
+            self.connector.free_all_resources()
 
         if self.save_model is True and best_result is not None and status == 'FINISHED':
             logger.info("Experiment finished, starting best job")
@@ -61,15 +207,8 @@ class CPUResourceManager(AbstractResourceManager):
             best_job_config['save_model'] = True
             best_job_config['folder_name'] = 'models_{}'.format(self.eid)
 
-            # todo improve
-            _rtype = None
-            for res, cname in _SupportResource.items():
-                if cname == self.__class__.__name__:
-                    _rtype = res
-                    break
-
             # all should be free, but just in case
-            rids = self.connector.get_available_resource(None, _rtype)
+            rids = self.connector.get_available_resource(None, self._resource_type())
             free_rid = random.choice(rids) if rids else None
             best_job = Job(self.script, best_job_config, self.workingdir)
             # special job id for best job
@@ -83,6 +222,12 @@ class CPUResourceManager(AbstractResourceManager):
 
             self.executor.shutdown(wait=True)
 
+        if self.watchdog is not None:
+            self.watchdog.close()
+        if self.fork_servers is not None:
+            self.fork_servers.close()
+        if self.warm_workers is not None:
+            self.warm_workers.close()
         return best_result
 
     def run(self, job, rid, exp_config, call_back_func, **kwargs):
@@ -93,57 +238,51 @@ class CPUResourceManager(AbstractResourceManager):
             kwargs["env"]["CUDA_VISIBLE_DEVICES"] = ""
         else:
             kwargs["env"] = kwargs["env"]
+        cores = self.core_pool.apply(rid, kwargs) if self.core_pool is not None else None
+        key = _copy_key(job)
+        if self.watchdog is not None:
+            with self.copies_lock:
+                self.copies.setdefault(job.jid, set()).add(key[1])
 
         def job_run():
             logger.debug("Job %d started" % job.jid)
-            save_model_flag = job.config.get('save_model', False)
             config_path = None
             log_dump_path = None
             result = None
             res = "ERROR"
             proc = None
-            script = None
             output = None
 
             try:
-                if save_model_flag is not True or self.one_shot:
-                    config_path = os.path.join(job.path, "jobs", "%d.json" % job.jid)
-                    log_dump_path = os.path.join(job.path, "jobs", "%d.%d.out" % (job.jid, job.curr_retries))
-                else:
-                    config_path = os.path.join(job.path, "jobs", 'best_job_%d.json' % self.eid)
-                    log_dump_path = os.path.join(job.path, "jobs", "best_job_%d.out" % self.eid)
-
+                config_path, log_dump_path = self._job_files(job)
                 result = "%s\n%s" % (job.script, config_path)
 
-                job.verify_local()
-                job.config.save(config_path)
-
-                script = job.script.split(" ") + [config_path]
-                proc = subprocess.Popen(script, cwd=job.path,
-                                        stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
-                                        **kwargs)
-                output = ""
-                with open(log_dump_path, 'w') as fp:
-                    while True:
-                        if self.is_job_stopped(job.jid) == True:
-                            proc.kill()
-                            raise StopIteration()
+                proc = self._start_process(job, config_path, rid, cores=cores, **kwargs)
+                output = _OutputTail()
+                if getattr(proc, "results", None) is not None:
+                    res = self._follow_channels(job, proc, log_dump_path, output)
+                else:
+                    with open(log_dump_path, 'w') as fp:
+                        while True:
+                            if self.is_job_stopped(job.jid) == True:
+                                proc.kill()
+                                raise StopIteration()
 
-                        line = proc.stdout.readline()
-                        if not line:
-                            break
+                            line = proc.stdout.readline()
+                            if not line:
+                                break
+                            if self.watchdog is not None:
+                                self.watchdog.touch(key)
 
-                        line_str = line.decode(sys.stdin.encoding if sys.stdin.encoding is not None else 'UTF-8')
-                        output += line_str
+                            line_str = line.decode(sys.stdin.encoding if sys.stdin.encoding is not None else 'UTF-8')
+                            output.append(line)
 
-                        interm_res = parse_one_line(line_str)
-                        if interm_res != None:
-                            res = interm_res[0]
-                            irid = self.append_interm_res(job.jid, interm_res[0])
-                            self.append_multiple_results(job.jid, irid, self.eid, interm_res[1:])
+                            score = self._parse_output(job, line_str)
+                            if score is not None:
+                                res = score
 
-                        # continuously write to jid.out file
-                        fp.write(line_str)
+                            # continuously write to jid.out file
+                            fp.write(line_str)
 
                 # set the flag in multiple_result table
                 self.set_last_multiple_results(self.eid, job.jid)
@@ -165,7 +304,7 @@ class CPUResourceManager(AbstractResourceManager):
                 output = str(e)
             finally:
                 if res == "ERROR" and output is not None:
-                    self.log_error_message(output)
+                    self.log_error_message(str(output))
                 # should be already terminated, but just in case
                 if proc is not None:
                     proc.kill()
@@ -177,6 +316,11 @@ class CPUResourceManager(AbstractResourceManager):
             Use to collect result. Don't change.
             """
             logger.debug("Callback for job %d" % job.jid)
+            started_at = self.started_at.pop(key, None)
+            if started_at is not None:
+                JOB_RUNTIME.observe(time.time() - started_at)
+            if self.admission is not None and key[1] == 0:
+                self.admission.untrack(job.jid)
             try:
                 self.lock.acquire(True)
                 if future3.exception():
@@ -186,14 +330,368 @@ class CPUResourceManager(AbstractResourceManager):
                     raise ChildProcessError
                 result = future3.result()
                 logger.debug("Callback result: %s" % result.__str__())
-                call_back_func(*result)
+                if self.watchdog is not None:
+                    result = self._first_to_finish(key, rid, result[0]), job.jid
+                if result[0] is not None:
+                    call_back_func(*result)
             except ChildProcessError:
                 logger.fatal("Use ctrl+c to stop experiment")
             finally:
                 self.running.pop(self.running.index(future3))
                 self.lock.release()
 
-        future = self.executor.submit(job_run)
+        if isinstance(self.executor, ResourceSelectorExecutor):
+            future = self._submit_process(job, rid, cores=cores, **kwargs)
+        else:
+            future = self.executor.submit(job_run)
         if future is not None:
             self.running.append(future)
-            future.add_done_callback(call_back) 
+            future.add_done_callback(call_back)
+
+    def _first_to_finish(self, key, rid, score):
+        """
+        Decide which copy of a job gives the result, the others are killed.
+        A failed copy only gives the result if no other copy is running.
+        A copy killed by the watchdog fails, even if it printed a result before.
+
+        :param key: job ID and copy number of the finished copy
+        :type key: (int, int)
+        :param rid: resource ID of the copy
+        :type rid: int
+        :param score: result of the copy
+        :type score: float | str
+        :return: result given to the experiment, None if the result of another copy is used
+        :rtype: float | str
+        """
+        jid, number = key
+        reason = self.watchdog.untrack(key, success=score not in ("ERROR", "EARLY STOPPED"))
+        if reason is not None:
+            self.log_error_message("Job %d is killed: %s" % (jid, reason))
+            if score != "EARLY STOPPED":
+                score = "ERROR"  # the last result printed by the job is not final
+        if number > 0:  # the resource of the first run is freed with the job
+            self.connector.free_used_resource(rid)
+        with self.copies_lock:
+            copies = self.copies.get(jid)
+            if copies is None:
+                return None  # another copy won
+            copies.discard(number)
+            if score == "ERROR" and copies:
+                return None
+            del self.copies[jid]
+        self.launched.pop(jid, None)
+        for other in copies:
+            self.watchdog.kill((jid, other), "another copy finished first")
+        return score
+
+    def _job_files(self, job):
+        """
+        Paths of the job configuration and output files
+
+        :param job: job to run
+        :type job: Job
+        :return: configuration path, output path
+        :rtype: (str, str)
+        """
+        save_model_flag = job.config.get('save_model', False)
+        if save_model_flag is not True or self.one_shot:
+            config_path = os.path.join(job.path, "jobs", "%d.json" % job.jid)
+            log_dump_path = os.path.join(job.path, "jobs", "%d.%d.out" % (job.jid, job.curr_retries))
+            if _copy_key(job)[1] > 0:
+                log_dump_path = os.path.join(job.path, "jobs", "%d.%d.copy.out" % (job.jid, job.curr_retries))
+        else:
+            config_path = os.path.join(job.path, "jobs", 'best_job_%d.json' % self.eid)
+            log_dump_path = os.path.join(job.path, "jobs", "best_job_%d.out" % self.eid)
+        return config_path, log_dump_path
+
+    def _start_process(self, job, config_path, rid, cores=None, **kwargs):
+        job.verify_local()
+        data = None
+        if self.config_channel == "file":
+            job.config.save(config_path)
+        else:
+            data = json.dumps(job.config)
+            config_path = "-"
+
+        proc = None
+        if self.warm_workers is not None:
+            proc = self.warm_workers.start(job.script, job.path, config_path, rid, data=data,
+                                           results=self.result_channel, cores=cores, **kwargs)
+        if proc is None and self.fork_servers is not None:
+            proc = self.fork_servers.start(job.script, job.path, config_path, data=data,
+                                           results=self.result_channel, cores=cores, **kwargs)
+        if proc is None:
+            proc = self._popen(job, config_path, data, **kwargs)
+            if cores is not None:
+                pin(proc.pid, cores)
+        key = _copy_key(job)
+        self.started_at[key] = time.time()
+        if getattr(job, "proposed_at", None) is not None:
+            JOB_QUEUE.observe(self.started_at[key] - job.proposed_at)
+            job.proposed_at = None
+        if self.admission is not None and key[1] == 0:
+            self.admission.track(job.jid, proc.pid)
+        if self.watchdog is not None:
+            self.watchdog.track(key, proc)
+        return proc
+
+    def _popen(self, job, config_path, data, **kwargs):
+        """
+        Start the job in a new process
+
+        :param job: job to run
+        :type job: Job
+        :param config_path: job configuration file
+        :type config_path: str
+        :param data: job configuration in JSON, sent over ``config_channel`` if not None
+        :type data: str
+        :return: job process, with ``results`` the read end of the result pipe if ``result_channel`` is set
+        :rtype: subprocess.Popen
+        """
+        fds = []  # pipe ends of the job, closed here once it is started
+        stream = None
+        results = None
+        if data is not None and self.config_channel == "stdin":
+            kwargs["stdin"] = subprocess.PIPE
+        elif data is not None:
+            r, w = os.pipe()
+            fds.append(r)
+            stream = os.fdopen(w, "wb")
+            config_path = "/dev/fd/%d" % r
+        if self.result_channel:
+            r, w = os.pipe()
+            fds.append(w)
+            results = os.fdopen(r, "rb")
+            kwargs["env"] = dict(kwargs.get("env") or os.environ)
+            kwargs["env"]["AUP_RESULT_FD"] = str(w)
+        try:
+            proc = subprocess.Popen(job.script.split(" ") + [config_path], cwd=job.path, pass_fds=fds,
+                                    stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                    **kwargs)
+        except BaseException:
+            for f in (stream, results):
+                if f is not None:
+                    f.close()
+            raise
+        finally:
+            for fd in fds:
+                os.close(fd)
+        proc.results = results
+
+        if data is not None:
+            stream = stream if stream is not None else proc.stdin
+            try:
+                with stream:
+                    stream.write(data.encode("utf-8"))
+            except BrokenPipeError:
+                logger.debug("Job %d did not read its configuration" % job.jid)
+        return proc
+
+    def _follow_channels(self, job, proc, log_dump_path, output):
+        """
+        Copy the output of a job to its log in chunks, and save the results received over the result pipe,
+        or printed in the output until a result is received
+
+        :param job: running job
+        :type job: Job
+        :param proc: job process, with ``results``
+        :type proc: subprocess.Popen
+        :param log_dump_path: job log
+        :type log_dump_path: str
+        :param output: end of the output, for the error message
+        :type output: _OutputTail
+        :return: last result, "ERROR" if none
+        :rtype: float | str
+        """
+        res = "ERROR"
+        received = False
+        buffer = b""
+        pending = b""  # incomplete line of the output
+        with open(log_dump_path, 'wb') as fp, selectors.DefaultSelector() as selector:
+            selector.register(proc.stdout, selectors.EVENT_READ, False)
+            selector.register(proc.results, selectors.EVENT_READ, True)
+            while selector.get_map():
+                if self.is_job_stopped(job.jid) == True:
+                    proc.kill()
+                    raise StopIteration()
+                # results first, print_result sends them before printing them
+                for key, _ in sorted(selector.select(timeout=SELECT_TIMEOUT), key=lambda event: not event[0].data):
+                    data = os.read(key.fd, READ_SIZE)
+                    if not data:
+                        selector.unregister(key.fileobj)
+                    elif key.data:
+                        lines = (buffer + data).split(b"\n")
+                        buffer = lines.pop()
+                        for line in lines:
+                            if line.strip():
+                                received = True
+                                res = self._parse_result_message(job, line)
+                    else:
+                        fp.write(data)
+                        output.append(data)
+                        if self.watchdog is not None:
+                            self.watchdog.touch(_copy_key(job))
+                        if not received:
+                            pending, score = self._parse_output_chunk(job, pending, data)
+                            if score is not None:
+                                res = score
+        if buffer.strip():
+            received = True
+            res = self._parse_result_message(job, buffer)
+        proc.results.close()
+        if not received:
+            score = self._parse_output_chunk(job, pending, b"\n")[1]
+            if score is not None:
+                res = score
+        return res
+
+    def _parse_output(self, job, line_str):
+        """
+        Save the result if one is printed on the line (see :func:`aup.utils.print_result`)
+
+        :param job: running job
+        :type job: Job
+        :param line_str: one line of the job output
+        :type line_str: str
+        :return: score if the line is a result, else None
+        :rtype: float | None
+        """
+        with RESULT_PARSE.time():
+            interm_res = parse_one_line(line_str)
+            if interm_res is None:
+                return None
+            return self._save_result(job, interm_res)
+
+    def _parse_output_chunk(self, job, pending, data):
+        """
+        Save the results printed in a chunk of the output, for the jobs not using the result pipe
+
+        :param job: running job
+        :type job: Job
+        :param pending: incomplete last line of the previous chunks
+        :type pending: bytes
+        :param data: chunk of the output
+        :type data: bytes
+        :return: incomplete last line, last score (None if none)
+        :rtype: (bytes, float | None)
+        """
+        encoding = sys.stdin.encoding if sys.stdin.encoding is not None else 'UTF-8'
+        lines = (pending + data).split(b"\n")
+        res = None
+        for line in lines[:-1]:
+            score = self._parse_output(job, line.decode(encoding, "replace"))
+            if score is not None:
+                res = score
+        return lines[-1][-OUTPUT_TAIL:], res
+
+    def _parse_result_message(self, job, message):
+        """
+        Save a result received over the result pipe (see :func:`aup.utils.print_result`)
+
+        :param job: running job
+        :type job: Job
+        :param message: one JSON line
+        :type message: bytes
+        :return: score
+        :rtype: float
+        """
+        with RESULT_PARSE.time():
+            return self._save_result(job, parse_result_message(message))
+
+    def _save_result(self, job, interm_res):
+        if _copy_key(job)[1] > 0:  # intermediate results are saved by the first run only
+            return interm_res[0]
+        irid = self.append_interm_res(job.jid, interm_res[0])
+        self.append_multiple_results(job.jid, irid, self.eid, interm_res[1:])
+        return interm_res[0]
+
+    def _submit_process(self, job, rid, cores=None, **kwargs):
+        """
+        Start the job and follow it with :class:`ResourceSelectorExecutor`, same behavior as the threaded ``job_run``
+
+        :param job: job to run
+        :type job: Job
+        :param rid: resource ID
+        :type rid: int
+        :param cores: cores to pin the job to
+        :type cores: [int]
+        :return: future of (score, jid)
+        :rtype: concurrent.futures.Future
+        """
+        logger.debug("Job %d started" % job.jid)
+        config_path, log_dump_path = self._job_files(job)
+        encoding = sys.stdin.encoding if sys.stdin.encoding is not None else 'UTF-8'
+        try:
+            proc = self._start_process(job, config_path, rid, cores=cores, **kwargs)
+        except (Exception, EnvironmentError) as e:
+            logger.fatal("Failed to run job:\n%s\n%s", job.script, config_path)
+            logger.fatal("Error message might not be right: %s", e)
+            self.log_error_message(str(e))
+            future = Future()
+            future.set_result(("ERROR", job.jid))
+            return future
+
+        channels = getattr(proc, "results", None) is not None
+        fp = open(log_dump_path, 'wb' if channels else 'w')
+        output = _OutputTail()
+        res = "ERROR"
+        received = False
+        pending = b""  # incomplete line of the output
+
+        def on_line(line):
+            nonlocal res
+            if self.watchdog is not None:
+                self.watchdog.touch(_copy_key(job))
+            line_str = line.decode(encoding)
+            output.append(line)
+            score = self._parse_output(job, line_str)
+            if score is not None:
+                res = score
+            fp.write(line_str)
+
+        def on_chunk(data):
+            nonlocal res, pending
+            if self.watchdog is not None:
+                self.watchdog.touch(_copy_key(job))
+            output.append(data)
+            fp.write(data)
+            if not received:
+                pending, score = self._parse_output_chunk(job, pending, data)
+                if score is not None:
+                    res = score
+
+        def on_result(line):
+            nonlocal res, received
+            if line.strip():
+                received = True
+                res = self._parse_result_message(job, line)
+
+        def on_exit(stopped, error):
+            nonlocal res
+            fp.close()
+            if stopped:
+                logger.debug("Job stopped")
+                return "EARLY STOPPED", job.jid
+            if error is not None:
+                logger.fatal("Failed to run job:\n%s\n%s", job.script, config_path)
+                self.log_error_message(str(error))
+                return "ERROR", job.jid
+            if channels and not received:
+                score = self._parse_output_chunk(job, pending, b"\n")[1]
+                if score is not None:
+                    res = score
+
+            # set the flag in multiple_result table
+            self.set_last_multiple_results(self.eid, job.jid)
+            if res == "ERROR":
+                logger.fatal("Failed to parse result, check %s", log_dump_path)
+                self.log_error_message(str(output))
+            return res, job.jid
+
+        future = self.executor.submit(proc, on_line, on_exit, should_stop=lambda: self.is_job_stopped(job.jid),
+                                      on_chunk=on_chunk if channels else None,
+                                      on_result=on_result if channels else None)
+        if future is None:
+            proc.kill()
+            fp.close()
+        return future
@@ -29,9 +29,9 @@ class PassiveResourceManager(AbstractResourceManager):
         super(PassiveResourceManager, self).__init__(connector, *args, **kwargs)
         self.running = False
 
-    def get_available(self, username, rtype):
+    def get_available(self, username, rtype, rid_blacklist=None, config=None):
         if not self.running:
-            rid = super(PassiveResourceManager, self).get_available(username, rtype)
+            rid = super(PassiveResourceManager, self).get_available(username, rtype, rid_blacklist, config)
             if rid:
                 return rid
             else:
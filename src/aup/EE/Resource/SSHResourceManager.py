@@ -131,6 +131,10 @@ class SSHResourceManager(CPUResourceManager):  # pragma: no cover
         logger.debug("Load resources %s", json.dumps(d))
         return {int(i): d[i] for i in d}
 
+    def host_of(self, rid):
+        # username@ip:port of the node, without the ssh key
+        return self.mapping[rid].split(" ")[0] if rid in self.mapping else None
+
     def run(self, job, rid, exp_config, call_back_func, **kwargs):
         # experiment.json -> runtime_args will be loaded here
         logger.debug("Job %d started on node %s", job.jid, self.mapping)
@@ -0,0 +1,199 @@
+"""
+..
+  Copyright (c) 2018 LG Electronics Inc.
+  SPDX-License-Identifier: GPL-3.0-or-later
+
+aup.EE.Resource.utils.Admission
+===============================
+
+Admission control of local jobs, by host load and memory.
+
+``n_parallel`` is fixed when the experiment starts, but the memory used by a job can vary a lot across the
+search space, and running too many jobs leads to OOM kills or swapping.
+:class:`AdmissionControl` follows the load average, the available memory and the peak RSS of the running jobs
+(including their child processes), and a new job is started only if:
+
+* the busy cores (load average, or running jobs if higher) plus the cores of the new job stay under
+  ``max_load`` times the number of cores,
+* the available memory, less the expected peak RSS of the new job and the expected growth of the running ones,
+  stays above ``min_free_memory``.
+
+The expected peak RSS is the highest peak seen so far, times ``memory_margin``.
+One job is always admitted if none is running.
+Deferred jobs are submitted again when a job finishes, or after ``sleep_time`` seconds.
+
+With ``dynamic``, up to ``max_parallel`` jobs can run (instead of ``n_parallel``) when the host has room for them.
+
+It is enabled in ``resource_args`` by::
+
+  "admission": {
+    "max_load": 1.0,
+    "min_free_memory": 512,
+    "memory_margin": 1.2,
+    "dynamic": false,
+    "max_parallel": <n_parallel>,
+    "interval": 1
+  }
+
+where ``min_free_memory`` is in MB and ``interval`` is the time between two RSS samples, in seconds.
+
+APIs
+----
+"""
+import logging
+import os
+import threading
+from collections import deque
+
+import psutil
+
+from ....utils import set_default_keyvalue
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+HISTORY_SIZE = 100  # peak RSS of the latest finished jobs
+
+
+def _rss(process):
+    """
+    :return: RSS of the process and its children, 0 if it is finished
+    :rtype: int
+    """
+    try:
+        rss = process.memory_info().rss
+        for child in process.children(recursive=True):
+            try:
+                rss += child.memory_info().rss
+            except psutil.Error:
+                pass
+        return rss
+    except psutil.Error:
+        return 0
+
+
+class AdmissionControl(object):
+    """
+    Decide if a new job can start on this host
+
+    :param config: configuration of ``admission`` in ``resource_args``
+    :type config: dict
+    :param n_parallel: number of parallel jobs of the experiment
+    :type n_parallel: int
+    :param cores_per_job: cores used by each job
+    :type cores_per_job: int
+    """
+
+    def __init__(self, config, n_parallel, cores_per_job=1):
+        set_default_keyvalue("max_load", 1.0, config, log=logger)
+        set_default_keyvalue("min_free_memory", 512, config, log=logger)
+        set_default_keyvalue("memory_margin", 1.2, config, log=logger)
+        set_default_keyvalue("dynamic", False, config, log=logger)
+        set_default_keyvalue("max_parallel", n_parallel, config, log=logger)
+        set_default_keyvalue("interval", 1, config, log=logger)
+        self.max_load = float(config["max_load"])
+        self.min_free_memory = config["min_free_memory"] * MB
+        self.memory_margin = float(config["memory_margin"])
+        self.dynamic = config["dynamic"]
+        self.max_parallel = int(config["max_parallel"])
+        self.interval = config["interval"]
+        self.cores_per_job = cores_per_job
+        self.n_cores = psutil.cpu_count() or 1
+
+        self.processes = dict()  # jid -> psutil.Process
+        self.peaks = dict()  # jid -> peak RSS so far
+        self.history = deque(maxlen=HISTORY_SIZE)
+        self.lock = threading.Lock()
+        self.closed = threading.Event()
+        self.thread = threading.Thread(target=self._sample_loop, daemon=True)
+        self.thread.start()
+
+    def track(self, jid, pid):
+        """
+        Follow the memory of a started job
+
+        :param jid: job ID
+        :type jid: int
+        :param pid: process ID of the job
+        :type pid: int
+        """
+        try:
+            process = psutil.Process(pid)
+        except psutil.Error:
+            return
+        with self.lock:
+            self.processes[jid] = process
+            self.peaks[jid] = 0
+        self.sample()
+
+    def untrack(self, jid):
+        """
+        Stop following a finished job, its peak RSS is kept for the next estimations
+
+        :param jid: job ID
+        :type jid: int
+        """
+        with self.lock:
+            self.processes.pop(jid, None)
+            peak = self.peaks.pop(jid, None)
+            if peak:
+                self.history.append(peak)
+
+    def sample(self):
+        with self.lock:
+            processes = list(self.processes.items())
+        rss = {jid: _rss(process) for jid, process in processes}
+        with self.lock:
+            for jid, value in rss.items():
+                if jid in self.peaks:
+                    self.peaks[jid] = max(self.peaks[jid], value)
+        return rss
+
+    def _sample_loop(self):
+        while not self.closed.wait(self.interval):
+            self.sample()
+
+    def close(self):
+        self.closed.set()
+
+    def expected_memory(self):
+        """
+        :return: expected peak RSS of a job, 0 if unknown
+        :rtype: float
+        """
+        with self.lock:
+            peaks = list(self.history) + list(self.peaks.values())
+        return max(peaks or [0]) * self.memory_margin
+
+    def limit(self, n_parallel):
+        """
+        :param n_parallel: number of parallel jobs of the experiment
+        :type n_parallel: int
+        :return: max number of parallel jobs
+        :rtype: int
+        """
+        return max(n_parallel, self.max_parallel) if self.dynamic else n_parallel
+
+    def admit(self, n_running):
+        """
+        :param n_running: number of running jobs of the experiment
+        :type n_running: int
+        :return: True if a new job fits on the host
+        :rtype: bool
+        """
+        if n_running == 0:
+            return True
+        rss = self.sample()
+        load = os.getloadavg()[0] if hasattr(os, "getloadavg") else psutil.cpu_percent() / 100. * self.n_cores
+        busy = max(load, n_running * self.cores_per_job)
+        if busy + self.cores_per_job > self.max_load * self.n_cores:
+            logger.debug("Job deferred, load %.1f on %d cores" % (busy, self.n_cores))
+            return False
+
+        expected = self.expected_memory()
+        growth = sum(max(0., expected - value) for value in rss.values())
+        available = psutil.virtual_memory().available
+        if available - growth - expected < self.min_free_memory:
+            logger.debug("Job deferred, %d MB available for %d MB per job" % (available / MB, expected / MB))
+            return False
+        return True
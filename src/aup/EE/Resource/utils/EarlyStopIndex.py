@@ -0,0 +1,238 @@
+"""
+..
+  Copyright (c) 2018 LG Electronics Inc.
+  SPDX-License-Identifier: GPL-3.0-or-later
+
+aup.EE.Resource.utils.EarlyStopIndex
+====================================
+
+In-memory statistics of the intermediate results, for the early stopping policies (see :doc:`early_stop`).
+
+The index is updated with each intermediate result reported by a job
+(:func:`aup.EE.Resource.AbstractResourceManager.AbstractResourceManager.append_interm_res`),
+instead of querying all intermediate results of the experiment from the database at every pass of the daemon.
+
+For each job, the average and best value of its first ``step`` results are kept at every multiple of
+``aup_policy_steps``.
+For each such step, the averages and best values of all jobs reaching it are kept sorted,
+so that the median, the best value and the rank of a job among the other jobs take ``O(log n)``.
+
+Jobs stopped early or failed are removed from the statistics, finished jobs are kept.
+
+APIs
+----
+"""
+import bisect
+import threading
+
+
+def _remove(values, value):
+    del values[bisect.bisect_left(values, value)]
+
+
+class EarlyStopIndex(object):
+    """
+    Per-step statistics of the intermediate results of the jobs of an experiment
+
+    :param maximize: whether larger results are better
+    :type maximize: bool
+    :param policy_steps: interval of the steps compared by the policies, ``aup_policy_steps``
+    :type policy_steps: int
+    """
+
+    def __init__(self, maximize=True, policy_steps=1):
+        self.maximize = maximize
+        self.policy_steps = policy_steps
+        self.lock = threading.Lock()
+        self.results = dict()  # jid -> intermediate results
+        self.sums = dict()  # jid -> sum of the results
+        self.bests = dict()  # jid -> best result
+        self.prefix = dict()  # jid -> {step: (average, best)} of the first step results
+        self.steps = dict()  # step -> (sorted averages, sorted best values) of the jobs in the statistics
+        self.excluded = set()  # jobs removed from the statistics
+        self.finished = dict()  # jid -> best result of the finished jobs
+        self.finished_bests = []  # sorted best results of the finished jobs
+
+    def _better(self, a, b):
+        return a >= b if self.maximize else a <= b
+
+    def _reset(self, jid):
+        self._drop(jid)
+        self.excluded.discard(jid)
+        if jid in self.finished:
+            _remove(self.finished_bests, self.finished.pop(jid))
+        self.results[jid] = []
+        self.sums[jid] = 0.
+        self.bests.pop(jid, None)
+        self.prefix[jid] = dict()
+
+    def _drop(self, jid):
+        if jid in self.excluded:
+            return
+        for step, (average, best) in self.prefix.get(jid, {}).items():
+            averages, bests = self.steps[step]
+            _remove(averages, average)
+            _remove(bests, best)
+
+    def _append(self, jid, value):
+        results = self.results[jid]
+        results.append(value)
+        self.sums[jid] += value
+        if jid not in self.bests or self._better(value, self.bests[jid]):
+            self.bests[jid] = value
+        step = len(results)
+        if step % self.policy_steps == 0:
+            average, best = self.sums[jid] / step, self.bests[jid]
+            self.prefix[jid][step] = (average, best)
+            if jid not in self.excluded:
+                averages, bests = self.steps.setdefault(step, ([], []))
+                bisect.insort(averages, average)
+                bisect.insort(bests, best)
+
+    def start(self, jid):
+        """
+        Start (or restart after a failure) a job, with no result
+        """
+        with self.lock:
+            self._reset(jid)
+
+    def append(self, jid, value):
+        """
+        Add an intermediate result of a job
+
+        :param jid: job ID
+        :type jid: int
+        :param value: intermediate result
+        :type value: float
+        """
+        with self.lock:
+            if jid not in self.results:
+                self._reset(jid)
+            self._append(jid, value)
+
+    def add_finished(self, jid, values):
+        """
+        Add a job finished before, e.g. loaded from the database when the experiment is resumed
+
+        :param jid: job ID
+        :type jid: int
+        :param values: intermediate results of the job
+        :type values: [float]
+        """
+        with self.lock:
+            if jid in self.results:
+                return
+            self._reset(jid)
+            for value in values:
+                self._append(jid, value)
+            self._finish(jid)
+
+    def _finish(self, jid):
+        if jid in self.bests and jid not in self.finished:
+            self.finished[jid] = self.bests[jid]
+            bisect.insort(self.finished_bests, self.bests[jid])
+
+    def finish(self, jid):
+        """
+        Mark a job as finished, its results are kept for the comparisons
+        """
+        with self.lock:
+            if jid in self.results and jid not in self.excluded:
+                self._finish(jid)
+
+    def exclude(self, jid):
+        """
+        Remove a job (stopped early, failed) from the statistics
+        """
+        with self.lock:
+            if jid in self.results:
+                self._drop(jid)
+            if jid in self.finished:
+                _remove(self.finished_bests, self.finished.pop(jid))
+            self.excluded.add(jid)
+
+    def count(self, jid):
+        """
+        :return: number of intermediate results of a job
+        :rtype: int
+        """
+        with self.lock:
+            return len(self.results.get(jid, ()))
+
+    def values(self, jid):
+        """
+        :return: copy of the intermediate results of a job
+        :rtype: [float]
+        """
+        with self.lock:
+            return list(self.results.get(jid, ()))
+
+    def count_others(self, jid, step):
+        """
+        :return: number of other jobs in the statistics with at least ``step`` results, 0 if the job is not in them
+        :rtype: int
+        """
+        with self.lock:
+            if jid in self.excluded or step not in self.prefix.get(jid, {}):
+                return 0
+            return len(self.steps[step][0]) - 1
+
+    def median(self, jid, step):
+        """
+        Median of the averages of the first ``step`` results of the other jobs (see :func:`count_others`)
+
+        :return: median of the other jobs, average of the job
+        :rtype: (float, float)
+        """
+        with self.lock:
+            average = self.prefix[jid][step][0]
+            averages = self.steps[step][0]
+            idx = bisect.bisect_left(averages, average)
+            n = len(averages) - 1
+
+            def other(i):  # i-th value without the job
+                return averages[i] if i < idx else averages[i + 1]
+
+            median = other(n // 2) if n % 2 else (other(n // 2 - 1) + other(n // 2)) / 2.
+            return median, average
+
+    def best(self, jid, step):
+        """
+        Best of the first ``step`` results of the other jobs (see :func:`count_others`)
+
+        :return: best value of the other jobs, best value of the job
+        :rtype: (float, float)
+        """
+        with self.lock:
+            best = self.prefix[jid][step][1]
+            bests = self.steps[step][1]
+            idx = bisect.bisect_left(bests, best)
+            if self.maximize:
+                return (bests[-2] if idx == len(bests) - 1 else bests[-1]), best
+            return (bests[1] if idx == 0 else bests[0]), best
+
+    def rank(self, jid, step):
+        """
+        Rank of a job from the worst, by the best of the first ``step`` results, ties ranked before the job
+
+        :return: rank (from 1), number of jobs including the job, best value of the job
+        :rtype: (int, int, float)
+        """
+        with self.lock:
+            best = self.prefix[jid][step][1]
+            bests = self.steps[step][1]
+            if self.maximize:
+                rank = bisect.bisect_right(bests, best)
+            else:
+                rank = len(bests) - bisect.bisect_left(bests, best)
+            return rank, len(bests), best
+
+    def finished_best(self):
+        """
+        :return: best result of the finished jobs, None if no finished job has results
+        :rtype: float
+        """
+        with self.lock:
+            if not self.finished_bests:
+                return None
+            return self.finished_bests[-1] if self.maximize else self.finished_bests[0]
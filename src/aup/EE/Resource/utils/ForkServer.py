@@ -0,0 +1,530 @@
+"""
+..
+  Copyright (c) 2018 LG Electronics Inc.
+  SPDX-License-Identifier: GPL-3.0-or-later
+
+aup.EE.Resource.utils.ForkServer
+================================
+
+Run the jobs of :func:`aup.aup_args` scripts in processes forked from a pre-imported copy of the script.
+
+Each job is normally a new interpreter, which imports the script and its libraries again, often for longer than
+a short trial runs.
+A :class:`ForkServer` starts the script once (as ``python -m aup.EE.Resource.utils.ForkServer``), where the
+``aup_args`` functions are registered instead of being called.
+For each job, the server forks a child process which calls them with the job configuration, its output (including
+the results, see :func:`aup.print_result`) goes to a pipe read by the resource manager, as for a normal job.
+
+The server reaps its children and sends their exit codes back, which are the ``returncode`` of the
+:class:`ForkedProcess`.
+
+The script code outside of the ``aup_args`` function (e.g. imports) runs once, in the server.
+Scripts not using ``aup_args``, or failing to start in the server, run as normal jobs.
+Libraries starting threads or initializing devices on import may not work after a fork;
+the thread caps of ``cores_per_job`` only apply to the libraries not initialized yet.
+
+It is enabled in ``resource_args`` by::
+
+  "fork_server": {
+    "startup_timeout": 300
+  }
+
+where ``startup_timeout`` is the time in seconds to import the script in the server.
+
+APIs
+----
+"""
+import array
+import importlib.machinery
+import importlib.util
+import io
+import json
+import logging
+import os
+import queue
+import selectors
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import traceback
+
+import psutil
+
+from ....utils import set_default_keyvalue
+
+logger = logging.getLogger(__name__)
+
+BUFFER_SIZE = 1024 * 1024  # max size of a request
+MAX_FDS = 2  # output and result pipes
+
+
+def send_message(sock, message, fds=()):
+    data = json.dumps(message).encode("utf-8")
+    if fds:
+        sock.sendmsg([data], [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array("i", fds))])
+    else:
+        sock.sendall(data)
+
+
+def recv_message(sock):
+    """
+    :return: message and file descriptors, None if the socket is closed
+    :rtype: (dict, [int])
+    """
+    fds = array.array("i")
+    data, ancdata, _, _ = sock.recvmsg(BUFFER_SIZE, socket.CMSG_LEN(MAX_FDS * fds.itemsize))
+    for level, kind, cmsg_data in ancdata:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(cmsg_data[:len(cmsg_data) - (len(cmsg_data) % fds.itemsize)])
+    if not data:
+        return None, list(fds)
+    return json.loads(data.decode("utf-8")), list(fds)
+
+
+def python_command(script, path):
+    """
+    Split a job script into the python interpreter, script path and arguments
+
+    :param script: job script, e.g. ``./train.py`` or ``python3 train.py --flag``
+    :type script: str
+    :param path: working directory of the job
+    :type path: str
+    :return: interpreter command, script path, arguments; None if the script is not a python script
+    :rtype: ([str], str, [str])
+    """
+    parts = script.split(" ")
+    if os.path.basename(parts[0]).startswith("python"):
+        if len(parts) < 2 or parts[1].startswith("-"):
+            return None
+        return parts[:1], parts[1], parts[2:]
+    try:
+        with open(os.path.join(path, parts[0])) as f:
+            first = f.readline()
+    except (OSError, UnicodeDecodeError):
+        return None
+    if not first.startswith("#!") or "python" not in first:
+        return None
+    return first[2:].split(), parts[0], parts[1:]
+
+
+def script_contains(path, text):
+    """
+    :return: True if the script contains the text, e.g. ``@aup_args``
+    :rtype: bool
+    """
+    try:
+        with open(path) as f:
+            return text in f.read()
+    except (OSError, UnicodeDecodeError):
+        return False
+
+
+def _exit_code(status):
+    # same as subprocess.Popen.returncode
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+class ForkedProcess(object):
+    """
+    Job process forked by a server, with the interface of :class:`subprocess.Popen` used by the resource managers
+
+    :param pid: process ID
+    :type pid: int
+    :param fd: read end of the output pipe
+    :type fd: int
+    :param results_fd: read end of the result pipe, if any
+    :type results_fd: int
+    """
+
+    def __init__(self, pid, fd, results_fd=None):
+        self.pid = pid
+        self.stdout = os.fdopen(fd, "rb")
+        self.results = os.fdopen(results_fd, "rb") if results_fd is not None else None
+        self.returncode = None
+        self.code = None  # exit code sent by the server, None if the server exited first
+        self.exited = threading.Event()
+
+    def _exit(self, code):
+        self.code = code
+        self.exited.set()
+
+    def kill(self):
+        if self.returncode is not None:
+            return
+        try:
+            os.kill(self.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    def poll(self):
+        if self.returncode is None and self.exited.is_set():
+            self.wait()
+        return self.returncode
+
+    def wait(self):
+        if self.returncode is None:
+            self.exited.wait()
+            if self.code is None:
+                # the exit code is lost with the server
+                try:
+                    psutil.Process(self.pid).wait()
+                except psutil.Error:
+                    pass
+                logger.warning("Exit code of job process %d is unknown, the fork server exited" % self.pid)
+                self.code = 1
+            self.returncode = self.code
+        return self.returncode
+
+
+class ForkServer(object):
+    """
+    Server process with a pre-imported job script
+
+    :param command: interpreter command, script path and arguments, see :func:`python_command`
+    :type command: ([str], str, [str])
+    :param path: working directory of the jobs
+    :type path: str
+    :param config_path: configuration file, given to the script while importing it
+    :type config_path: str
+    :param env: environment of the server
+    :type env: dict
+    :param startup_timeout: time to import the script, in seconds
+    :type startup_timeout: float
+    :raises RuntimeError: if the server fails to start
+    """
+
+    def __init__(self, command, path, config_path, env=None, startup_timeout=300):
+        interpreter, script, args = command
+        self.script = script
+        self.lock = threading.Lock()
+        self.sock, child_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        log_path = os.path.join(path, "jobs", "fork_server.out")
+        try:
+            with open(log_path, "a") as log:
+                self.proc = subprocess.Popen(interpreter + ["-m", __name__, str(child_sock.fileno()), script] +
+                                             args + [config_path], cwd=path, env=env, stdout=log,
+                                             stderr=subprocess.STDOUT, pass_fds=(child_sock.fileno(),))
+        finally:
+            child_sock.close()
+        self.sock.settimeout(startup_timeout)
+        try:
+            message, _ = recv_message(self.sock)
+        except (OSError, ValueError) as e:
+            message = {"error": str(e)}
+        if not message or "error" in message:
+            self.close()
+            raise RuntimeError("Fork server of %s failed to start: %s, check %s" %
+                               (script, message["error"] if message else "exited", log_path))
+        self.sock.settimeout(None)
+        self.replies = queue.Queue()  # replies to spawn, None once the server exited
+        self.processes = dict()  # pid -> running ForkedProcess
+        self.exits = dict()  # pid -> exit code, for the processes exiting before being added to processes
+        self.processes_lock = threading.Lock()
+        self.reader = threading.Thread(target=self._read, daemon=True)
+        self.reader.start()
+        logger.info("Fork server of %s started (pid %d)" % (script, self.proc.pid))
+
+    def _read(self):
+        """
+        Read the messages of the server: replies to :func:`spawn` and exit codes of the jobs
+        """
+        while True:
+            try:
+                message, _ = recv_message(self.sock)
+            except (OSError, ValueError):
+                message = None
+            if message is None:
+                break
+            if "exit" not in message:
+                self.replies.put(message)
+                continue
+            with self.processes_lock:
+                proc = self.processes.pop(message["exit"], None)
+                if proc is None:
+                    self.exits[message["exit"]] = message["code"]
+            if proc is not None:
+                proc._exit(message["code"])
+        self.replies.put(None)
+        with self.processes_lock:
+            processes = list(self.processes.values())
+            self.processes.clear()
+        for proc in processes:
+            proc._exit(None)
+
+    def alive(self):
+        return self.proc.poll() is None
+
+    def spawn(self, config_path, cwd, env=None, cores=None, data=None, results=False):
+        """
+        Start a job
+
+        :param config_path: job configuration file
+        :type config_path: str
+        :param cwd: working directory
+        :type cwd: str
+        :param env: environment variables
+        :type env: dict
+        :param cores: cores to pin the job to
+        :type cores: [int]
+        :param data: job configuration in JSON, read from the standard input of the job if not None
+        :type data: str
+        :param results: send the results over a separate pipe, see :func:`aup.print_result`
+        :type results: bool
+        :return: job process
+        :rtype: ForkedProcess
+        """
+        pipes = [os.pipe() for _ in range(2 if results else 1)]
+        try:
+            with self.lock:
+                send_message(self.sock, {"config": config_path, "cwd": cwd, "data": data,
+                                         "env": dict(env) if env is not None else None, "cores": cores},
+                             [w for _, w in pipes])
+                message = self.replies.get()
+                if message is None:
+                    self.replies.put(None)  # for the next calls
+        except BaseException:
+            for r, _ in pipes:
+                os.close(r)
+            raise
+        finally:
+            for _, w in pipes:
+                os.close(w)
+        if not message or "pid" not in message:
+            for r, _ in pipes:
+                os.close(r)
+            raise RuntimeError("Fork server of %s failed: %s" % (self.script, message.get("error") if message else
+                                                                  "exited"))
+        proc = ForkedProcess(message["pid"], *[r for r, _ in pipes])
+        with self.processes_lock:
+            if proc.pid in self.exits:
+                proc._exit(self.exits.pop(proc.pid))
+            elif self.reader.is_alive():
+                self.processes[proc.pid] = proc
+            else:  # pragma: no cover
+                proc._exit(None)
+        return proc
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)  # wakes up the reader
+        except OSError:
+            pass
+        if hasattr(self, "reader"):
+            self.reader.join()
+        self.sock.close()
+        try:
+            self.proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:  # pragma: no cover
+            self.proc.kill()
+            self.proc.wait()
+
+
+class ForkServerPool(object):
+    """
+    One server by job script, started with the first job
+
+    :param config: configuration of ``fork_server`` in ``resource_args``
+    :type config: dict
+    """
+
+    def __init__(self, config):
+        set_default_keyvalue("startup_timeout", 300, config, log=logger)
+        self.startup_timeout = config["startup_timeout"]
+        self.servers = dict()  # (script, path) -> ForkServer, None if the script does not support it
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def _server(self, script, path, config_path, env):
+        key = (script, path)
+        with self.lock:
+            if self.closed:
+                return None
+            if key in self.servers:
+                server = self.servers[key]
+                if server is None or server.alive():
+                    return server
+                logger.warning("Fork server of %s exited, restart it" % script)
+            command = python_command(script, path)
+            server = None
+            if command is not None and script_contains(os.path.join(path, command[1]), "@aup_args"):
+                try:
+                    server = ForkServer(command, path, config_path, env=env, startup_timeout=self.startup_timeout)
+                except (RuntimeError, OSError) as e:
+                    logger.warning("%s, run the jobs without it" % e)
+            else:
+                logger.info("%s does not use aup_args, run the jobs without fork server" % script)
+            self.servers[key] = server
+            return server
+
+    def start(self, script, path, config_path, env=None, cores=None, data=None, results=False, **kwargs):
+        """
+        Start a job in the fork server of its script
+
+        :param script: job script
+        :type script: str
+        :param path: working directory
+        :type path: str
+        :param config_path: job configuration file
+        :type config_path: str
+        :param env: environment variables
+        :type env: dict
+        :param cores: cores to pin the job to, see :class:`aup.EE.Resource.utils.cpu_affinity.CorePool`
+        :type cores: [int]
+        :param data: job configuration in JSON, see :func:`ForkServer.spawn`
+        :type data: str
+        :param results: send the results over a separate pipe
+        :type results: bool
+        :param kwargs: other arguments of :class:`subprocess.Popen` are not supported
+        :return: job process, None if the job should run without fork server
+        :rtype: ForkedProcess
+        """
+        if not hasattr(os, "fork") or kwargs:
+            return None
+        server = self._server(script, path, config_path, env)
+        if server is None:
+            return None
+        try:
+            return server.spawn(config_path, path, env=env, cores=cores, data=data, results=results)
+        except (RuntimeError, OSError) as e:
+            logger.warning("%s, run the job without it" % e)
+            return None
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            servers = [server for server in self.servers.values() if server is not None]
+            self.servers.clear()
+        for server in servers:
+            server.close()
+
+
+def _reap(sock):
+    """
+    Send the exit codes of the finished children
+    """
+    while True:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if pid == 0:
+            return
+        send_message(sock, {"exit": pid, "code": _exit_code(status)})
+
+
+def _run_child(sock, selector, targets, script, args, message, fds):
+    signal.set_wakeup_fd(-1)
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    for key in list(selector.get_map().values()):
+        if key.fileobj is not sock:
+            os.close(key.fd)
+    selector.close()
+    sock.close()
+    os.dup2(fds[0], 1)
+    os.dup2(fds[0], 2)
+    os.close(fds[0])
+    sys.stdout = os.fdopen(1, "w", buffering=1)
+    sys.stderr = os.fdopen(2, "w", buffering=1)
+    code = 0
+    try:
+        os.chdir(message["cwd"])
+        if message["env"] is not None:
+            os.environ.clear()
+            os.environ.update(message["env"])
+        if len(fds) > 1:
+            os.environ["AUP_RESULT_FD"] = str(fds[1])
+        if message["cores"] is not None and hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, message["cores"])
+        if message["data"] is not None:
+            sys.stdin = io.StringIO(message["data"])
+        sys.argv = [script] + args + [message["config"]]
+        for target in targets:
+            target(message["config"])
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(code)
+
+
+def main(argv):
+    """
+    Server process: import the script and fork a job for each request, see :class:`ForkServer`
+
+    :param argv: socket file descriptor, script path, script arguments and a configuration file for the import
+    :type argv: [str]
+    """
+    # not `from .... import aup`, the package attribute is rebound by `import aup.compression`
+    aup = importlib.import_module("....aup", __package__)
+
+    sock = socket.socket(fileno=int(argv[0]))
+    script, args = argv[1], argv[2:-1]
+    targets = aup._fork_targets = []
+    try:
+        sys.argv = argv[1:]
+        sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+        loader = importlib.machinery.SourceFileLoader("__main__", script)
+        module = importlib.util.module_from_spec(importlib.util.spec_from_loader("__main__", loader))
+        sys.modules["__main__"] = module
+        loader.exec_module(module)
+    except BaseException as e:
+        traceback.print_exc()
+        send_message(sock, {"error": "%s: %s" % (type(e).__name__, e)})
+        return
+    finally:
+        aup._fork_targets = None
+    if not targets:
+        send_message(sock, {"error": "no aup_args function is called"})
+        return
+    # woken up by SIGCHLD to reap the children, see :func:`_reap`
+    wakeup_r, wakeup_w = os.pipe()
+    os.set_blocking(wakeup_r, False)
+    os.set_blocking(wakeup_w, False)
+    signal.set_wakeup_fd(wakeup_w, warn_on_full_buffer=False)
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+    selector = selectors.DefaultSelector()
+    selector.register(sock, selectors.EVENT_READ)
+    selector.register(wakeup_r, selectors.EVENT_READ)
+    send_message(sock, {"ready": True})
+
+    while True:
+        events = selector.select()
+        if any(key.fd == wakeup_r for key, _ in events):
+            try:
+                while os.read(wakeup_r, 4096):
+                    pass
+            except BlockingIOError:
+                pass
+            _reap(sock)
+        if not any(key.fileobj is sock for key, _ in events):
+            continue
+        message, fds = recv_message(sock)
+        if message is None:
+            break
+        sys.stdout.flush()
+        sys.stderr.flush()
+        try:
+            pid = os.fork()
+        except OSError as e:
+            for fd in fds:
+                os.close(fd)
+            send_message(sock, {"error": str(e)})
+            continue
+        if pid == 0:
+            os.close(wakeup_w)
+            _run_child(sock, selector, targets, script, args, message, fds)
+        for fd in fds:
+            os.close(fd)
+        send_message(sock, {"pid": pid})
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,196 @@
+"""
+..
+  Copyright (c) 2018 LG Electronics Inc.
+  SPDX-License-Identifier: GPL-3.0-or-later
+
+aup.EE.Resource.utils.Placement
+===============================
+
+Placement policies, to choose which free resource runs the next job.
+
+The free resources are taken from :class:`aup.ET.Connector.ResourceView.ResourceView`,
+an in-memory copy of the resource table, instead of querying the database for each job.
+It is reloaded every ``placement_refresh`` seconds to follow the other processes.
+
+The policy is selected in ``resource_args`` by ``"placement": <name>``:
+
+* ``random`` (default): any free resource,
+* ``sticky``: prefer the hosts which already ran jobs of the experiment (script verified, dataset cached),
+* ``least_loaded``: prefer the hosts with the lowest ratio of busy resources,
+* ``failure_aware``: avoid the resources (and hosts) with recent job failures,
+* ``affinity``: run a configuration on the host of its previous run, e.g. for Hyperband/BOHB promotions
+  (same configuration with larger ``n_iterations``), or else on the least loaded host.
+
+Ties are broken randomly.
+
+APIs
+----
+"""
+import logging
+import random
+import threading
+import time
+
+from ....ET.Connector.ResourceView import ResourceView
+from ....Proposer.AbstractProposer import point_key
+
+logger = logging.getLogger(__name__)
+
+FAILURE_HALF_LIFE = 600  # seconds, for the failure score of ``failure_aware``
+AFFINITY_IGNORE = ("tid", "n_iterations")  # changed by Hyperband/BOHB when a configuration is promoted
+
+
+class AbstractPlacement(object):
+    """
+    Choose a free resource by the lowest :func:`score`, and keep track of the jobs placed so far
+
+    :param connector: database connector
+    :type connector: AbstractConnector
+    :param host: function returning the host of a resource ID
+    :type host: function object
+    :param refresh: max age of the resource view, see :class:`ResourceView`
+    :type refresh: float
+    """
+    needs_config = False  # whether :func:`select` uses the job configuration
+
+    def __init__(self, connector, host, refresh=1):
+        self.connector = connector
+        self.host = host
+        self.refresh = refresh
+        self._view = None
+        self.lock = threading.Lock()
+        self.hosts = set()  # hosts which ran jobs
+        self.failures = dict()  # rid -> (failure score, time)
+        self.placed = dict()  # configuration key -> host of its latest run
+
+    @property
+    def view(self):
+        if self._view is None:
+            self._view = ResourceView.get(self.connector, self.refresh)
+        return self._view
+
+    def rids_of(self, host, rids=None):
+        """
+        :return: resource IDs in the view on the given host
+        :rtype: [int]
+        """
+        with self.view.lock:
+            rids = list(self.view.resources) if rids is None else rids
+        return [rid for rid in rids if self.host(rid) == host]
+
+    def score(self, rid, config=None):
+        """
+        :param rid: free resource ID
+        :type rid: int
+        :param config: job configuration
+        :type config: dict
+        :return: score of the resource, the lowest is selected
+        :rtype: float
+        """
+        return 0
+
+    def select(self, rids, config=None):
+        """
+        :param rids: free resource IDs
+        :type rids: [int]
+        :param config: job configuration, if known
+        :type config: dict
+        :return: selected resource ID
+        :rtype: int
+        """
+        with self.lock:
+            scores = [self.score(rid, config) for rid in rids]
+        best = min(scores)
+        return random.choice([rid for rid, s in zip(rids, scores) if s == best])
+
+    def started(self, rid, config=None):
+        """
+        Record that a job runs on the resource
+
+        :param rid: resource ID
+        :type rid: int
+        :param config: job configuration
+        :type config: dict
+        """
+        host = self.host(rid)
+        with self.lock:
+            self.hosts.add(host)
+            if config is not None:
+                self.placed[_affinity_key(config)] = host
+
+    def finished(self, rid, failed=False):
+        """
+        Record that a job is finished
+
+        :param rid: resource ID
+        :type rid: int
+        :param failed: whether the job failed
+        :type failed: bool
+        """
+        if failed:
+            with self.lock:
+                self.failures[rid] = (self._failure_score(rid) + 1, time.time())
+
+    def _failure_score(self, rid):
+        score, last = self.failures.get(rid, (0, 0))
+        return score * 0.5 ** ((time.time() - last) / FAILURE_HALF_LIFE)
+
+
+def _affinity_key(config):
+    return point_key({k: v for k, v in config.items() if k not in AFFINITY_IGNORE})
+
+
+class RandomPlacement(AbstractPlacement):
+    pass
+
+
+class StickyPlacement(AbstractPlacement):
+    def score(self, rid, config=None):
+        return 0 if self.host(rid) in self.hosts else 1
+
+
+class LeastLoadedPlacement(AbstractPlacement):
+    def score(self, rid, config=None):
+        return self.view.load_ratio(self.rids_of(self.host(rid)))
+
+
+class FailureAwarePlacement(AbstractPlacement):
+    def score(self, rid, config=None):
+        host = self.host(rid)
+        return self._failure_score(rid) + sum(self._failure_score(r) for r in self.rids_of(host, self.failures)) / 2
+
+
+class AffinityPlacement(LeastLoadedPlacement):
+    needs_config = True
+
+    def score(self, rid, config=None):
+        if config is not None and self.placed.get(_affinity_key(config)) == self.host(rid):
+            return -1
+        return super(AffinityPlacement, self).score(rid, config)
+
+
+_SupportPlacement = {"random": RandomPlacement,
+                     "sticky": StickyPlacement,
+                     "least_loaded": LeastLoadedPlacement,
+                     "failure_aware": FailureAwarePlacement,
+                     "affinity": AffinityPlacement}
+
+
+def get_placement(name, connector, host, refresh=1):
+    """
+    Get the placement policy by name
+
+    :param name: one of random, sticky, least_loaded, failure_aware, affinity
+    :type name: str
+    :param connector: database connector
+    :type connector: AbstractConnector
+    :param host: function returning the host of a resource ID
+    :type host: function object
+    :param refresh: max age of the resource view, see :class:`ResourceView`
+    :type refresh: float
+    :return: placement policy
+    :rtype: AbstractPlacement
+    """
+    if name not in _SupportPlacement:
+        raise ValueError("Placement %s is not supported, choose from %s" % (name, ", ".join(sorted(_SupportPlacement))))
+    return _SupportPlacement[name](connector, host, refresh=refresh)
@@ -0,0 +1,206 @@
+"""
+..
+  Copyright (c) 2018 LG Electronics Inc.
+  SPDX-License-Identifier: GPL-3.0-or-later
+
+aup.EE.Resource.util.ResourceSelectorExecutor
+=============================================
+
+Run many child processes from a single thread, multiplexing their stdout with :mod:`selectors`.
+
+Compared with :class:`ResourceThreadPoolExecutor` (one thread blocked on ``readline()`` per job),
+it scales to hundreds of concurrent cheap jobs without hundreds of threads contending for the GIL.
+
+A process closing its output is finished once it exits, checked by ``poll()`` at each pass of the loop,
+so that a process still running without output does not block the other ones.
+
+The output is given line by line, or in chunks of up to ``READ_SIZE`` bytes, along with the lines of the result pipe
+(``proc.results``) when the results are sent separately (see :func:`aup.print_result`).
+
+APIs
+----
+"""
+import logging
+import os
+import selectors
+import threading
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+READ_SIZE = 65536
+SELECT_TIMEOUT = 1  # seconds, how often to check `should_stop` for silent jobs
+EXIT_POLL = 0.1  # seconds, how often to check the processes which closed their output but are still running
+
+
+class _ProcessEntry(object):
+    def __init__(self, proc, on_line, on_exit, should_stop, on_chunk, on_result):
+        self.proc = proc
+        self.on_line = on_line
+        self.on_exit = on_exit
+        self.should_stop = should_stop
+        self.on_chunk = on_chunk
+        self.on_result = on_result
+        self.future = Future()
+        self.buffers = {}  # fd -> incomplete line
+        self.open = 0  # number of open pipes
+        self.stopped = False
+        self.error = None
+
+
+class ResourceSelectorExecutor(object):
+    """
+    Executor-like object to follow running processes.
+
+    :func:`submit` takes a started :class:`subprocess.Popen` (with ``stdout=PIPE``) instead of a function,
+    and returns a :class:`concurrent.futures.Future` resolved with the value of ``on_exit`` once the process ends.
+    """
+
+    def __init__(self):
+        self._selector = selectors.DefaultSelector()
+        self._lock = threading.Lock()
+        self._shutdown = False
+        self._entries = {}
+        self._exiting = []  # entries with closed output, waiting for their process to exit
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ, None)
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def submit(self, proc, on_line, on_exit, should_stop=None, on_chunk=None, on_result=None):
+        """
+        Follow the output of a running process
+
+        :param proc: running process, with stdout piped
+        :type proc: subprocess.Popen
+        :param on_line: called with each line (bytes) of the process output
+        :type on_line: function object
+        :param on_exit: called once the output is closed, with whether the process was stopped and the exception
+            raised by ``on_line`` if any; its return value is the result of the future
+        :type on_exit: function object
+        :param should_stop: called regularly, the process is killed once it returns True
+        :type should_stop: function object
+        :param on_chunk: if set, called with the output in chunks (bytes) instead of ``on_line``
+        :type on_chunk: function object
+        :param on_result: if set, called with each line (bytes) of ``proc.results``
+        :type on_result: function object
+        :return: future of the job, None if the executor is shut down
+        :rtype: concurrent.futures.Future
+        """
+        with self._lock:
+            if self._shutdown:
+                return None
+            entry = _ProcessEntry(proc, on_line, on_exit, should_stop, on_chunk, on_result)
+            streams = [(proc.stdout, on_chunk if on_chunk is not None else on_line, on_chunk is None)]
+            if on_result is not None:
+                streams.append((proc.results, on_result, True))
+            for stream, handler, lines in streams:
+                fd = stream.fileno()
+                os.set_blocking(fd, False)
+                self._entries[fd] = entry
+                self._selector.register(fd, selectors.EVENT_READ, (entry, handler, lines))
+                entry.open += 1
+            os.write(self._wakeup_w, b"\0")
+            return entry.future
+
+    def shutdown(self, wait=True):
+        """
+        Stop accepting new processes, the loop ends once all followed processes are finished.
+
+        :param wait: whether to wait for the running processes
+        :type wait: bool
+        """
+        with self._lock:
+            if not self._shutdown:
+                self._shutdown = True
+                os.write(self._wakeup_w, b"\0")
+        if wait:
+            self._thread.join()
+
+    def _loop(self):
+        while True:
+            with self._lock:
+                if self._shutdown and not self._entries and not self._exiting:
+                    break
+            timeout = EXIT_POLL if self._exiting else SELECT_TIMEOUT
+            # results first, print_result sends them before printing them
+            for key, _ in sorted(self._selector.select(timeout=timeout), key=self._output_last):
+                if key.data is None:
+                    os.read(self._wakeup_r, READ_SIZE)
+                else:
+                    self._read(key.fd, *key.data)
+            for entry in set(self._entries.values()) | set(self._exiting):
+                if entry.should_stop is not None and not entry.stopped and entry.should_stop():
+                    entry.stopped = True
+                    entry.proc.kill()
+            for entry in list(self._exiting):
+                if entry.proc.poll() is not None:
+                    self._exiting.remove(entry)
+                    self._finish(entry)
+        self._selector.close()
+        os.close(self._wakeup_r)
+        os.close(self._wakeup_w)
+
+    @staticmethod
+    def _output_last(event):
+        key = event[0]
+        return key.data is not None and key.data[1] is not key.data[0].on_result
+
+    def _read(self, fd, entry, handler, lines):
+        try:
+            data = os.read(fd, READ_SIZE)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+
+        if data and not lines:
+            self._feed(entry, handler, data)
+            return
+        if data:
+            split = (entry.buffers.pop(fd, b"") + data).split(b"\n")
+            entry.buffers[fd] = split.pop()
+            for line in split:
+                self._feed(entry, handler, line + b"\n")
+            return
+
+        rest = entry.buffers.pop(fd, b"")
+        if rest:
+            self._feed(entry, handler, rest)
+        self._close(fd, entry)
+
+    def _feed(self, entry, handler, data):
+        if entry.stopped or entry.error is not None:
+            return
+        if entry.should_stop is not None and entry.should_stop():
+            entry.stopped = True
+            entry.proc.kill()
+            return
+        try:
+            handler(data)
+        except Exception as e:  # pragma: no cover
+            logger.fatal("Failed to process job output: %s", e)
+            entry.error = e
+            entry.proc.kill()
+
+    def _close(self, fd, entry):
+        with self._lock:
+            self._selector.unregister(fd)
+            del self._entries[fd]
+            entry.open -= 1
+            if entry.open:
+                return
+        entry.proc.stdout.close()
+        if entry.on_result is not None:
+            entry.proc.results.close()
+        if entry.proc.poll() is None:
+            self._exiting.append(entry)
+        else:
+            self._finish(entry)
+
+    @staticmethod
+    def _finish(entry):
+        try:
+            entry.future.set_result(entry.on_exit(entry.stopped, entry.error))
+        except Exception as e:
+            entry.future.set_exception(e)
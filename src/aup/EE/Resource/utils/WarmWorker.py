@@ -0,0 +1,292 @@
+"""
+..
+  Copyright (c) 2018 LG Electronics Inc.
+  SPDX-License-Identifier: GPL-3.0-or-later
+
+aup.EE.Resource.utils.WarmWorker
+================================
+
+Keep a worker process by resource, which runs the ``setup()`` of a script once and then the trials of many jobs.
+
+Scripts using :func:`aup.aup_worker` load their frameworks, datasets or pretrained models in ``setup()``, which is
+paid for each job when every job is a new process.
+A :class:`WarmWorker` is the script started once for a resource (with the environment and cores of the resource),
+the configuration of each job on that resource is sent to it, and the output of the trial (including the results,
+see :func:`aup.print_result`) comes back over a pipe read by the resource manager, as for a normal job.
+
+Stopping or killing a job (early stopping, :mod:`aup.EE.Resource.utils.Watchdog`) kills its worker,
+which is started again for the next job.
+Scripts not using ``aup_worker``, or failing to start, run as normal jobs.
+
+It is enabled in ``resource_args`` by::
+
+  "warm_workers": {
+    "startup_timeout": 300,
+    "max_trials": null
+  }
+
+where ``startup_timeout`` is the time in seconds for ``setup()``,
+and ``max_trials`` the number of trials before a worker is restarted (e.g. to release leaked memory).
+
+APIs
+----
+"""
+import logging
+import os
+import socket
+import subprocess
+import threading
+
+from ....utils import set_default_keyvalue
+from .cpu_affinity import pin
+from .ForkServer import python_command, script_contains, send_message, recv_message
+
+logger = logging.getLogger(__name__)
+
+
+class WarmProcess(object):
+    """
+    Trial running in a worker, with the interface of :class:`subprocess.Popen` used by the resource managers
+
+    :param worker: worker running the trial
+    :type worker: WarmWorker
+    :param fd: read end of the output pipe
+    :type fd: int
+    :param results_fd: read end of the result pipe, if any
+    :type results_fd: int
+    """
+
+    def __init__(self, worker, fd, results_fd=None):
+        self.worker = worker
+        self.pid = worker.proc.pid
+        self.stdout = os.fdopen(fd, "rb")
+        self.results = os.fdopen(results_fd, "rb") if results_fd is not None else None
+        self.returncode = None
+
+    def kill(self):
+        # nothing to do once the trial is done, the worker waits for the next one
+        if self.returncode is None and not self.worker.end_trial(block=False):
+            self.worker.kill()
+            self.returncode = -9
+
+    def poll(self):
+        if self.returncode is None and self.worker.end_trial(block=False):
+            self.returncode = self.worker.code
+        return self.returncode
+
+    def wait(self):
+        if self.returncode is None:
+            self.worker.end_trial(block=True)
+            self.returncode = self.worker.code
+        return self.returncode
+
+
+class WarmWorker(object):
+    """
+    Worker process of a job script
+
+    :param script: job script
+    :type script: str
+    :param path: working directory
+    :type path: str
+    :param config_path: configuration file, given as the first argument to the script
+    :type config_path: str
+    :param log_path: output of the worker outside of the trials
+    :type log_path: str
+    :param startup_timeout: time for the setup of the worker, in seconds
+    :type startup_timeout: float
+    :param cores: cores to pin the worker to, see :class:`aup.EE.Resource.utils.cpu_affinity.CorePool`
+    :type cores: [int]
+    :param kwargs: arguments of :class:`subprocess.Popen`, e.g. ``env``
+    :raises RuntimeError: if the worker fails to start
+    """
+
+    def __init__(self, script, path, config_path, log_path, startup_timeout=300, cores=None, **kwargs):
+        self.script = script
+        self.lock = threading.Lock()
+        self.busy = False
+        self.code = None  # exit code of the last trial
+        self.trials = 0
+        command = python_command(script, path)
+        if command is None:
+            raise RuntimeError("Worker of %s failed to start: not a python script" % script)
+        interpreter, script_path, args = command
+        self.sock, child_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        env = dict(kwargs.pop("env", None) or os.environ)
+        env["AUP_WORKER_FD"] = str(child_sock.fileno())
+        try:
+            with open(log_path, "a") as log:
+                self.proc = subprocess.Popen(interpreter + [script_path] + args + [config_path], cwd=path, env=env,
+                                             stdout=log, stderr=subprocess.STDOUT, pass_fds=(child_sock.fileno(),),
+                                             **kwargs)
+        finally:
+            child_sock.close()
+        if cores is not None:
+            pin(self.proc.pid, cores)
+        self.sock.settimeout(startup_timeout)
+        try:
+            message, _ = recv_message(self.sock)
+        except (OSError, ValueError) as e:
+            message = {"error": str(e)}
+        if not message or "ready" not in message:
+            self.kill()
+            raise RuntimeError("Worker of %s failed to start: %s, check %s" %
+                               (script, message.get("error") if message else "exited", log_path))
+        self.sock.settimeout(None)
+        logger.info("Worker of %s started (pid %d)" % (script, self.proc.pid))
+
+    def alive(self):
+        return self.proc.poll() is None
+
+    def spawn(self, config_path, data=None, results=False):
+        """
+        Start a trial
+
+        :param config_path: job configuration file
+        :type config_path: str
+        :param data: job configuration in JSON, used instead of the file if not None
+        :type data: str
+        :param results: send the results over a separate pipe, see :func:`aup.print_result`
+        :type results: bool
+        :return: trial process
+        :rtype: WarmProcess
+        """
+        pipes = [os.pipe() for _ in range(2 if results else 1)]
+        try:
+            with self.lock:
+                send_message(self.sock, {"config": config_path, "data": data}, [w for _, w in pipes])
+                self.busy = True
+                self.code = None
+                self.trials += 1
+        except BaseException:
+            for r, _ in pipes:
+                os.close(r)
+            raise
+        finally:
+            for _, w in pipes:
+                os.close(w)
+        return WarmProcess(self, *[r for r, _ in pipes])
+
+    def end_trial(self, block):
+        """
+        :param block: wait for the end of the trial
+        :type block: bool
+        :return: True if the trial is done (or the worker exited)
+        :rtype: bool
+        """
+        with self.lock:
+            if not self.busy:
+                return True
+            try:
+                self.sock.setblocking(block)
+                message, _ = recv_message(self.sock)
+            except BlockingIOError:
+                return False
+            except OSError:
+                message = None
+            finally:
+                if self.sock.fileno() >= 0:
+                    self.sock.setblocking(True)
+            self.busy = False
+            self.code = message["done"] if message else -9
+            return True
+
+    def kill(self):
+        try:
+            self.proc.kill()
+        except OSError:  # pragma: no cover
+            pass
+        self.proc.wait()
+        self.sock.close()
+
+    def close(self):
+        self.sock.close()
+        try:
+            self.proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:  # pragma: no cover
+            self.kill()
+
+
+class WarmWorkerPool(object):
+    """
+    One worker by job script and resource, started with the first job
+
+    :param config: configuration of ``warm_workers`` in ``resource_args``
+    :type config: dict
+    """
+
+    def __init__(self, config):
+        set_default_keyvalue("startup_timeout", 300, config, log=logger)
+        set_default_keyvalue("max_trials", None, config, log=logger)
+        self.startup_timeout = config["startup_timeout"]
+        self.max_trials = config["max_trials"]
+        self.workers = dict()  # (script, path, rid) -> WarmWorker, None if the script does not support it
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def start(self, script, path, config_path, rid, data=None, results=False, cores=None, **kwargs):
+        """
+        Start a job in the worker of its script and resource
+
+        :param script: job script
+        :type script: str
+        :param path: working directory
+        :type path: str
+        :param config_path: job configuration file
+        :type config_path: str
+        :param rid: resource ID
+        :type rid: int
+        :param data: job configuration in JSON, see :func:`WarmWorker.spawn`
+        :type data: str
+        :param results: send the results over a separate pipe
+        :type results: bool
+        :param cores: cores of the resource, the worker is pinned to
+        :type cores: [int]
+        :param kwargs: arguments of :class:`subprocess.Popen` for the job, used to start the worker
+        :return: job process, None if the job should run without worker
+        :rtype: WarmProcess
+        """
+        key = (script, path, rid)
+        with self.lock:
+            if self.closed:
+                return None
+            worker = self.workers.get(key)
+            if key in self.workers and worker is None:
+                return None
+            if worker is not None:
+                if worker.busy and not worker.end_trial(block=False):
+                    return None  # e.g. a copy of a straggler on the same resource
+                if not worker.alive() or (self.max_trials and worker.trials >= self.max_trials):
+                    worker.close()
+                    worker = None
+            if worker is None:
+                worker = self._start_worker(script, path, config_path, rid, cores, kwargs)
+                self.workers[key] = worker
+                if worker is None:
+                    return None
+        try:
+            return worker.spawn(config_path, data=data, results=results)
+        except OSError as e:
+            logger.warning("Worker of %s failed: %s, run the job without it" % (script, e))
+            return None
+
+    def _start_worker(self, script, path, config_path, rid, cores, kwargs):
+        command = python_command(script, path)
+        if command is None or not script_contains(os.path.join(path, command[1]), "aup_worker("):
+            logger.info("%s does not use aup_worker, run the jobs without warm worker" % script)
+            return None
+        log_path = os.path.join(path, "jobs", "worker_%s.out" % rid)
+        try:
+            return WarmWorker(script, path, config_path, log_path, startup_timeout=self.startup_timeout, cores=cores,
+                              **kwargs)
+        except (RuntimeError, OSError) as e:
+            logger.warning("%s, run the jobs without it" % e)
+            return None
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            workers = [worker for worker in self.workers.values() if worker is not None]
+            self.workers.clear()
+        for worker in workers:
+            worker.close()
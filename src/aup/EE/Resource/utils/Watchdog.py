@@ -0,0 +1,206 @@
+"""
+..
+  Copyright (c) 2018 LG Electronics Inc.
+  SPDX-License-Identifier: GPL-3.0-or-later
+
+aup.EE.Resource.utils.Watchdog
+==============================
+
+Kill hung jobs, and detect stragglers for speculative re-execution.
+
+Jobs are only checked for early stopping when they print a line, so a silent or hung job holds its resource forever.
+:class:`Watchdog` checks the running jobs every ``interval`` seconds, and kills (with their child processes)
+the jobs running for more than ``timeout`` seconds, or without output for ``no_output`` seconds.
+Killed jobs fail, and are retried as set in ``job_failure``.
+
+With ``speculative``, a job running for longer than ``straggler_factor`` times the ``straggler_quantile`` of the
+durations of the finished jobs (once ``min_finished`` jobs are finished) is a straggler:
+a copy of the job is started on another free resource, and the first copy to finish wins, the other is killed.
+
+It is enabled in ``resource_args`` by::
+
+  "watchdog": {
+    "timeout": null,
+    "no_output": null,
+    "speculative": false,
+    "straggler_quantile": 0.9,
+    "straggler_factor": 1.5,
+    "min_finished": 5,
+    "interval": 1
+  }
+
+APIs
+----
+"""
+import logging
+import threading
+import time
+
+import numpy as np
+import psutil
+
+from ....utils import set_default_keyvalue
+
+logger = logging.getLogger(__name__)
+
+
+def kill_process(proc):
+    """
+    Kill a process and its child processes
+
+    :param proc: process
+    :type proc: subprocess.Popen
+    """
+    try:
+        children = psutil.Process(proc.pid).children(recursive=True)
+    except psutil.Error:
+        children = []
+    for child in children:
+        try:
+            child.kill()
+        except psutil.Error:
+            pass
+    try:
+        proc.kill()
+    except OSError:  # pragma: no cover
+        pass
+
+
+class _Watched(object):
+    def __init__(self, proc):
+        self.proc = proc
+        self.start = time.time()
+        self.last_output = self.start
+        self.speculated = False
+        self.killed = None  # reason
+
+
+class Watchdog(object):
+    """
+    Follow the running jobs, identified by (job ID, copy number)
+
+    :param config: configuration of ``watchdog`` in ``resource_args``
+    :type config: dict
+    :param on_straggler: called with the job ID of a straggler, to start a copy
+    :type on_straggler: function object
+    """
+
+    def __init__(self, config, on_straggler=None):
+        set_default_keyvalue("timeout", None, config, log=logger)
+        set_default_keyvalue("no_output", None, config, log=logger)
+        set_default_keyvalue("speculative", False, config, log=logger)
+        set_default_keyvalue("straggler_quantile", 0.9, config, log=logger)
+        set_default_keyvalue("straggler_factor", 1.5, config, log=logger)
+        set_default_keyvalue("min_finished", 5, config, log=logger)
+        set_default_keyvalue("interval", 1, config, log=logger)
+        self.timeout = config["timeout"]
+        self.no_output = config["no_output"]
+        self.speculative = config["speculative"]
+        self.straggler_quantile = float(config["straggler_quantile"])
+        self.straggler_factor = float(config["straggler_factor"])
+        self.min_finished = int(config["min_finished"])
+        self.interval = config["interval"]
+        self.on_straggler = on_straggler
+
+        self.jobs = dict()  # (jid, copy) -> _Watched
+        self.durations = []  # of the jobs finished with a score
+        self.lock = threading.Lock()
+        self.closed = threading.Event()
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+
+    def track(self, key, proc):
+        """
+        :param key: job ID and copy number
+        :type key: (int, int)
+        :param proc: job process
+        :type proc: subprocess.Popen
+        """
+        with self.lock:
+            self.jobs[key] = _Watched(proc)
+
+    def touch(self, key):
+        """
+        Record an output line of the job
+        """
+        watched = self.jobs.get(key)
+        if watched is not None:
+            watched.last_output = time.time()
+
+    def untrack(self, key, success=False):
+        """
+        :param key: job ID and copy number
+        :type key: (int, int)
+        :param success: whether the job returned a score, its duration is then recorded
+        :type success: bool
+        :return: reason why the job was killed, None otherwise
+        :rtype: str
+        """
+        with self.lock:
+            watched = self.jobs.pop(key, None)
+            if watched is None:
+                return None
+            if success:
+                self.durations.append(time.time() - watched.start)
+        return watched.killed
+
+    def kill(self, key, reason):
+        """
+        :param key: job ID and copy number
+        :type key: (int, int)
+        :param reason: logged and returned by :func:`untrack`
+        :type reason: str
+        """
+        with self.lock:
+            watched = self.jobs.get(key)
+            if watched is None or watched.killed is not None:
+                return
+            watched.killed = reason
+        logger.warning("Kill job %d (copy %d): %s" % (key[0], key[1], reason))
+        kill_process(watched.proc)
+
+    def straggler_time(self):
+        """
+        :return: running time after which a job is a straggler, None if not enough jobs finished
+        :rtype: float
+        """
+        with self.lock:
+            if len(self.durations) < max(1, self.min_finished):
+                return None
+            return np.percentile(self.durations, self.straggler_quantile * 100) * self.straggler_factor
+
+    def check(self):
+        """
+        Kill hung jobs and start copies of stragglers, called every ``interval`` seconds
+        """
+        now = time.time()
+        straggler_time = self.straggler_time() if self.speculative else None
+        stragglers = []
+        with self.lock:
+            jobs = list(self.jobs.items())
+            copied = set(jid for jid, copy in self.jobs if copy > 0)
+        for key, watched in jobs:
+            if watched.killed is not None:
+                continue
+            if self.timeout and now - watched.start > self.timeout:
+                self.kill(key, "running for more than %s seconds" % self.timeout)
+            elif self.no_output and now - watched.last_output > self.no_output:
+                self.kill(key, "no output for %s seconds" % self.no_output)
+            elif straggler_time is not None and not watched.speculated and key[0] not in copied and \
+                    now - watched.start > straggler_time:
+                watched.speculated = True
+                stragglers.append(key[0])
+        for jid in stragglers:
+            logger.info("Job %d is a straggler (more than %.1f seconds)" % (jid, straggler_time))
+            if self.on_straggler is not None:
+                self.on_straggler(jid)
+
+    def _loop(self):
+        while not self.closed.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:  # pragma: no cover
+                logger.fatal("Watchdog failed: %s" % e)
+
+    def close(self):
+        self.closed.set()
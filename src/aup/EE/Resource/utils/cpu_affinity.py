@@ -0,0 +1,197 @@
+"""
+..
+  Copyright (c) 2018 LG Electronics Inc.
+  SPDX-License-Identifier: GPL-3.0-or-later
+
+aup.EE.Resource.utils.cpu_affinity
+==================================
+
+Give each resource its own set of CPU cores, so parallel jobs do not start one thread per core each.
+
+The available cores (see :func:`os.sched_getaffinity`) are split into disjoint groups of ``cores_per_job`` cores,
+taken from the same NUMA node when possible.
+Each job process is pinned to the group of its resource by :func:`pin` once it is started
+(not in a ``preexec_fn``, which is unsafe as the jobs are started from several threads),
+and the thread counts of the usual numerical libraries (OpenMP, MKL, OpenBLAS, numexpr, PyTorch, TensorFlow)
+are capped to the group size by environment variables.
+
+It is enabled in ``resource_args`` by ``"cores_per_job": <n>``, or ``"auto"`` to share the cores among
+``n_parallel`` jobs.
+
+APIs
+----
+"""
+import glob
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+THREAD_ENV = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS",
+              "VECLIB_MAXIMUM_THREADS", "TF_NUM_INTRAOP_THREADS")
+
+
+def parse_cpulist(cpulist):
+    """
+    Parse a list of cores in the kernel format, e.g. ``0-3,8,10-11``
+
+    :param cpulist: list of cores
+    :type cpulist: str
+    :return: core IDs
+    :rtype: [int]
+    """
+    cores = []
+    for part in cpulist.strip().split(","):
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-")
+            cores.extend(range(int(first), int(last) + 1))
+        else:
+            cores.append(int(part))
+    return cores
+
+
+def available_cores():
+    """
+    :return: cores available to the process
+    :rtype: [int]
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def numa_nodes(cores):
+    """
+    Group the cores by NUMA node, from ``/sys/devices/system/node`` (all in one node if not found)
+
+    :param cores: available cores
+    :type cores: [int]
+    :return: cores of each node
+    :rtype: [[int]]
+    """
+    nodes = []
+    for path in sorted(glob.glob("/sys/devices/system/node/node*/cpulist")):
+        try:
+            with open(path) as f:
+                node = [c for c in parse_cpulist(f.read()) if c in cores]
+        except (OSError, ValueError):
+            continue
+        if node:
+            nodes.append(node)
+    found = set(c for node in nodes for c in node)
+    missing = [c for c in cores if c not in found]
+    if missing:
+        nodes.append(missing)
+    return nodes
+
+
+def partition_cores(nodes, cores_per_job):
+    """
+    Split the cores into disjoint groups, without crossing NUMA nodes if possible
+
+    :param nodes: cores of each NUMA node
+    :type nodes: [[int]]
+    :param cores_per_job: size of the groups
+    :type cores_per_job: int
+    :return: groups of cores
+    :rtype: [[int]]
+    """
+    groups = []
+    leftover = []
+    for node in nodes:
+        n_groups = len(node) // cores_per_job
+        groups.extend(node[i * cores_per_job:(i + 1) * cores_per_job] for i in range(n_groups))
+        leftover.extend(node[n_groups * cores_per_job:])
+    n_groups = len(leftover) // cores_per_job
+    groups.extend(leftover[i * cores_per_job:(i + 1) * cores_per_job] for i in range(n_groups))
+    if not groups:  # fewer cores than requested
+        groups.append(leftover)
+    return groups
+
+
+class CorePool(object):
+    """
+    Assign a group of cores to each resource ID
+
+    :param cores_per_job: number of cores for each job, or "auto"
+    :type cores_per_job: int | str
+    :param n_parallel: number of parallel jobs, for "auto"
+    :type n_parallel: int
+    :param cores: available cores, by default from :func:`available_cores`
+    :type cores: [int]
+    """
+
+    def __init__(self, cores_per_job, n_parallel, cores=None):
+        cores = available_cores() if cores is None else cores
+        if cores_per_job == "auto":
+            cores_per_job = max(1, len(cores) // max(1, n_parallel))
+        cores_per_job = int(cores_per_job)
+        if cores_per_job <= 0:
+            raise ValueError("cores_per_job must be positive")
+        self.cores_per_job = cores_per_job
+        self.groups = partition_cores(numa_nodes(cores), cores_per_job)
+        self.assigned = dict()  # rid -> index of group
+        self.lock = threading.Lock()
+        if len(self.groups) < n_parallel:
+            logger.warning("Only %d groups of %d cores for %d parallel jobs, some cores are shared" %
+                           (len(self.groups), cores_per_job, n_parallel))
+
+    def cores(self, rid):
+        """
+        :param rid: resource ID
+        :type rid: int
+        :return: cores of the resource, the least shared group is given to a new resource
+        :rtype: [int]
+        """
+        with self.lock:
+            if rid not in self.assigned:
+                used = [0] * len(self.groups)
+                for i in self.assigned.values():
+                    used[i] += 1
+                self.assigned[rid] = used.index(min(used))
+            return self.groups[self.assigned[rid]]
+
+    def apply(self, rid, kwargs):
+        """
+        Update the arguments of :class:`subprocess.Popen` to cap the threads of the job to the cores of its resource,
+        the process is then pinned by :func:`pin`
+
+        :param rid: resource ID
+        :type rid: int
+        :param kwargs: arguments of :class:`subprocess.Popen`, ``env`` is copied before being updated
+        :type kwargs: dict
+        :return: cores of the resource
+        :rtype: [int]
+        """
+        cores = self.cores(rid)
+        env = dict(kwargs.get("env") or os.environ)
+        for name in THREAD_ENV:
+            env[name] = str(len(cores))
+        kwargs["env"] = env
+        logger.debug("Resource %s runs on cores %s" % (rid, cores))
+        return cores
+
+
+def pin(pid, cores):
+    """
+    Pin a started process to cores, with the threads it already started
+
+    :param pid: process ID
+    :type pid: int
+    :param cores: cores
+    :type cores: [int]
+    """
+    if not hasattr(os, "sched_setaffinity"):
+        return
+    try:
+        tids = [int(tid) for tid in os.listdir("/proc/%d/task" % pid)]
+    except OSError:
+        tids = [pid]
+    for tid in tids:
+        try:
+            os.sched_setaffinity(tid, cores)
+        except OSError:  # e.g. the process already exited
+            pass
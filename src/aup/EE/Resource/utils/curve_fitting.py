@@ -1,7 +1,36 @@
-import scipy
+"""
+..
+  Copyright (c) 2018 LG Electronics Inc.
+  SPDX-License-Identifier: GPL-3.0-or-later
+
+aup.EE.Resource.utils.curve_fitting
+===================================
+
+Learning curve extrapolation for the ``curve_fitting`` early stopping policy (see :doc:`early_stop`).
+
+The intermediate results of a job are fitted by each function of :data:`CURVE_FIT_FUNCS`,
+and the final value is predicted by a weighted combination of the functions fitting well,
+the weights being sampled by MCMC.
+
+The functions are evaluated once at all steps, so that each MCMC iteration is a few matrix operations over
+all samples at once.
+The sampling stops when the prediction converges (relative change below ``tolerance`` between two windows
+of :data:`CurveModel.CHECK_ITERS` iterations) or after ``mcmc_iters`` iterations.
+
+:func:`predict_final` runs a prediction in a process of a :class:`concurrent.futures.ProcessPoolExecutor`.
+
+The fitted parameters and weight samples of a prediction are returned as a state, which warm-starts the next
+prediction of the job: the curves are fitted from the previous parameters, and the sampling starts from the previous
+weights and stops after one window if the prediction did not change.
+:class:`CurveFittingCache` keeps the states by job, and seeds the first fit of a job with the median parameters of
+the finished jobs.
+
+APIs
+----
+"""
 import logging
+import threading
 import numpy as np
-import time
 
 from scipy import optimize
 
@@ -62,20 +91,46 @@ CURVE_FIT_FUNCS = {
 
 
 class CurveModel:
+    """
+    Weighted combination of curves fitted to the intermediate results of a job
+
+    :param iterations: total number of intermediate results of the job, where the final value is predicted
+    :type iterations: int
+    :param mcmc_iters: max number of MCMC iterations
+    :type mcmc_iters: int
+    :param tolerance: relative change of the prediction to stop the MCMC sampling
+    :type tolerance: float
+    :param seed: seed of the random generator
+    :type seed: int
+    :param init: state of a previous prediction (see :attr:`state`), to warm-start the fits and the sampling
+    :type init: dict
+    """
     LEAST_FITTED_FUNCTION = 4
     NUM_INSTANCE = 10
     STEP_SIZE = 0.0005
+    CHECK_ITERS = 500
 
-    def __init__(self, iterations):
+    def __init__(self, iterations, mcmc_iters=10000, tolerance=1e-4, seed=None, init=None):
         self.iterations = iterations
+        self.mcmc_iters = mcmc_iters
+        self.tolerance = tolerance
+        self.rng = np.random.RandomState(seed)
+        self.init = init or {}
+        self.state = None  # parameters, weight samples and prediction, set by :func:`predict`
 
     def fit_theta(self):
-        x = range(1, self.step + 1)
+        x = np.arange(1, self.step + 1, dtype=float)
         y = self.interm_res
+        init_params = self.init.get("params", {})
         func_params = {}
         for func_name, func in CURVE_FIT_FUNCS.items():
             try:
-                params = scipy.optimize.curve_fit(func, x, y)[0]
+                try:
+                    params = optimize.curve_fit(func, x, y, p0=init_params.get(func_name))[0]
+                except RuntimeError:
+                    if func_name not in init_params:
+                        raise
+                    params = optimize.curve_fit(func, x, y)[0]
                 func_params[func_name] = params
             except RuntimeError:
                 pass
@@ -88,109 +143,181 @@ class CurveModel:
 
     def filter_curve(self, func_params):
         standard = self.step * np.mean(self.interm_res) ** 2
+        x = np.arange(1, self.step + 1, dtype=float)
         predict_data = []
-        funcs = {}
-        for func_name, func in CURVE_FIT_FUNCS.items():
-            if func_name not in func_params:
-                continue
-            var = 0
-            for idx in range(1, self.step+1):
-                y = func(idx, *func_params[func_name])
-                var += (y - self.interm_res[idx-1]) ** 2
+        funcs = []
+        for func_name in func_params:
+            y = CURVE_FIT_FUNCS[func_name](x, *func_params[func_name])
+            var = np.sum((y - self.interm_res) ** 2)
             if var < standard:
-                predict_data += [y]
-                funcs[func_name] = func
-        final_funcs = {}
-        median = np.median(predict_data)
-        stddev = np.std(predict_data)
-        for func_name, func in funcs.items():
-            y = func(self.iterations, *func_params[func_name])
-            epsilon = self.step / 10 * stddev
-            if y < median + epsilon and y > median - epsilon:
-                final_funcs[func_name] = func
+                predict_data += [y[-1]]
+                funcs += [func_name]
+        median = np.median(predict_data) if predict_data else 0.
+        stddev = np.std(predict_data) if predict_data else 0.
+        epsilon = self.step / 10 * stddev
+        final_funcs = []
+        for func_name in funcs:
+            y = CURVE_FIT_FUNCS[func_name](self.iterations, *func_params[func_name])
+            if median - epsilon < y < median + epsilon:
+                final_funcs += [func_name]
         return final_funcs
 
-    def normalize_weights(self, samples, num_funcs):
-        for i in range(CurveModel.NUM_INSTANCE):
-            total = 0
-            for j in range(num_funcs):
-                total += samples[i][j]
-            for j in range(num_funcs):
-                samples[i][j] /= total
-        return samples
-    
-    def f_comb(self, pos, sample, funcs, func_params):
-        ret = 0
-        for idx, (func_name, func) in enumerate(funcs.items()):
-            y = func(pos, *func_params[func_name])
-            ret += sample[idx] * y
-        return ret
-    
-    def sigma_sq(self, sample, funcs, func_params):
-        ret = 0
-        for i in range(1, self.step + 1):
-            temp = self.interm_res[i - 1] - self.f_comb(i, sample, funcs, func_params)
-            ret += temp * temp
-        return 1.0 * ret / self.step
-
-    def normal_distribution(self, pos, sample, funcs, func_params):
-        curr_sigma_sq = self.sigma_sq(sample, funcs, func_params)
-        delta = self.interm_res[pos-1] - self.f_comb(pos, sample, funcs, func_params)
-        return np.exp(np.square(delta) / (-2.0 * curr_sigma_sq)) / np.sqrt(2 * np.pi * np.sqrt(curr_sigma_sq))
-
-    def likelihood(self, samples, funcs, func_params):
-        ret = np.ones(CurveModel.NUM_INSTANCE)
-        for i in range(CurveModel.NUM_INSTANCE):
-            for j in range(1, self.step + 1):
-                ret[i] *= self.normal_distribution(j, samples[i], funcs, func_params)
-        return ret
-    
-    def prior(self, samples, funcs, func_params):
-        ret = np.ones(CurveModel.NUM_INSTANCE)
-        for i in range(CurveModel.NUM_INSTANCE):
-            for j in range(len(funcs)):
-                if not samples[i][j] > 0:
-                    ret[i] = 0
-            if self.f_comb(1, samples[i], funcs, func_params) >= self.f_comb(self.iterations, samples[i], funcs, func_params):
-                ret[i] = 0
-        return ret
-
-    def target_distribution(self, samples, funcs, func_params):
-        curr_likelihood = self.likelihood(samples, funcs, func_params)
-        curr_prior = self.prior(samples, funcs, func_params)
-        ret = np.ones(CurveModel.NUM_INSTANCE)
-        for i in range(CurveModel.NUM_INSTANCE):
-            ret[i] = curr_likelihood[i] * curr_prior[i]
-        return ret
-
-    def mcmc_sampling(self, filtered_funcs, func_params, timeout):
-        t0 = time.time()
-        init_weight = np.ones((len(filtered_funcs),), dtype=np.float32) / len(filtered_funcs)
-        weights_samples = np.broadcast_to(init_weight, (CurveModel.NUM_INSTANCE, len(filtered_funcs)))
-        while True:
-            new_values = np.random.randn(CurveModel.NUM_INSTANCE, len(filtered_funcs)) * CurveModel.STEP_SIZE + weights_samples
-            new_values = self.normalize_weights(new_values, len(filtered_funcs))
-            alpha = np.minimum(1, self.target_distribution(new_values, filtered_funcs, func_params) / self.target_distribution(weights_samples, filtered_funcs, func_params))
-            u = np.random.rand(CurveModel.NUM_INSTANCE)
-            change_value_flag = (u < alpha).astype(np.int)
-            for idx in range(CurveModel.NUM_INSTANCE):
-                new_values[idx] = weights_samples[idx] * (1 - change_value_flag[idx]) + new_values[idx] * change_value_flag[idx]
-            weights_samples = new_values
-            if time.time() - t0 > timeout:
-                break
-        return weights_samples
-
-    def predict(self, interm_res, timeout):
-        self.interm_res = interm_res
+    def curves(self, funcs, func_params):
+        """
+        :return: values of the functions (rows) at the steps 1 to ``step``, and at ``iterations``
+        :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        x = np.arange(1, self.step + 1, dtype=float)
+        values = np.array([CURVE_FIT_FUNCS[func_name](x, *func_params[func_name]) for func_name in funcs])
+        final = np.array([CURVE_FIT_FUNCS[func_name](self.iterations, *func_params[func_name]) for func_name in funcs])
+        return values, final
+
+    @staticmethod
+    def normalize_weights(samples):
+        return samples / np.sum(samples, axis=1, keepdims=True)
+
+    def log_target(self, samples, values, final):
+        """
+        Log of likelihood times prior of the weight samples (rows)
+        """
+        comb = samples.dot(values)
+        delta = self.interm_res - comb
+        sigma_sq = np.mean(np.square(delta), axis=1, keepdims=True)
+        log_likelihood = np.sum(np.square(delta) / (-2.0 * sigma_sq) - 0.5 * np.log(2 * np.pi * np.sqrt(sigma_sq)),
+                                axis=1)
+        prior = np.all(samples > 0, axis=1) & (comb[:, 0] < samples.dot(final))
+        return np.where(prior, log_likelihood, -np.inf)
+
+    def init_samples(self, funcs):
+        """
+        :return: weight samples of the previous prediction for the given functions, uniform weights if none
+        :rtype: numpy.ndarray
+        """
+        weights = self.init.get("weights", {})
+        samples = np.full((CurveModel.NUM_INSTANCE, len(funcs)), 1. / len(funcs))
+        for j, func_name in enumerate(funcs):
+            if func_name in weights:
+                samples[:, j] = np.maximum(weights[func_name], 1e-6)
+        return self.normalize_weights(samples)
+
+    def mcmc_sampling(self, values, final, samples=None, previous=None):
+        """
+        :param samples: initial weight samples, uniform weights if None
+        :type samples: numpy.ndarray
+        :param previous: previous prediction, to stop after one window if the prediction did not change
+        :type previous: float
+        :return: weight samples, number of iterations
+        :rtype: (numpy.ndarray, int)
+        """
+        num_funcs = values.shape[0]
+        if samples is None:
+            samples = np.full((CurveModel.NUM_INSTANCE, num_funcs), 1. / num_funcs)
+        target = self.log_target(samples, values, final)
+        window = 0.
+        for its in range(1, self.mcmc_iters + 1):
+            new_samples = self.normalize_weights(
+                self.rng.randn(CurveModel.NUM_INSTANCE, num_funcs) * CurveModel.STEP_SIZE + samples)
+            new_target = self.log_target(new_samples, values, final)
+            accept = np.log(self.rng.rand(CurveModel.NUM_INSTANCE)) < new_target - target
+            samples = np.where(accept[:, None], new_samples, samples)
+            target = np.where(accept, new_target, target)
+
+            window += np.mean(samples.dot(final))
+            if its % CurveModel.CHECK_ITERS == 0:
+                window /= CurveModel.CHECK_ITERS
+                if previous is not None and abs(window - previous) <= self.tolerance * max(abs(previous), 1e-12):
+                    return samples, its
+                window, previous = 0., window
+        return samples, self.mcmc_iters
+
+    def predict(self, interm_res):
+        """
+        :param interm_res: intermediate results of the job
+        :type interm_res: [float]
+        :return: predicted final value, None if too few functions fit the results
+        :rtype: float
+        """
+        self.interm_res = np.asarray(interm_res, dtype=float)
         self.step = len(interm_res)
-        func_params = self.fit_theta()
-        filtered_funcs = self.filter_curve(func_params)
-        final_keys = set(func_params.keys()) & set(filtered_funcs.keys())
-        filtered_funcs = {func_name: filtered_funcs[func_name] for func_name in final_keys}
-        func_params = {func_name: func_params[func_name] for func_name in final_keys}
-        if len(filtered_funcs) < CurveModel.LEAST_FITTED_FUNCTION:
-            return None
-        weights_samples = self.mcmc_sampling(filtered_funcs, func_params, timeout)
-        f_res = [self.f_comb(self.iterations, weight_sample, filtered_funcs, func_params) for weight_sample in weights_samples]
-        return np.mean(f_res) 
+        with np.errstate(all="ignore"):
+            func_params = self.fit_theta()
+            funcs = self.filter_curve(func_params)
+            self.state = {"params": func_params, "weights": {}, "prediction": None, "iterations": 0}
+            if len(funcs) < CurveModel.LEAST_FITTED_FUNCTION:
+                return None
+            values, final = self.curves(funcs, func_params)
+            samples, its = self.mcmc_sampling(values, final, samples=self.init_samples(funcs),
+                                              previous=self.init.get("prediction"))
+        logger.debug("Curve fitting of {} functions converged in {} iterations".format(len(funcs), its))
+        prediction = float(np.mean(samples.dot(final)))
+        self.state["weights"] = {func_name: samples[:, j] for j, func_name in enumerate(funcs)}
+        self.state["prediction"] = prediction
+        self.state["iterations"] = its
+        return prediction
+
+
+def predict_final(interm_res, iterations, mcmc_iters=10000, tolerance=1e-4, seed=None, state=None):
+    """
+    Predict the final value of a job, e.g. in a process pool
+
+    :param interm_res: intermediate results of the job
+    :type interm_res: [float]
+    :param iterations: total number of intermediate results of the job
+    :type iterations: int
+    :param state: state of the previous prediction, see :class:`CurveFittingCache`
+    :type state: dict
+    :return: predicted final value (None if too few functions fit the results), state of the prediction
+    :rtype: (float, dict)
+    """
+    model = CurveModel(iterations, mcmc_iters=mcmc_iters, tolerance=tolerance, seed=seed, init=state)
+    return model.predict(interm_res), model.state
+
+
+class CurveFittingCache(object):
+    """
+    States of the last predictions of the jobs of an experiment, to warm-start their next predictions
+    """
+
+    def __init__(self):
+        self.states = dict()  # jid -> state of the running jobs
+        self.finished = dict()  # jid -> fitted parameters of the finished jobs
+        self.pooled = None  # median parameters of the finished jobs, by function
+        self.lock = threading.Lock()
+
+    def get(self, jid):
+        """
+        :return: state of the last prediction of the job, else the parameters pooled from the finished jobs
+        :rtype: dict
+        """
+        with self.lock:
+            if jid in self.states:
+                return self.states[jid]
+            if self.pooled is None and self.finished:
+                params = dict()
+                for job_params in self.finished.values():
+                    for func_name, p in job_params.items():
+                        params.setdefault(func_name, []).append(p)
+                self.pooled = {"params": {func_name: np.median(p, axis=0) for func_name, p in params.items()}}
+            return self.pooled
+
+    def update(self, jid, state):
+        with self.lock:
+            if state is not None:
+                self.states[jid] = state
+
+    def finish(self, jid):
+        """
+        Add the parameters of a finished job to the pooled parameters
+        """
+        with self.lock:
+            state = self.states.pop(jid, None)
+            if state is not None and state["params"]:
+                self.finished[jid] = state["params"]
+                self.pooled = None
 
+    def drop(self, jid):
+        """
+        Forget a job, e.g. stopped early or restarted
+        """
+        with self.lock:
+            self.states.pop(jid, None)
@@ -0,0 +1,118 @@
+"""
+..
+  Copyright (c) 2018 LG Electronics Inc.
+  SPDX-License-Identifier: GPL-3.0-or-later
+
+aup.EE.ResultCache
+==================
+
+Reuse the scores of jobs already run, in any experiment, with the same code and job configuration.
+
+The key of a job is a hash of:
+
+* the content of the script (and of any other file of the command line found in ``workingdir``),
+* the content of the files in ``workingdir`` matching ``files`` (the working directory fingerprint),
+* the job configuration, without the keys listed in ``ignore``.
+
+It is enabled in the experiment configuration by::
+
+  "result_cache": {
+    "ttl": 86400,
+    "files": ["*.py"],
+    "ignore": ["tid", "job_id"]
+  }
+
+where ``ttl`` is the maximal age of a reused result in seconds (``null``, the default, for no limit).
+
+APIs
+----
+"""
+import glob
+import hashlib
+import json
+import logging
+import os
+
+from ..utils import set_default_keyvalue
+
+logger = logging.getLogger(__name__)
+
+BLOCK_SIZE = 1 << 20
+
+
+def _hash_file(h, path):
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(BLOCK_SIZE), b""):
+            h.update(block)
+
+
+def code_fingerprint(script, workingdir, patterns):
+    """
+    Hash the files used to run the script
+
+    :param script: command to run the job, as in the experiment configuration
+    :type script: str
+    :param workingdir: folder where the script runs
+    :type workingdir: str
+    :param patterns: glob patterns of other files to include, relative to ``workingdir``
+    :type patterns: [str]
+    :return: hex digest
+    :rtype: str
+    """
+    h = hashlib.sha256()
+    h.update(script.encode("utf-8"))
+    files = set()
+    for token in script.split(" "):
+        path = os.path.join(workingdir, token)
+        if os.path.isfile(path):
+            files.add(os.path.normpath(path))
+    for pattern in patterns:
+        files.update(os.path.normpath(path) for path in glob.glob(os.path.join(workingdir, pattern))
+                     if os.path.isfile(path))
+    for path in sorted(files):
+        h.update(os.path.relpath(path, workingdir).encode("utf-8"))
+        _hash_file(h, path)
+    return h.hexdigest()
+
+
+class ResultCache(object):
+    """
+    Look up the score of a job configuration from previous experiments
+
+    :param connector: connector to database
+    :type connector: AbstractConnector
+    :param exp_config: experiment configuration, with ``result_cache``
+    :type exp_config: BasicConfig
+    """
+
+    def __init__(self, connector, exp_config):
+        config = exp_config["result_cache"]
+        set_default_keyvalue("ttl", None, config, log=logger)
+        set_default_keyvalue("files", ["*.py"], config, log=logger)
+        set_default_keyvalue("ignore", ["tid", "job_id"], config, log=logger)
+        self.connector = connector
+        self.ttl = config["ttl"]
+        self.ignore = set(config["ignore"])
+        self.fingerprint = code_fingerprint(exp_config["script"], exp_config["workingdir"], config["files"])
+        self.connector.prepare_result_cache()
+
+    def key(self, job_config):
+        """
+        :param job_config: configuration of the job
+        :type job_config: dict
+        :return: hash of the job
+        :rtype: str
+        """
+        config = {k: v for k, v in job_config.items() if k not in self.ignore}
+        h = hashlib.sha256(self.fingerprint.encode("utf-8"))
+        h.update(json.dumps(config, sort_keys=True, default=str).encode("utf-8"))
+        return h.hexdigest()
+
+    def lookup(self, job_hash):
+        """
+        :param job_hash: hash of the job, see :func:`key`
+        :type job_hash: str
+        :return: Job ID and score of the latest finished job with the same hash, or None
+        :rtype: (int, float)
+        """
+        return self.connector.get_cached_result(job_hash, self.ttl)
@@ -0,0 +1,184 @@
+"""
+..
+  Copyright (c) 2018 LG Electronics Inc.
+  SPDX-License-Identifier: GPL-3.0-or-later
+
+aup.EE.Scheduler
+================
+
+Run several experiments in one process, sharing the resources of the database by fair-share.
+
+Without it, each experiment takes free resources on its own, so concurrent experiments starve each other
+and fail to start once all resources are busy.
+Experiments hosted by :class:`Scheduler` never take resources themselves: they wait in the queue until
+the scheduler grants them a free resource.
+
+When a resource is free, it goes to the experiment with jobs to run, by order of:
+
+1. highest ``priority``,
+2. lowest number of running jobs, divided by ``weight``,
+3. lowest resource usage so far (running jobs multiplied by time), divided by ``weight``.
+
+``weight`` and ``priority`` are set in the experiment configuration by::
+
+  "schedule": {
+    "weight": 1,
+    "priority": 0
+  }
+
+APIs
+----
+"""
+import logging
+import threading
+import time
+
+from ..Proposer import ProposerStatus
+from ..utils import set_default_keyvalue
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry(object):
+    def __init__(self, experiment, weight, priority, usage):
+        self.experiment = experiment
+        self.weight = weight
+        self.priority = priority
+        self.usage = usage  # resource x seconds used so far
+        self.thread = None
+        self.result = None
+
+    @property
+    def running(self):
+        return len(self.experiment.pending_jobs)
+
+    def share(self):
+        return -self.priority, self.running / self.weight, self.usage / self.weight
+
+
+class Scheduler(object):
+    """
+    Host experiments and grant them resources by fair-share
+
+    :param sleep_time: max time between two allocations, to take resources freed by other processes
+    :type sleep_time: float
+    """
+
+    def __init__(self, sleep_time=1):
+        self.sleep_time = sleep_time
+        self.entries = []
+        self.lock = threading.Lock()  # guards entries, never held while calling experiments
+        self.wakeup = threading.Event()
+        self.stopped = False
+        self.last_tick = time.time()
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+
+    def add(self, experiment):
+        """
+        Start an experiment in its own thread, its jobs are submitted when resources are granted.
+
+        :param experiment: experiment created with ``scheduler=self``
+        :type experiment: Experiment
+        :return: the experiment
+        :rtype: Experiment
+        """
+        config = experiment.exp_config.get("schedule", {})
+        set_default_keyvalue("weight", 1, config, log=logger)
+        set_default_keyvalue("priority", 0, config, log=logger)
+        if config["weight"] <= 0:
+            raise ValueError("weight of experiment %d must be positive" % experiment.eid)
+        with self.lock:
+            # newcomers start at the lowest share, so they can't take all resources from running experiments
+            usage = min([e.usage / e.weight for e in self.entries] or [0]) * config["weight"]
+            entry = _Entry(experiment, float(config["weight"]), config["priority"], usage)
+            self.entries.append(entry)
+        entry.thread = threading.Thread(target=self._run, args=(entry,), daemon=True)
+        entry.thread.start()
+        logger.info("Schedule experiment %d with weight %s and priority %s" %
+                    (experiment.eid, config["weight"], config["priority"]))
+        return experiment
+
+    def _run(self, entry):
+        try:
+            entry.experiment.start()
+            entry.result = entry.experiment.finish()
+        except Exception as e:
+            logger.fatal("Experiment %d failed: %s" % (entry.experiment.eid, e))
+        finally:
+            with self.lock:
+                self.entries.remove(entry)
+            self.notify()
+
+    def notify(self):
+        """
+        Ask for a new allocation, e.g. when an experiment has new jobs to run or a resource is freed
+        """
+        self.wakeup.set()
+
+    def join(self, timeout=None):
+        """
+        Wait until all experiments are finished
+
+        :param timeout: max time to wait for each experiment
+        :type timeout: float
+        """
+        while True:
+            with self.lock:
+                threads = [entry.thread for entry in self.entries]
+            if not threads:
+                return
+            for thread in threads:
+                thread.join(timeout)
+                if thread.is_alive():
+                    return
+
+    def stop(self):
+        """
+        Stop granting resources, running experiments finish their running jobs and end
+        """
+        self.stopped = True
+        with self.lock:
+            entries = list(self.entries)
+        for entry in entries:
+            entry.experiment.proposer.set_status(ProposerStatus.FINISHED)
+            with entry.experiment.status_changed:
+                entry.experiment.status_changed.notify_all()
+        self.notify()
+
+    def _loop(self):
+        while not self.stopped:
+            self.wakeup.wait(self.sleep_time)
+            self.wakeup.clear()
+            try:
+                self.allocate()
+            except Exception as e:  # pragma: no cover
+                logger.fatal("Failed to allocate resources: %s" % e)
+
+    def allocate(self):
+        """
+        Grant free resources to the experiments with jobs to run, see the order above.
+
+        :return: number of submitted jobs
+        :rtype: int
+        """
+        now = time.time()
+        with self.lock:
+            entries = list(self.entries)
+            for entry in entries:
+                entry.usage += entry.running * (now - self.last_tick)
+            self.last_tick = now
+
+        n_jobs = 0
+        blocked = set()  # no job or no resource for them until the next allocation
+        while not self.stopped:
+            candidates = [entry for entry in entries
+                          if entry not in blocked and entry.experiment.wanted_jobs() > 0]
+            if not candidates:
+                break
+            entry = min(candidates, key=_Entry.share)
+            if entry.experiment.run_scheduled_job():
+                n_jobs += 1
+            else:
+                blocked.add(entry)
+        return n_jobs
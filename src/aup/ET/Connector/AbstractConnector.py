@@ -71,16 +71,23 @@ class AbstractConnector(ABC):
         """
         raise NotImplementedError
 
+    def get_resources(self):
+        """
+        Get the whole resource table, to keep it in memory (see :mod:`aup.EE.Resource.utils.Placement`)
+
+        :return: list of resource ID, name, type and status
+        :rtype: [(int, str, str, str)]
+        """
+        raise NotImplementedError
+
     @abc.abstractmethod
     def take_available_resource(self, rid):
         """
-        Mark resource as used
-
-        TODO - currently where is prevention for async update, might not be relevant in the near future
+        Mark resource as used, if it is still free
 
         :param rid: Resource ID(s)
         :type rid: int
-        :return: True/False
+        :return: True/False, False if the resource is already used (e.g. taken by another process)
         """
         raise NotImplementedError
 
@@ -176,7 +183,7 @@ class AbstractConnector(ABC):
         raise NotImplementedError
 
     @abc.abstractmethod
-    def start_job(self, eid, rid, job_config):
+    def start_job(self, eid, rid, job_config, job_hash=None):
         """
         Start a job with job configuration and track it
 
@@ -186,6 +193,8 @@ class AbstractConnector(ABC):
         :type rid: int
         :param job_config: Configuration for :class:`aup.EE.Job.Job`
         :type job_config: BasicConfig
+        :param job_hash: key of the job in the result cache (see :mod:`aup.EE.ResultCache`)
+        :type job_hash: str
         :return: Job ID (jid)
         :rtype: int
         """
@@ -245,7 +254,7 @@ class AbstractConnector(ABC):
         self.end_job_attempt(jid)
         self.end_job(jid, score, status)
 
-    def job_started(self, eid, rid, job_config):
+    def job_started(self, eid, rid, job_config, job_hash=None):
         """
         Interface to automatically take resource and run job.
 
@@ -255,11 +264,13 @@ class AbstractConnector(ABC):
         :type rid: int
         :param job_config: Configuration for Job
         :type job_config: BasicConfig
+        :param job_hash: key of the job in the result cache
+        :type job_hash: str
         :return: Job ID
         :rtype: int
         """
         self.take_available_resource(rid)
-        return self.start_job(eid, rid, job_config)
+        return self.start_job(eid, rid, job_config, job_hash=job_hash)
 
     def job_failed(self, rid, jid):
         """
@@ -298,6 +309,12 @@ class AbstractConnector(ABC):
         """
         raise NotImplementedError
 
+    def flush(self):
+        """
+        Write the results queued by the connector, if any
+        """
+        pass
+
     def get_intermediate_results_job(self, jid):
         """
         Interface for extracting all intermediate results available for a given job.
@@ -358,6 +375,13 @@ class AbstractConnector(ABC):
         """
         raise NotImplementedError
 
+    def resume_experiment(self, eid):
+        """
+        Interface for restarting an experiment by eid, keeping its finished jobs.
+        Jobs still running (lost with the previous run) are marked as failed and their resources are freed.
+        """
+        raise NotImplementedError
+
     def log_error_message(self, eid, msg):
         """
         Log in database the error message
@@ -375,3 +399,51 @@ class AbstractConnector(ABC):
         Set the 'is_last_result' flag to true for this jid
         """
         raise NotImplementedError
+
+    def get_finished_jobs(self, eids, max_points=None):
+        """
+        Get the configurations and scores of finished jobs, latest first
+
+        :param eids: Experiment IDs
+        :type eids: [int]
+        :param max_points: maximal number of jobs, None for all
+        :type max_points: int
+        :return: list of job configuration and score
+        :rtype: [(dict, float)]
+        """
+        raise NotImplementedError
+
+    # ################ Result cache ##############
+    def prepare_result_cache(self):
+        """
+        Make sure jobs can be looked up by their hash, for databases created before the result cache
+        """
+        raise NotImplementedError
+
+    def get_cached_result(self, job_hash, ttl=None):
+        """
+        Get the latest finished job with the same hash
+
+        :param job_hash: key of the job in the result cache
+        :type job_hash: str
+        :param ttl: maximal age of the result in seconds, None for no limit
+        :type ttl: int
+        :return: Job ID and score, or None if not found
+        :rtype: (int, float)
+        """
+        raise NotImplementedError
+
+    def save_cached_job(self, eid, job_config, score):
+        """
+        Track a job whose score is taken from the result cache, without running it
+
+        :param eid: Experiment ID
+        :type eid: int
+        :param job_config: Configuration for Job
+        :type job_config: BasicConfig
+        :param score: cached score
+        :type score: float
+        :return: Job ID
+        :rtype: int
+        """
+        raise NotImplementedError
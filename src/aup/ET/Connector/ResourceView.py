@@ -0,0 +1,181 @@
+"""
+..
+  Copyright (c) 2018 LG Electronics Inc.
+  SPDX-License-Identifier: GPL-3.0-or-later
+
+aup.ET.Connector.ResourceView
+=============================
+
+In-memory copy of the resource table, to choose free resources without a database query for each job
+(see :mod:`aup.EE.Resource.utils.Placement`).
+
+One view is shared by all connectors to the same database in the process, and the connectors update it
+when they change resource status, so it is always up to date with the jobs of the process.
+The view is reloaded through any of these connectors still open, e.g. when experiments run together in the process
+(see :mod:`aup.EE.Scheduler`) and one of them closes its connector.
+Changes by other processes are seen when the view is reloaded, every ``refresh`` seconds,
+or when no free resource is left.
+
+APIs
+----
+"""
+import threading
+import time
+
+_views = dict()
+_views_lock = threading.Lock()
+
+
+class ResourceView(object):
+    """
+    In-memory copy of the resource table
+
+    :param connector: database connector, with :func:`AbstractConnector.get_resources`
+    :type connector: AbstractConnector
+    :param refresh: max age (in seconds) of the copy before it is reloaded
+    :type refresh: float
+    """
+
+    def __init__(self, connector, refresh=1):
+        self.connectors = [connector]
+        self.refresh = refresh
+        self.resources = dict()  # rid -> [name, type, status]
+        self.loaded = None
+        self.marked = None  # changes during a reload, applied again on the reloaded copy
+        self.lock = threading.Lock()
+
+    @classmethod
+    def get(cls, connector, refresh=1):
+        """
+        Get the view shared by the connectors to the same database
+
+        :param connector: database connector
+        :type connector: AbstractConnector
+        :param refresh: max age of the copy, the lowest one is kept
+        :type refresh: float
+        :return: resource view
+        :rtype: ResourceView
+        """
+        key = getattr(connector, "filename", None)
+        if key is None:
+            return cls(connector, refresh)
+        with _views_lock:
+            view = _views.get(key)
+            if view is None:
+                view = _views[key] = cls(connector, refresh)
+            else:
+                with view.lock:
+                    if connector not in view.connectors:
+                        view.connectors.append(connector)
+                view.refresh = min(view.refresh, refresh)
+        return view
+
+    @staticmethod
+    def update(key, rid, status):
+        """
+        Called by the connectors when resource status changes in the database
+
+        :param key: database of the connector
+        :type key: str
+        :param rid: resource ID, None for all resources
+        :type rid: int
+        :param status: new status, None if unknown (the view is reloaded at next use)
+        :type status: str
+        """
+        with _views_lock:
+            view = _views.get(key)
+        if view is None:
+            return
+        if status is None:
+            view.loaded = None
+        else:
+            view.mark(rid, status)
+
+    @property
+    def connector(self):
+        """
+        Connector to reload the view, the closed connectors are dropped (the last one is kept)
+        """
+        with self.lock:
+            if len(self.connectors) > 1:
+                self.connectors = [c for c in self.connectors if not c.is_closed()] or self.connectors[-1:]
+            return self.connectors[0]
+
+    def load(self):
+        with self.lock:
+            self.marked = dict()
+        # not under self.lock, the connector may call :func:`update` while holding its own lock
+        resources = self.connector.get_resources()
+        with self.lock:
+            self.resources = {rid: [name, rtype, status] for rid, name, rtype, status in resources}
+            for rid, status in self.marked.items():
+                self._mark(rid, status)
+            self.marked = None
+            self.loaded = time.time()
+
+    def _mark(self, rid, status):
+        if rid is None:
+            for resource in self.resources.values():
+                resource[2] = status
+        elif rid in self.resources:
+            self.resources[rid][2] = status
+
+    def mark(self, rid, status):
+        """
+        :param rid: resource ID, None for all resources
+        :type rid: int
+        :param status: "free" or "busy"
+        :type status: str
+        """
+        with self.lock:
+            self._mark(rid, status)
+            if self.marked is not None:
+                if rid is None:
+                    self.marked.clear()
+                self.marked[rid] = status
+
+    def _free(self, rtype, rid_blacklist):
+        # same selection as :func:`SQLiteConnector.get_available_resource`
+        rids = []
+        with self.lock:
+            if rid_blacklist:
+                rids = [rid for rid, (_, t, status) in self.resources.items()
+                        if status == "free" and t == rtype and rid not in rid_blacklist]
+            if not rids:
+                rids = [rid for rid, (_, t, status) in self.resources.items() if status == "free" and t in rtype]
+        return sorted(rids)
+
+    def free(self, rtype, rid_blacklist=None):
+        """
+        :param rtype: resource type
+        :type rtype: str
+        :param rid_blacklist: resources to avoid if possible
+        :type rid_blacklist: [int]
+        :return: free resource IDs
+        :rtype: [int]
+        """
+        if self.loaded is None or time.time() - self.loaded > self.refresh:
+            self.load()
+            return self._free(rtype, rid_blacklist)
+        rids = self._free(rtype, rid_blacklist)
+        if not rids:  # resources may be freed by other processes
+            self.load()
+            rids = self._free(rtype, rid_blacklist)
+        return rids
+
+    def name(self, rid):
+        if self.loaded is None:
+            self.load()
+        with self.lock:
+            return self.resources[rid][0] if rid in self.resources else None
+
+    def load_ratio(self, rids):
+        """
+        :param rids: resources of one host
+        :type rids: [int]
+        :return: ratio of busy resources
+        :rtype: float
+        """
+        with self.lock:
+            status = [self.resources[rid][2] for rid in rids if rid in self.resources]
+        return sum(1 for s in status if s != "free") / len(status) if status else 0.
@@ -9,52 +9,276 @@ aup.ET.Connector.SQLiteConnector
 If encounter "Failed to query SQLite after xx times" error,
 increase DELAY_INTERVAL and REPEATED_TIME to prevent problem temporarily.
 
+By default, one connection is shared by all threads, and the queries are serialized by a lock.
+With ``SQLITE_WAL = true`` in ``env.ini`` (see :doc:`environment`), the database is used in WAL mode
+with ``synchronous=NORMAL``, and each thread has its own connection:
+the queries reading the database run concurrently without the lock (and are not blocked by the writes;
+:func:`SQLiteConnector.close` waits for them), and waiting for other processes (e.g. the dashboard) is left to the
+SQLite busy timeout (``SQLITE_BUSY_TIMEOUT``, in seconds) instead of retries.
+
+With ``SQLITE_FLUSH_INTERVAL`` (in seconds) in ``env.ini``, the intermediate and multiple results are queued in memory
+and written in one transaction every ``SQLITE_FLUSH_INTERVAL`` seconds or ``SQLITE_FLUSH_ROWS`` rows,
+and when a job ends.
+The ``num`` of the intermediate results is counted in memory, and their ``irid`` is taken from a block reserved in the
+table (by a placeholder row at the end of the block, with the host and process of the connector in ``owner``), so that
+it is known before the rows are written.
+The placeholders of the processes of this host which exited without closing their connector, e.g. after a crash,
+are deleted when a connector starts (see :func:`aup.setupdb.sqlite.delete_placeholders`).
+The queued rows are kept if writing them fails, and written again with the next rows.
+
 APIs
 ----
 """
+import contextlib
 import logging
+import os
 import re
 import sqlite3
 import threading
+import time
 from time import sleep
 import json
 from datetime import datetime
 
 from .AbstractConnector import AbstractConnector
+from .ResourceView import ResourceView
+from ...metrics import SQLITE_CALL, SQLITE_RETRIES
+from ...setupdb.sqlite import delete_placeholders, placeholder_owner, prepare_placeholders
 
 logger = logging.getLogger(__name__)
 
 DELAY_INTERVAL = 0.1
 REPEATED_TIME = 5
+BUSY_TIMEOUT = 30
+FLUSH_ROWS = 1000
+IRID_BLOCK = 1024
 LOCK = threading.Lock()
 
-def _delayed(func):
+def _delayed(func, read=False):
     def wrapper(*args, **kwargs):
         flag = 0
-        while flag < REPEATED_TIME:
-            try:
-                LOCK.acquire() # make sure not to call @_delayed functions recursively from one another
-                results = func(*args, **kwargs)
-                return results
-            except sqlite3.ProgrammingError as ex:  # pragma: no cover
-                logger.critical("update is too frequent, delayed for 1 sec")
-                logger.debug("sqlite3 programming error: {}".format(ex))
-                sleep(DELAY_INTERVAL)
-                flag += 1
-            finally:
-                LOCK.release()
+        with SQLITE_CALL.time(call=func.__name__):
+            if args[0].wal:
+                if read:
+                    with args[0]._reader():
+                        return func(*args, **kwargs)
+                with LOCK:
+                    try:
+                        return func(*args, **kwargs)
+                    except BaseException:
+                        args[0].rollback()
+                        raise
+            while flag < REPEATED_TIME:
+                try:
+                    LOCK.acquire() # make sure not to call @_delayed functions recursively from one another
+                    results = func(*args, **kwargs)
+                    return results
+                except sqlite3.ProgrammingError as ex:  # pragma: no cover
+                    logger.critical("update is too frequent, delayed for 1 sec")
+                    logger.debug("sqlite3 programming error: {}".format(ex))
+                    SQLITE_RETRIES.inc(call=func.__name__)
+                    sleep(DELAY_INTERVAL)
+                    flag += 1
+                finally:
+                    LOCK.release()
         raise Exception("Failed to query SQLite after %d times" % flag)  # pragma: no cover
 
     return wrapper
 
 
+def _reading(func):
+    """
+    Same as :func:`_delayed` for the queries only reading the database, which run without lock in WAL mode
+    """
+    return _delayed(func, read=True)
+
+
+def _flushed(func):
+    """
+    Write the queued results before reading them, for the functions decorated by :func:`_reading`
+    """
+    def wrapper(self, *args, **kwargs):
+        self.flush()
+        return func(self, *args, **kwargs)
+
+    return wrapper
+
+
 class SQLiteConnector(AbstractConnector):
-    def __init__(self, filename):
+    """
+    Connector to a SQLite database
+
+    :param filename: database file
+    :type filename: str
+    :param wal: use the WAL mode, with one connection by thread
+    :type wal: bool
+    :param busy_timeout: time to wait for the database locked by other connections, in seconds
+    :type busy_timeout: float
+    :param flush_interval: max time the results are queued before being written, in seconds, 0 to write them at once
+    :type flush_interval: float
+    :param flush_rows: max number of queued rows
+    :type flush_rows: int
+    """
+
+    def __init__(self, filename, wal=False, busy_timeout=BUSY_TIMEOUT, flush_interval=0, flush_rows=FLUSH_ROWS):
         super(SQLiteConnector, self).__init__()
-        self.connector = sqlite3.connect(filename, check_same_thread=False)
-        self.cursor = self.connector.cursor()
-        self.cursor.execute("PRAGMA FOREIGN_KEYS = ON;")
+        self.filename = filename
+        self.wal = wal
+        self.busy_timeout = busy_timeout
         self.closed = False
+        self._local = threading.local()
+        self._connections = dict()  # thread ID -> connection, in WAL mode
+        self._connections_lock = threading.Lock()
+        self._readers = 0  # running queries decorated by _reading, in WAL mode
+        self._closing = False
+        self._readers_done = threading.Condition(self._connections_lock)
+        self.flush_interval = flush_interval
+        self.flush_rows = flush_rows
+        self._queued = []  # rows of intermediate_result
+        self._queued_multiple = []  # rows of multiple_result
+        self._nums = dict()  # jid -> num of the last intermediate result
+        self._irids = None  # [next irid, placeholder irid] of the reserved block
+        self._multiple_result_table = None
+        self._flush_stop = threading.Event()
+        if wal:
+            try:
+                mode = self.cursor.execute("PRAGMA journal_mode = WAL;").fetchone()[0]
+            except sqlite3.OperationalError as e:  # e.g. kept locked by connections of other processes
+                mode = e
+            if mode != "wal":
+                logger.warning("Failed to use WAL mode for %s: %s" % (filename, mode))
+        else:
+            self._connector = self._connect()
+            self._cursor = self._connector.cursor()
+        try:
+            self._delete_placeholders()
+        except sqlite3.OperationalError as e:  # e.g. locked by other processes
+            logger.warning("Failed to delete the placeholders of %s: %s" % (filename, e))
+        if flush_interval:
+            threading.Thread(target=self._flush_loop, daemon=True).start()
+
+    def _connect(self):
+        connector = sqlite3.connect(self.filename, timeout=self.busy_timeout, check_same_thread=False)
+        connector.execute("PRAGMA FOREIGN_KEYS = ON;")
+        if self.wal:
+            connector.execute("PRAGMA synchronous = NORMAL;")
+        return connector
+
+    @contextlib.contextmanager
+    def _reader(self):
+        depth = getattr(self._local, "reading", 0)
+        with self._readers_done:
+            if depth == 0:
+                # the queries starting during close run once the connections are closed
+                self._readers_done.wait_for(lambda: not self._closing or self.closed)
+            self._readers += 1
+        self._local.reading = depth + 1
+        try:
+            yield
+        finally:
+            self._local.reading = depth
+            with self._readers_done:
+                self._readers -= 1
+                self._readers_done.notify_all()
+
+    def _thread_connector(self):
+        # also for the threads keeping the connection closed by another thread
+        if self.closed:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        connector = getattr(self._local, "connector", None)
+        if connector is None:
+            connector = self._local.connector = self._connect()
+            self._local.cursor = connector.cursor()
+            with self._connections_lock:
+                # close the connections of the finished threads
+                alive = set(t.ident for t in threading.enumerate())
+                for ident in [ident for ident in self._connections if ident not in alive]:
+                    self._connections.pop(ident).close()
+                previous = self._connections.get(threading.get_ident())
+                if previous is not None:  # of a finished thread with the same ID
+                    previous.close()
+                self._connections[threading.get_ident()] = connector
+        return connector
+
+    @property
+    def connector(self):
+        """
+        Connection of the current thread in WAL mode, else the shared connection
+        """
+        if not self.wal:
+            return self._connector
+        return self._thread_connector()
+
+    @property
+    def cursor(self):
+        if not self.wal:
+            return self._cursor
+        self._thread_connector()
+        return self._local.cursor
+
+    def _flush_loop(self):
+        while not self._flush_stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:  # pragma: no cover
+                logger.error("Failed to write the queued results: %s" % e)
+
+    def _flush(self):
+        if not self._queued and not self._queued_multiple:
+            return
+        n_rows, n_rows_multiple = len(self._queued), len(self._queued_multiple)
+        try:
+            self.cursor.executemany("INSERT INTO intermediate_result (irid, num, score, jid, receive_time) \
+                                    VALUES (?, ?, ?, ?, ?)", self._queued[:n_rows])
+            self.cursor.executemany("INSERT INTO multiple_result \
+                                    (label_order, value, receive_time, jid, irid, eid, is_last_result) \
+                                    VALUES (?, ?, ?, ?, ?, ?, 0)", self._queued_multiple[:n_rows_multiple])
+            self.connector.commit()
+        except BaseException:
+            self.connector.rollback()  # the rows stay queued
+            raise
+        del self._queued[:n_rows]
+        del self._queued_multiple[:n_rows_multiple]
+
+    def _reserve_irids(self):
+        self._flush()  # before the placeholder of the previous block is removed
+        self.connector.commit()
+        self.cursor.execute("BEGIN IMMEDIATE")
+        self.cursor.execute("SELECT max(irid) FROM intermediate_result")
+        last = self.cursor.fetchone()[0] or 0
+        if self._irids is None:
+            prepare_placeholders(self.cursor)
+        self.cursor.execute("INSERT INTO intermediate_result (irid, owner) VALUES (?, ?)",
+                            (last + IRID_BLOCK, placeholder_owner()))
+        if self._irids is not None:
+            self.cursor.execute("DELETE FROM intermediate_result WHERE irid=? AND jid IS NULL", (self._irids[1],))
+        self.connector.commit()
+        self._irids = [last + 1, last + IRID_BLOCK]
+
+    @_delayed
+    def _delete_placeholders(self):
+        if delete_placeholders(self.cursor):
+            logger.info("Deleted the placeholders of intermediate results left in %s" % self.filename)
+        self.connector.commit()
+
+    def _release_irids(self):
+        if self._irids is not None:
+            self.cursor.execute("DELETE FROM intermediate_result WHERE irid=? AND jid IS NULL", (self._irids[1],))
+            self.connector.commit()
+            self._irids = None
+
+    @_delayed
+    def flush(self):
+        if not self.closed:
+            self._flush()
+
+    def rollback(self):
+        """
+        Roll back the transaction of the current thread, e.g. after a failed query
+        """
+        connector = getattr(self._local, "connector", None) if self.wal else self._connector
+        if connector is not None and not self.closed:
+            connector.rollback()
 
     def _fix_name(self, name):
         self.cursor.execute("SELECT name FROM experiment WHERE name = ?", (name,))
@@ -76,25 +300,43 @@ class SQLiteConnector(AbstractConnector):
             raise ValueError("Resource ID is not integer, %s"%type(rid))
         self.cursor.execute("UPDATE resource SET status=? WHERE rid=?", (status, rid))
         self.connector.commit()
+        ResourceView.update(self.filename, rid, status)
         # other utils
 
     @_delayed
     def free_all_resources(self):
         self.cursor.execute("UPDATE resource SET status='free'")
         self.connector.commit()
+        ResourceView.update(self.filename, None, "free")
 
     @_delayed
     def close(self):
-        self.connector.commit()
-        self.connector.close()
+        self._flush_stop.set()
+        self._flush()
+        self._release_irids()
+        if not self.wal:
+            self.connector.commit()
+            self._cursor.close()  # a query not fully fetched would keep the database locked after closing
+            self.connector.close()
+        else:
+            with self._readers_done:
+                self._closing = True
+                self._readers_done.wait_for(lambda: self._readers == 0)
+                for connector in self._connections.values():
+                    connector.commit()
+                    connector.close()
+                self._connections.clear()
+                self.closed = True
+                self._readers_done.notify_all()
         self.closed = True
 
-    @_delayed
+    @_reading
     def is_closed(self):
         return self.closed
 
     @_delayed
     def end_experiment(self, eid, status="FINISHED"):
+        self._flush()
         self.cursor.execute("UPDATE experiment SET end_time=strftime('%s','now'), status=? WHERE eid=?", (status, eid))
         self.connector.commit()
 
@@ -105,6 +347,8 @@ class SQLiteConnector(AbstractConnector):
 
     @_delayed
     def end_job(self, jid, score=None, status=None):
+        self._flush()
+        self._nums.pop(jid, None)
         self.cursor.execute("UPDATE job SET end_time=strftime('%s','now'), status=?, score=? WHERE jid=?", (status, score, jid))
         self.connector.commit()
 
@@ -119,7 +363,7 @@ class SQLiteConnector(AbstractConnector):
         self._mark_resource(rid, 'free')
         return True
 
-    @_delayed
+    @_reading
     def get_all_experiment(self, username=None):
         if username:
             self.cursor.execute("SELECT uid FROM user WHERE name = ?", (username,))
@@ -132,7 +376,7 @@ class SQLiteConnector(AbstractConnector):
         eids = self.cursor.fetchall()
         return [e[0] for e in eids]  # unzip tuple of one element
 
-    @_delayed
+    @_reading
     def get_available_resource(self, username, rtype, rid_blacklist=None):
         rids = []
         if rid_blacklist:
@@ -149,12 +393,17 @@ class SQLiteConnector(AbstractConnector):
             rids = [i[0] for i in self.cursor.fetchall()]
         return rids
 
-    @_delayed
+    @_reading
+    def get_resources(self):
+        self.cursor.execute("SELECT rid, name, type, status FROM resource;")
+        return self.cursor.fetchall()
+
+    @_reading
     def get_all_history(self, eid):
         self.cursor.execute("SELECT * FROM job WHERE eid = ?", (eid,))
         return self.cursor.fetchall()
 
-    @_delayed
+    @_reading
     def get_best_result(self, eid, maximize=True):
         if maximize:
             self.cursor.execute("""SELECT jid, score 
@@ -172,7 +421,7 @@ class SQLiteConnector(AbstractConnector):
                 return None
         return list(t)
 
-    @_delayed
+    @_reading
     def get_best_result_config(self, eid, maximize=True):
         if maximize:
             self.cursor.execute("""SELECT job_config 
@@ -184,14 +433,14 @@ class SQLiteConnector(AbstractConnector):
 
         return t
 
-    @_delayed
+    @_reading
     def get_running_job(self, eid):
         self.cursor.execute("SELECT jid FROM job WHERE eid = ?", (eid,))
         jid = [i[0] for i in self.cursor.fetchall()]
         logger.debug("%s" % jid)
         return jid
 
-    @_delayed
+    @_reading
     def get_resource_type(self):
         self.cursor.execute("SELECT DISTINCT type from resource;")
         return [i[0] for i in self.cursor.fetchall()]
@@ -213,6 +462,8 @@ class SQLiteConnector(AbstractConnector):
 
     @_delayed
     def start_experiment_by_eid(self, eid):
+        self._flush()
+        self._nums.clear()
         self.cursor.execute("DELETE FROM multiple_result WHERE eid={eid}".format(eid=eid))
         self.connector.commit()
         self.cursor.execute("DELETE FROM job_attempt WHERE jid in (SELECT jid FROM job WHERE eid={eid})".format(eid=eid))
@@ -226,9 +477,26 @@ class SQLiteConnector(AbstractConnector):
         self.connector.commit()
 
     @_delayed
-    def start_job(self, eid, rid, job_config):
-        self.cursor.execute("INSERT INTO job (eid, start_time, job_config, status) VALUES (?, strftime('%s','now'), ?, 'RUNNING')",
-                            (eid, json.dumps(job_config)))
+    def resume_experiment(self, eid):
+        self.cursor.execute("""UPDATE resource SET status = 'free' WHERE rid IN
+            (SELECT a.rid FROM job_attempt a JOIN job j ON a.jid = j.jid WHERE j.eid = ? AND j.status = 'RUNNING')""",
+                            (eid,))
+        self.cursor.execute("UPDATE job SET end_time = strftime('%s','now'), status = 'FAILED' \
+                            WHERE eid = ? AND status = 'RUNNING'", (eid,))
+        self.cursor.execute("UPDATE experiment SET end_time = NULL, error_msg = NULL, status = 'RUNNING' \
+                            WHERE eid = ?", (eid,))
+        self.connector.commit()
+        ResourceView.update(self.filename, None, None)
+
+    @_delayed
+    def start_job(self, eid, rid, job_config, job_hash=None):
+        if job_hash is None:  # the column is missing in databases created before the result cache
+            self.cursor.execute("INSERT INTO job (eid, start_time, job_config, status) VALUES (?, strftime('%s','now'), ?, 'RUNNING')",
+                                (eid, json.dumps(job_config)))
+        else:
+            self.cursor.execute("INSERT INTO job (eid, start_time, job_config, status, job_hash) \
+                                VALUES (?, strftime('%s','now'), ?, 'RUNNING', ?)",
+                                (eid, json.dumps(job_config), job_hash))
         self.connector.commit()
         jid = self.cursor.lastrowid
         self.cursor.execute("INSERT INTO job_attempt (jid, num, rid, start_time) VALUES (?, 0, ?, (SELECT start_time FROM job j WHERE j.jid=?))",
@@ -251,11 +519,19 @@ class SQLiteConnector(AbstractConnector):
 
     @_delayed
     def take_available_resource(self, rid):
-        self._mark_resource(rid, 'busy')
-        return True
+        if not isinstance(rid, int):
+            raise ValueError("Resource ID is not integer, %s"%type(rid))
+        # only if still free, the resource may be chosen from an outdated ResourceView by other processes
+        self.cursor.execute("UPDATE resource SET status='busy' WHERE rid=? AND status='free'", (rid,))
+        taken = self.cursor.rowcount == 1
+        self.connector.commit()
+        ResourceView.update(self.filename, rid, "busy")
+        return taken
 
     @_delayed
     def save_intermediate_result(self, jid, score):
+        if self.flush_interval:
+            return self._queue_intermediate_result(jid, score)
         self.cursor.execute("""
             INSERT INTO intermediate_result (num, jid, score, receive_time) 
             VALUES ((SELECT CASE EXISTS(SELECT num FROM intermediate_result ir WHERE ir.jid=?) 
@@ -266,7 +542,23 @@ class SQLiteConnector(AbstractConnector):
         self.connector.commit()
         return self.cursor.lastrowid
 
-    @_delayed
+    def _queue_intermediate_result(self, jid, score):
+        if jid not in self._nums:
+            self.cursor.execute("SELECT max(num) FROM intermediate_result WHERE jid=?", (jid,))
+            last = self.cursor.fetchone()[0]
+            self._nums[jid] = -1 if last is None else last
+        if self._irids is None or self._irids[0] >= self._irids[1]:
+            self._reserve_irids()
+        irid = self._irids[0]
+        self._irids[0] += 1
+        self._nums[jid] += 1
+        self._queued.append((irid, self._nums[jid], score, jid, int(time.time())))
+        if len(self._queued) + len(self._queued_multiple) >= self.flush_rows:
+            self._flush()
+        return irid
+
+    @_flushed
+    @_reading
     def get_intermediate_results_job(self, jid):
         self.cursor.execute("""
             SELECT score
@@ -276,7 +568,8 @@ class SQLiteConnector(AbstractConnector):
         rows = [row[0] for row in self.cursor.fetchall()]
         return rows
 
-    @_delayed
+    @_flushed
+    @_reading
     def get_intermediate_results_jobs(self, jids):
         self.cursor.execute("""
             SELECT jid, score
@@ -291,7 +584,8 @@ class SQLiteConnector(AbstractConnector):
             results[jid] += [score]
         return results
 
-    @_delayed
+    @_flushed
+    @_reading
     def get_intermediate_results_experiment(self, eid, status):
         self.cursor.execute("""
             SELECT jid, score
@@ -322,6 +616,8 @@ class SQLiteConnector(AbstractConnector):
 
     @_delayed
     def delete_experiment(self, eid):
+        self._flush()
+        self._nums.clear()
         self.cursor.execute("SELECT eid FROM experiment WHERE eid = ?", (eid,))
         check_eid = self.cursor.fetchone()
         if check_eid is None:
@@ -336,7 +632,7 @@ class SQLiteConnector(AbstractConnector):
 
         return True
 
-    @_delayed
+    @_reading
     def get_experiment_status(self, eid):
         self.cursor.execute("SELECT status FROM experiment WHERE eid = ? LIMIT 1", (eid,))
         status = self.cursor.fetchone()
@@ -346,7 +642,7 @@ class SQLiteConnector(AbstractConnector):
         
         return status[0]
     
-    @_delayed
+    @_reading
     def maybe_get_experiment_status(self, eid):
         # TODO: we need a way to recursively call these functions without locking issues (due to @_delayed)
         if self.closed:
@@ -369,15 +665,23 @@ class SQLiteConnector(AbstractConnector):
     def save_multiple_results(self, jid, irid, eid, labels, scores):
         receive_time = int(datetime.now().timestamp())
 
-        self.cursor.execute("""
-                    SELECT count(*) FROM sqlite_master WHERE type='table' AND name='multiple_result'""")
-        res = self.cursor.fetchone()[0]
+        if self._multiple_result_table is None:
+            self.cursor.execute("""
+                        SELECT count(*) FROM sqlite_master WHERE type='table' AND name='multiple_result'""")
+            self._multiple_result_table = self.cursor.fetchone()[0] > 0
 
-        if res == 0:
+        if not self._multiple_result_table:
             logger.warning("multiple_result table not found, continuing without saving multiple results! \n \
                             Please consider updating Auptimizer to >=1.5")
             return
 
+        if self.flush_interval:
+            self._queued_multiple.extend((idx+1, scores[idx], receive_time, jid, irid, eid)
+                                         for idx in range(len(scores)))
+            if len(self._queued) + len(self._queued_multiple) >= self.flush_rows:
+                self._flush()
+            return
+
         for idx in range(len(scores)):
             self.cursor.execute("""
                     INSERT INTO multiple_result (label_order, value, receive_time, jid, irid, eid, is_last_result)
@@ -388,6 +692,7 @@ class SQLiteConnector(AbstractConnector):
 
     @_delayed
     def set_last_multiple_results(self, eid, jid, num_labels):
+        self._flush()
         self.cursor.execute("""
                     SELECT mrid FROM multiple_result WHERE eid=? AND jid=?
                     ORDER BY mrid DESC LIMIT 0,?""", (eid, jid, num_labels))
@@ -399,3 +704,43 @@ class SQLiteConnector(AbstractConnector):
 
         self.connector.commit()
 
+    @_reading
+    def get_finished_jobs(self, eids, max_points=None):
+        eids = [int(eid) for eid in eids]
+        self.cursor.execute("""SELECT job_config, score FROM job
+            WHERE eid IN ({}) AND status = 'FINISHED' AND typeof(score) = 'real'
+            ORDER BY jid DESC LIMIT ?""".format(",".join("?" * len(eids))),
+                            eids + [-1 if max_points is None else max_points])
+        return [(json.loads(i[0]), i[1]) for i in self.cursor.fetchall()]
+
+    @_delayed
+    def prepare_result_cache(self):
+        self.cursor.execute("PRAGMA table_info(job)")
+        if "job_hash" not in [i[1] for i in self.cursor.fetchall()]:
+            logger.info("Add job_hash column to the job table for the result cache")
+            self.cursor.execute("ALTER TABLE job ADD COLUMN job_hash TEXT")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS job_hash_idx ON job(job_hash)")
+        self.connector.commit()
+
+    @_reading
+    def get_cached_result(self, job_hash, ttl=None):
+        if ttl is None:
+            self.cursor.execute("""SELECT jid, score FROM job
+                WHERE job_hash = ? AND status = 'FINISHED' AND typeof(score) = 'real'
+                ORDER BY end_time DESC LIMIT 1""", (job_hash,))
+        else:
+            self.cursor.execute("""SELECT jid, score FROM job
+                WHERE job_hash = ? AND status = 'FINISHED' AND typeof(score) = 'real'
+                AND end_time >= strftime('%s','now') - ?
+                ORDER BY end_time DESC LIMIT 1""", (job_hash, ttl))
+        t = self.cursor.fetchone()
+        return None if t is None else tuple(t)
+
+    @_delayed
+    def save_cached_job(self, eid, job_config, score):
+        # no job_hash, so the age of the cached result is not reset by this copy
+        self.cursor.execute("INSERT INTO job (eid, score, start_time, end_time, job_config, status) \
+                            VALUES (?, ?, strftime('%s','now'), strftime('%s','now'), ?, 'FINISHED')",
+                            (eid, score, json.dumps(job_config)))
+        self.connector.commit()
+        return self.cursor.lastrowid
@@ -37,6 +37,38 @@ def create_param_config(name, vrange, vtype):
 
     return {'name': name, 'range': vrange, 'type': vtype}
 
+
+def _to_space(param, value):
+    """
+    Convert value to the type of the hyperparameter, None if it is out of the search space.
+    """
+    vtype = param.get("type", "int")
+    vrange = param.get("range", [0, 1])
+    if vtype in ("choice", "enum"):  # choice is renamed as enum by SpearmintProposer
+        return value if value in vrange else None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    if vtype == "int":
+        if int(value) != value:
+            return None
+        value = int(value)
+    else:
+        value = float(value)
+    return value if min(vrange) <= value <= max(vrange) else None
+
+
+def point_key(point):
+    """
+    Hashable representation of hyperparameter values, robust to float rounding
+
+    :param point: hyperparameter values
+    :type point: dict
+    :rtype: str
+    """
+    return json.dumps({k: round(v, 9) if isinstance(v, float) else v for k, v in point.items()},
+                      sort_keys=True, default=str)
+
+
 class AbstractProposer(ABC):
     """
     Proposer to generate new values for hyperparameters
@@ -52,6 +84,7 @@ class AbstractProposer(ABC):
         self.status = ProposerStatus.RUNNING  # whether the experiment is finished
         self.status_lock = threading.Lock()
         AbstractProposer.verify_config(self, config)
+        self.parameter_config = config["parameter_config"]
 
     def set_status(self, status):
         with self.status_lock:
@@ -140,6 +173,36 @@ class AbstractProposer(ABC):
 
         return self.current_proposal.copy()
 
+    def get_batch(self, n, **kwargs):
+        """
+        Wrapper for specific :func:`get_param_batch` to propose up to ``n`` configurations at once.
+
+        The batch is capped by the number of remaining jobs and may be shorter than ``n`` (or empty)
+        if the proposer has to wait for results before proposing more.
+        ``counter`` is **not** updated, as for :func:`get`.
+
+        :param n: maximal number of proposals
+        :type n: int
+        :param kwargs: any arguments to be passed to :func:`get_param_batch`
+        :type kwargs: dict
+        :return: list of parameter values
+        :rtype: [dict]
+        """
+        self.check_termination()
+        if self.get_status() != ProposerStatus.RUNNING:
+            return []
+        n = min(n, self.get_remaining_jobs())
+        if n <= 0:
+            return []
+        batch = self.get_param_batch(n, **kwargs)
+
+        logger.debug(batch)
+        if not batch:
+            return []
+
+        self.current_proposal = batch[-1]
+        return [proposal.copy() for proposal in batch]
+
     @abc.abstractmethod
     def get_param(self, **kwargs):
         """
@@ -147,6 +210,81 @@ class AbstractProposer(ABC):
         """
         raise NotImplementedError
 
+    def get_param_batch(self, n, **kwargs):
+        """
+        Get up to ``n`` new proposed parameter values.
+
+        By default, it calls :func:`get_param` repeatedly and stops at the first empty proposal.
+        Proposers which can share work between proposals should override it.
+
+        :param n: maximal number of proposals
+        :type n: int
+        :return: list of parameter values
+        :rtype: [dict]
+        """
+        batch = []
+        for _ in range(n):
+            proposal = self.get_param(**kwargs)
+            if not proposal:
+                break
+            batch.append(proposal.copy())  # some proposers reuse the same dict for each proposal
+        return batch
+
+    def warm_start(self, history):
+        """
+        Seed the proposer with finished jobs of previous experiments (see ``warm_start`` in :doc:`algorithm`).
+
+        :param history: job configurations and scores
+        :type history: [(dict, float)]
+        """
+        logger.warning("%s does not support warm start, previous jobs are ignored" % type(self).__name__)
+
+    def map_history(self, history, keep=()):
+        """
+        Map previous jobs onto the current search space, jobs with missing or out-of-range values are dropped.
+
+        :param history: job configurations and scores
+        :type history: [(dict, float)]
+        :param keep: other keys of the job configurations to keep, if present
+        :type keep: [str]
+        :return: hyperparameter values and scores
+        :rtype: [(dict, float)]
+        """
+        points = []
+        for job_config, score in history:
+            point = {}
+            for param in self.parameter_config:
+                value = _to_space(param, job_config.get(param["name"]))
+                if value is None:
+                    break
+                point[param["name"]] = value
+            else:
+                point.update({k: job_config[k] for k in keep if k in job_config})
+                points.append((point, score))
+        logger.info("Warm start from %d of %d previous jobs" % (len(points), len(history)))
+        return points
+
+    def is_prefetch_stale(self):
+        """
+        Whether proposals computed before the latest results should be replaced by new ones.
+
+        By default proposals are kept, which is the only option for proposers whose proposals
+        don't depend on results or can't be given back (see :func:`discard`).
+
+        :return: True if the unused proposals should be discarded
+        :rtype: bool
+        """
+        return False
+
+    def discard(self, proposals):
+        """
+        Give back proposals which won't be run, so the proposer doesn't wait for their results.
+
+        :param proposals: proposals from :func:`get_batch`
+        :type proposals: [dict]
+        """
+        pass
+
     def reload(self, path):
         """
         Reload Proposer state from path
@@ -29,6 +29,7 @@ num_samples          64                  Number of samples for EI
 random_fraction      0.3333333333333333  Fraction to explore randomly
 bandwidth_factor     3                   Widening factor for KDE
 min_bandwidth        0.001               Minimum sample bandwidth
+random_seed          None                Seed for sampling random configurations
 ==================== =================== ========================================
 
 
@@ -94,7 +95,7 @@ class BOHBProposer(AbstractProposer):
 
         self.nSamples = self._get_nSample()
         bohb_config = {k: config[k] for k in BOHB_DEFAULT}
-        configspace = self.create_configspace(config['parameter_config'])
+        configspace = self.create_configspace(config['parameter_config'], seed=config.get('random_seed'))
 
         self.config_generator = BOHB(configspace, **bohb_config)
 
@@ -150,6 +151,21 @@ class BOHBProposer(AbstractProposer):
         self.config_generator.new_result(job)
         del self.running_jobs[i]
 
+    def warm_start(self, history):
+        """
+        Previous jobs are registered in the KDE models, at their budget (``n_iterations``, or ``max_budget``).
+        """
+        points = {}
+        for point, score in self.map_history(history, keep=("n_iterations",)):
+            budget = point.pop("n_iterations", self.max_budget)
+            points.setdefault(budget, []).append((point, score))
+        for budget, budget_points in points.items():
+            for i, (point, score) in enumerate(budget_points):
+                job = Job((-1, 0, i), config=point, budget=budget)
+                job.result = {'loss': score * self.target}
+                # build the model only once per budget
+                self.config_generator.new_result(job, update_model=(i == len(budget_points) - 1))
+
     def failed(self, job):
         """
         Failed jobs unsupported by BOHB Proposer.
@@ -180,11 +196,11 @@ class BOHBProposer(AbstractProposer):
         return nSamples
 
     @staticmethod
-    def create_configspace(parameter_config):
+    def create_configspace(parameter_config, seed=None):
         """
         Wrap the Worker's get_configspace() function for HpBandSter interface
         """
-        cs = CS.ConfigurationSpace()
+        cs = CS.ConfigurationSpace(seed=seed)
         params = []
         for config in parameter_config:
             p = AbstractProposer.parse_param_config(config)
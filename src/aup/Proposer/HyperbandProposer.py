@@ -81,7 +81,7 @@ class HyperbandProposer(AbstractProposer):
             self.nSamples += int(ceil(self.B / self.max_iter / (s + 1) * self.eta ** s))
         logger.info("Total number of samples is %d"%self.nSamples)
         set_default_keyvalue("random_seed", 0, config)
-        random.seed(config["random_seed"])
+        self.rng = random.Random(config["random_seed"])
         self.t = 0
         self.i = 0
         self.n = 0
@@ -99,7 +99,7 @@ class HyperbandProposer(AbstractProposer):
         self.r = self.max_iter * self.eta ** (-s)
         gen_config = self.config.copy()
         gen_config["n_samples"] = self.n
-        gen_config["random_seed"] = random.randint(0, 100)
+        gen_config["random_seed"] = self.rng.randint(0, 100)
         gen_config["proposer"] = gen_config["engine"]
         proposer = get_proposer(gen_config['proposer'])(gen_config)
         self.test_set = [proposer.get for _ in range(self.n)]
@@ -44,7 +44,7 @@ import numpy as np
 from six.moves import input
 
 from .AbstractProposer import AbstractProposer
-from .hyperopt import hp, base
+from .hyperopt import hp, base, tpe
 from .hyperopt.utils import coarse_utcnow
 from ..utils import set_default_keyvalue, check_missing_key, get_from_options
 
@@ -92,7 +92,8 @@ class HyperoptProposer(AbstractProposer):
         self.rstate = np.random.RandomState(config["random_seed"])
         self.domain = base.Domain(lambda x: logger.fatal("should not be run"), self.space)
         self.trials = base.Trials()
-        self.algo = _get_algo(config["engine"])
+        self.engine = config["engine"]
+        self.algo = _get_algo(self.engine)
 
     @staticmethod
     def setup_config():  # pragma: no cover
@@ -107,18 +108,33 @@ class HyperoptProposer(AbstractProposer):
         """
         Restructure of hyperopt.fmin `run()`, `serial_evaluate()`.
         """
-        new_ids = self.trials.new_trial_ids(1)  # only one config each time
-        trial = self.algo(new_ids, self.domain, self.trials, self.rstate.randint(2 ** 31 - 1))[0]
+        return self.get_param_batch(1, **kwargs)[0]
 
-        trial['state'] = base.JOB_STATE_RUNNING
-        now = coarse_utcnow()
-        trial['book_time'] = now
-        trial['refresh_time'] = now
-        spec = base.spec_from_misc(trial['misc'])
+    def get_param_batch(self, n, **kwargs):
+        """
+        Propose ``n`` configurations, with as few calls to the search engine as possible.
 
-        self.trials.insert_trial_docs([trial])
-        self.trials.refresh()
+        ``random`` (and ``tpe`` before enough trials are observed) samples all new trials in one call;
+        ``tpe`` returns one trial per call, which is then booked before the next one is suggested.
+        """
+        new_ids = self.trials.new_trial_ids(n)
+        trials = []
+        while len(trials) < n:
+            docs = self.algo(new_ids[len(trials):], self.domain, self.trials, self.rstate.randint(2 ** 31 - 1))
+            if not docs:
+                break
+            now = coarse_utcnow()
+            for trial in docs:
+                trial['state'] = base.JOB_STATE_RUNNING
+                trial['book_time'] = now
+                trial['refresh_time'] = now
+            self.trials.insert_trial_docs(docs)
+            self.trials.refresh()
+            trials.extend(docs)
+        return [self._to_spec(trial) for trial in trials]
 
+    def _to_spec(self, trial):
+        spec = base.spec_from_misc(trial['misc'])
         for param in self.parameter_config:
             if param['type'] == "int":
                 spec[param['name']] = int(spec[param['name']] + param['range'][0])
@@ -127,13 +143,74 @@ class HyperoptProposer(AbstractProposer):
         spec['tid'] = trial['tid']
         return spec
 
+    def warm_start(self, history):
+        """
+        Previous jobs are added as completed trials.
+        """
+        points = []
+        for point, score in self.map_history(history):
+            vals = {}
+            for param in self.parameter_config:
+                value = point[param['name']]
+                if param['type'] == "int":
+                    value -= param['range'][0]
+                    if value >= param['range'][1] - param['range'][0]:  # out of hp.randint
+                        break
+                elif param['type'] == "choice":
+                    value = param['range'].index(value)
+                vals[param['name']] = value
+            else:
+                points.append((vals, score))
+        if not points:
+            return
+
+        now = coarse_utcnow()
+        docs = []
+        for tid, (vals, score) in zip(self.trials.new_trial_ids(len(points)), points):
+            misc = dict(tid=tid, cmd=self.domain.cmd, workdir=self.domain.workdir,
+                        idxs={k: [tid] for k in vals}, vals={k: [v] for k, v in vals.items()})
+            doc, = self.trials.new_trial_docs([tid], [None], [{'loss': score * self.target, 'status': 'ok'}], [misc])
+            doc['state'] = base.JOB_STATE_DONE
+            doc['book_time'] = now
+            doc['refresh_time'] = now
+            docs.append(doc)
+        self.trials.insert_trial_docs(docs)
+        self.trials.refresh()
+
+    def is_prefetch_stale(self):
+        """
+        Proposals are outdated by new results once the engine learns from them:
+        never for ``rand``, and for ``tpe`` only after its random startup trials.
+        """
+        if self.engine == "rand":
+            return False
+        if self.engine == "tpe":
+            return self.trials.count_by_state_unsynced(base.JOB_STATE_DONE) >= tpe._default_n_startup_jobs
+        return True
+
+    def discard(self, proposals):
+        """
+        Remove the booked trials of unused proposals from the history.
+
+        They are marked as errors, which :func:`hyperopt.Trials.refresh` leaves out of the trials,
+        and their ``tid`` is not reused.
+        """
+        tids = set(proposal['tid'] for proposal in proposals)
+        now = coarse_utcnow()
+        for trial in self.trials.trials:
+            if trial['tid'] in tids:
+                trial['state'] = base.JOB_STATE_ERROR
+                trial['refresh_time'] = now
+        self.trials.refresh()
+
     def reload(self, path):
         super(HyperoptProposer, self).reload(path)
         self.domain = base.Domain(lambda x: logger.fatal("should not be run"), self.space)
 
-    def save(self, path):
-        del self.domain
-        super(HyperoptProposer, self).save(path)
+    def __getstate__(self):
+        state = super(HyperoptProposer, self).__getstate__()
+        state.pop('domain', None)  # rebuilt by reload, so the proposer keeps running after saving
+        return state
 
     def update(self, score, job):
         """
@@ -150,7 +227,7 @@ class HyperoptProposer(AbstractProposer):
         else:
             result = {'loss': None, 'status': 'fail'}
             state = base.JOB_STATE_ERROR
-        for trial in self.trials._dynamic_trials:
+        for trial in self.trials.trials:
             if tid == trial['tid']:
                 trial['state'] = state
                 trial['result'] = result
@@ -0,0 +1,355 @@
+"""
+..
+  Copyright (c) 2018 LG Electronics Inc.
+  SPDX-License-Identifier: GPL-3.0-or-later
+
+aup.Proposer.ProposerProcess
+============================
+
+Host a proposer in a dedicated worker process, talking to it through an ask/tell channel (:mod:`multiprocessing` pipe).
+
+Heavy proposers (e.g. MCMC for Spearmint, KDE refits for BOHB) otherwise run in the thread processing job results,
+which delays all other completions.
+With :class:`ProposerProcess`, ``update`` and ``failed`` are sent without waiting for the proposer,
+and the worker computes the next proposals while jobs are running, so they are ready when a slot is free.
+
+It is enabled in the experiment configuration by::
+
+  "proposer_process": {
+    "prefetch": 1
+  }
+
+where ``prefetch`` is the number of proposals computed ahead of time.
+
+The requests sent without waiting (e.g. ``update``) are not answered, but the worker pushes a message when one of them
+fails or changes the status of the proposer, which the proxy reads before its next call.
+
+APIs
+----
+"""
+import logging
+import multiprocessing
+import signal
+import threading
+from collections import deque
+
+from . import ProposerStatus, get_proposer
+from ..utils import set_default_keyvalue
+
+logger = logging.getLogger(__name__)
+
+
+def _state(proposer):
+    return {"status": proposer.get_status(), "counter": proposer.counter, "nSamples": proposer.nSamples}
+
+
+def _propose(proposer, n, buffer):
+    """
+    Get up to ``n`` new proposals, not exceeding the remaining jobs (including those in ``buffer``)
+    """
+    proposer.check_termination()
+    if proposer.get_status() != ProposerStatus.RUNNING:
+        return []
+    n = min(n, proposer.get_remaining_jobs() - len(buffer))
+    if n <= 0:
+        return []
+    return proposer.get_param_batch(n)
+
+
+# requests answered by the worker, the other ones only push a message if they fail or change the status
+_REQUESTS = ("get", "stale", "save", "reload")
+
+
+def _serve(conn, name, config, prefetch, history=None):
+    """
+    Main loop of the worker process, answers the requests from :class:`ProposerProcess` in order,
+    and fill up the prefetch buffer when idle.
+
+    :param conn: end of the pipe to :class:`ProposerProcess`
+    :type conn: multiprocessing.connection.Connection
+    :param name: name of the proposer
+    :type name: str
+    :param config: experiment configuration
+    :type config: dict
+    :param prefetch: number of proposals to compute ahead of time
+    :type prefetch: int
+    :param history: previous jobs for :func:`AbstractProposer.warm_start`, applied before any proposal
+    :type history: [(dict, float)]
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # stopped by the experiment
+    try:
+        proposer = get_proposer(name)(config)
+        if history:
+            proposer.warm_start(history)
+    except Exception as e:
+        conn.send(("error", "%s: %s" % (type(e).__name__, e)))
+        return
+    conn.send(("ok", _state(proposer)))
+
+    buffer = deque()
+    exhausted = False  # the proposer needs results before proposing more
+    while True:
+        if not exhausted and len(buffer) < prefetch and not conn.poll(0):
+            try:
+                proposals = _propose(proposer, 1, buffer)
+            except Exception as e:
+                logger.fatal("Failed to prefetch proposal: %s", e)
+                proposals = []
+            buffer.extend(proposals)
+            exhausted = not proposals
+            continue
+
+        try:
+            msg = conn.recv()
+        except EOFError:
+            return
+        cmd, args = msg[0], msg[1:]
+        status = proposer.get_status()
+        try:
+            if cmd == "close":
+                return
+            elif cmd == "get":
+                n = args[0]
+                batch = [buffer.popleft() for _ in range(min(n, len(buffer)))]
+                if len(batch) < n:
+                    batch.extend(_propose(proposer, n - len(batch), buffer))
+                if batch:
+                    proposer.current_proposal = batch[-1]
+                conn.send(("ok", _state(proposer), batch))
+            elif cmd == "update":
+                proposer.update(*args)
+                exhausted = False
+            elif cmd == "failed":
+                proposer.failed(*args)
+                exhausted = False
+            elif cmd == "increment":
+                proposer.increment_job_counter()
+            elif cmd == "reset":
+                proposer.reset()
+                exhausted = False
+            elif cmd == "stale":
+                stale = proposer.is_prefetch_stale()
+                if stale and buffer:
+                    proposer.discard(list(buffer))
+                    buffer.clear()
+                    exhausted = False
+                conn.send(("ok", _state(proposer), stale))
+            elif cmd == "discard":
+                proposer.discard(args[0])
+                exhausted = False
+            elif cmd == "set_status":
+                proposer.set_status(args[0])
+            elif cmd in ("save", "reload"):
+                try:
+                    getattr(proposer, cmd)(args[0])
+                except NotImplementedError as e:
+                    conn.send(("unsupported", str(e)))
+                    continue
+                if cmd == "reload":
+                    buffer.clear()
+                    exhausted = False
+                conn.send(("ok", _state(proposer)))
+            else:
+                raise ValueError("Unknown request %s" % cmd)
+            if cmd not in _REQUESTS and cmd != "set_status" and proposer.get_status() != status:
+                conn.send(("pushed", proposer.get_status(), None))
+        except Exception as e:
+            logger.fatal("Proposer failed on %s: %s", cmd, e)
+            proposer.set_status(ProposerStatus.FAILED)
+            if cmd in _REQUESTS:
+                conn.send(("error", "%s: %s" % (type(e).__name__, e)))
+            else:
+                conn.send(("pushed", ProposerStatus.FAILED, "%s on %s: %s" % (type(e).__name__, cmd, e)))
+
+
+class ProposerProcess(object):
+    """
+    Proxy to a proposer running in a worker process, with the same interface as :class:`AbstractProposer`.
+
+    ``counter`` and ``status`` are kept locally (and forwarded), so only :func:`get`, :func:`get_batch`,
+    :func:`is_prefetch_stale`, :func:`save` and :func:`reload` wait for the worker.
+    The status is updated from the messages pushed by the worker (see :func:`_drain`) before each call.
+
+    :param config: experiment configuration
+    :type config: BasicConfig
+    :param history: previous jobs to warm start the proposer with
+    :type history: [(dict, float)]
+    """
+
+    def __init__(self, config, history=None):
+        set_default_keyvalue("prefetch", 1, config["proposer_process"], log=logger)
+        self.prefetch = int(config["proposer_process"]["prefetch"])
+        self.current_proposal = dict()
+        self.counter = 0
+        self.nSamples = 0
+        self.status = ProposerStatus.RUNNING
+        self.lock = threading.RLock()  # one request at a time on the pipe
+
+        ctx = multiprocessing.get_context("spawn")  # the experiment already runs threads
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_serve, daemon=True,
+                                   args=(child_conn, config["proposer"], dict(config), self.prefetch, history))
+        self.process.start()
+        child_conn.close()
+        self._recv()
+        logger.info("Proposer %s runs in process %d", config["proposer"], self.process.pid)
+
+    def _send(self, *msg):
+        with self.lock:
+            self._drain()
+            self.conn.send(msg)
+
+    def _request(self, *msg):
+        with self.lock:
+            self._drain()
+            self.conn.send(msg)
+            return self._recv()
+
+    def _drain(self):
+        """
+        Read the messages pushed by the worker for the requests sent without waiting, e.g. failures of ``update``
+        """
+        with self.lock:
+            try:
+                while not self.conn.closed and self.conn.poll(0):
+                    self._pushed(self.conn.recv())
+            except (EOFError, OSError):
+                self.status = ProposerStatus.FAILED
+
+    def _pushed(self, msg):
+        _, status, error = msg
+        if error is not None:
+            logger.fatal("Proposer process failed: %s", error)
+        self.status = status
+
+    def _recv(self):
+        try:
+            reply = self.conn.recv()
+            while reply[0] == "pushed":
+                self._pushed(reply)
+                reply = self.conn.recv()
+        except EOFError:
+            self.status = ProposerStatus.FAILED
+            raise RuntimeError("Proposer process exited unexpectedly")
+        if reply[0] == "unsupported":
+            raise NotImplementedError(reply[1])
+        if reply[0] == "error":
+            self.status = ProposerStatus.FAILED
+            raise RuntimeError("Proposer process failed: %s" % reply[1])
+        state = reply[1]
+        self.status = state["status"]
+        self.counter = state["counter"]
+        self.nSamples = state["nSamples"]
+        return reply[2:]
+
+    def set_status(self, status):
+        self.status = status
+        self._send("set_status", status)
+
+    def get_status(self):
+        self._drain()
+        return self.status
+
+    def increment_job_counter(self):
+        self.counter += 1
+        self._send("increment")
+
+    def check_termination(self):
+        self._drain()
+        if self.counter >= self.nSamples and self.status == ProposerStatus.RUNNING:
+            self.status = ProposerStatus.FINISHED
+
+    def get_remaining_jobs(self):
+        return self.nSamples - self.counter
+
+    def reset(self):
+        self.counter = 0
+        self.status = ProposerStatus.RUNNING
+        self._send("reset")
+
+    def get(self, **kwargs):
+        """
+        Get one proposal from the worker, see :func:`AbstractProposer.get`.
+
+        :return: parameter values
+        :rtype: dict
+        """
+        batch = self.get_batch(1)
+        self.current_proposal = batch[0] if batch else dict()
+        if not self.current_proposal:
+            return None
+        return self.current_proposal.copy()
+
+    def get_batch(self, n, **kwargs):
+        """
+        Get up to ``n`` proposals from the worker, see :func:`AbstractProposer.get_batch`.
+
+        :param n: maximal number of proposals
+        :type n: int
+        :return: list of parameter values
+        :rtype: [dict]
+        """
+        self.check_termination()
+        if self.status != ProposerStatus.RUNNING:
+            return []
+        n = min(n, self.get_remaining_jobs())
+        if n <= 0:
+            return []
+        batch, = self._request("get", n)
+        if batch:
+            self.current_proposal = batch[-1]
+        return [proposal.copy() for proposal in batch]
+
+    def update(self, score, job):
+        """
+        Send the score to the worker, without waiting for the proposer to be updated.
+        If the update fails, the status is set to ``FAILED`` before the next call.
+
+        :param score: score returned by Job
+        :type score: float
+        :param job: Finished job
+        :type job: Job
+        """
+        self._send("update", score, job)
+
+    def failed(self, job):
+        """
+        Send the failed job to the worker, without waiting for the proposer to be updated.
+        If the update fails, the status is set to ``FAILED`` before the next call.
+
+        :param job: Failed job
+        :type job: Job
+        """
+        self._send("failed", job)
+
+    def is_prefetch_stale(self):
+        """
+        Ask the worker whether proposals are stale, its own prefetched proposals are then discarded as well.
+
+        :return: True if the unused proposals should be discarded
+        :rtype: bool
+        """
+        stale, = self._request("stale")
+        return stale
+
+    def discard(self, proposals):
+        self._send("discard", proposals)
+
+    def save(self, path):
+        self._request("save", path)
+
+    def reload(self, path):
+        self._request("reload", path)
+        return self
+
+    def close(self):
+        """
+        Stop the worker process
+        """
+        if self.process.is_alive():
+            try:
+                self._send("close")
+            except (OSError, ValueError):  # pragma: no cover
+                pass
+            self.process.join()
+        self.conn.close()
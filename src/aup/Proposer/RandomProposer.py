@@ -41,18 +41,20 @@ import logging
 from numpy import random
 from six.moves import input
 
-from .AbstractProposer import AbstractProposer
+from .AbstractProposer import AbstractProposer, point_key
 from ..utils import check_missing_key, set_default_keyvalue
 
 logger = logging.getLogger(__name__)
 
+MAX_RETRIES = 100  # to avoid previous jobs from warm start
+
 
 def _random_int(x):
     if len(x) != 2:
         msg = ("Range of random integer should have two elements, got %d" % len(x))
         logger.fatal(msg)
         raise ValueError(msg)
-    return lambda: random.randint(x[0], x[1] + 1)
+    return lambda rng: rng.randint(x[0], x[1] + 1)
 
 
 def _random_float(x):
@@ -60,7 +62,7 @@ def _random_float(x):
         msg = ("Range of random float should have two elements, got %d" % len(x))
         logger.fatal(msg)
         raise ValueError(msg)
-    return lambda: random.rand() * (x[1] - x[0]) + x[0]
+    return lambda rng: rng.rand() * (x[1] - x[0]) + x[0]
 
 
 def _random_choice(x):
@@ -68,7 +70,7 @@ def _random_choice(x):
         msg = "Range of random choice should have some elements, got nothing"
         logger.fatal(msg)
         raise ValueError(msg)
-    return lambda: x[random.choice(len(x))]
+    return lambda rng: x[rng.choice(len(x))]
 
 
 _random_fun = {
@@ -91,8 +93,8 @@ class RandomProposer(AbstractProposer):
         self.verify_config(config)
         self.nSamples = config["n_samples"]
         set_default_keyvalue("random_seed", random_seed, config, log=logger)
-        random.seed(config["random_seed"])
-        self.random_state = None  # for suspend and resume
+        self.rng = random.RandomState(config["random_seed"])  # saved with the proposer, for suspend and resume
+        self.known = set()  # previous jobs from warm start
         self.params_gen = {}
         for param in config["parameter_config"]:
             p = self.parse_param_config(param)
@@ -118,22 +120,24 @@ class RandomProposer(AbstractProposer):
         if 'params_gen' not in self.__dict__:
             return None
 
-        for i in self.params_gen:
-            self.current_proposal[i] = self.params_gen[i]()
+        for _ in range(MAX_RETRIES):
+            for i in self.params_gen:
+                self.current_proposal[i] = self.params_gen[i](self.rng)
+            if point_key(self.current_proposal) not in self.known:
+                break
         logger.debug(self.current_proposal)
         return self.current_proposal
 
-    def reload(self, path):
-        super(RandomProposer, self).reload(path)
-        random.set_state(self.random_state)
-        self.random_state = None
-        return self
-
-    def save(self, path):
-        if 'params_gen' in self.__dict__:
-            del self.params_gen
-        self.random_state = random.get_state()
-        super(RandomProposer, self).save(path)
+    def warm_start(self, history):
+        """
+        Previous jobs are not proposed again (for ``int`` and ``choice`` hyperparameters)
+        """
+        self.known.update(point_key(point) for point, _ in self.map_history(history))
+
+    def __getstate__(self):
+        state = super(RandomProposer, self).__getstate__()
+        state.pop('params_gen', None)  # rebuilt from the configuration, so the proposer keeps running after saving
+        return state
 
     def verify_config(self, config):
         check_missing_key(config, "n_samples", "Specify number of samples to randomly draw", log=logger)
@@ -37,13 +37,14 @@ APIs
 ----
 """
 import abc
+import copy
 import logging
 from ast import literal_eval
 from math import floor
 
 from six.moves import reduce, input
 
-from .AbstractProposer import AbstractProposer
+from .AbstractProposer import AbstractProposer, point_key
 from ..utils import check_missing_key, get_from_options
 
 ABC = abc.ABCMeta('ABC', (object,), {'__slots__': ()})
@@ -164,6 +165,8 @@ class SequenceProposer(AbstractProposer):
             p = super(SequenceProposer, self).parse_param_config(param)
             self.params_gen.append(_AbstractGen.get_gen(p))
         self.nSamples = reduce(lambda x, y: x * y, [i.len for i in self.params_gen])
+        self.position = -1  # index of current_proposal in the grid
+        self.skip = set()  # grid indices of previous jobs from warm start
 
     @staticmethod
     def setup_config():  # pragma: no cover
@@ -197,11 +200,33 @@ class SequenceProposer(AbstractProposer):
         return {"parameter_config": config}
 
     def get_param(self, **kwargs):
-        if self.counter == 0:
+        self._next_point()
+        while self.position in self.skip:
+            self._next_point()
+        logger.debug(self.current_proposal)
+        return self.current_proposal
+
+    def _next_point(self):
+        if self.counter == 0 and not self.current_proposal:  # first element, also within the first batch
             self.current_proposal[self.params_gen[0].name], next_flag = self.params_gen[0].get(next_flag=False)
         else:
             self.current_proposal[self.params_gen[0].name], next_flag = self.params_gen[0].get(next_flag=True)
         for i in self.params_gen[1:]:
             self.current_proposal[i.name], next_flag = i.get(next_flag=next_flag)
-        logger.debug(self.current_proposal)
-        return self.current_proposal
+        self.position += 1
+
+    def warm_start(self, history):
+        """
+        Grid points of previous jobs are skipped, and not counted in ``nSamples``
+        """
+        known = set(point_key(point) for point, _ in self.map_history(history))
+        gens = copy.deepcopy(self.params_gen)
+        point = {}
+        for position in range(reduce(lambda x, y: x * y, [i.len for i in gens])):
+            next_flag = position > 0
+            for i in gens:
+                point[i.name], next_flag = i.get(next_flag=next_flag)
+            if point_key(point) in known and position not in self.skip:
+                self.skip.add(position)
+                self.nSamples -= 1
+        logger.info("Skip %d grid points from previous jobs" % len(self.skip))
@@ -51,6 +51,7 @@ import logging
 import os
 import shutil
 
+import numpy as np
 from six.moves import input
 
 from .AbstractProposer import AbstractProposer
@@ -82,6 +83,7 @@ class SpearmintProposer(AbstractProposer):
         self.target = -1 if config["target"] == "max" else 1
         self.variables = []
         self.grid_size = config["grid_size"]
+        self.engine = config["engine"]
 
         for param in config["parameter_config"]:
             p = self.parse_param_config(param)
@@ -118,30 +120,82 @@ class SpearmintProposer(AbstractProposer):
         return config
 
     def get_param(self, **kwargs):
-        expt_grid = ExperimentGrid(self.expt_dir, self.variables, self.grid_size, self.seed)
-        grid, values, durations = expt_grid.get_grid()
-        candidates = expt_grid.get_candidates()
-        pending = expt_grid.get_pending()
-        complete = expt_grid.get_complete()
-
-        job_id = self.chooser.next(grid, values, durations, candidates, pending, complete)
-
-        if isinstance(job_id, tuple):
-            (job_id, candidate) = job_id
-            job_id = expt_grid.add_to_grid(candidate)
-
-        expt_grid.set_submitted(job_id, 0)
-        job_config = expt_grid.get_params(job_id)
-        for i in job_config:
-            if len(job_config[i]) == 1:  # spearmint returns list, other methods return value.
-                job_config[i] = job_config[i][0]
-            else:
-                raise NotImplementedError("Parameter with dimension larger than 1 is not supported yet")
-        job_config["job_id"] = job_id
-        expt_grid.set_running(job_id)
-        self.current_proposal = job_config
+        self.current_proposal = self.get_param_batch(1, **kwargs)[0]
         return self.current_proposal
 
+    def get_param_batch(self, n, **kwargs):
+        """
+        Propose ``n`` configurations from one load of the experiment grid.
+
+        Each proposal is marked as pending before the next one is chosen,
+        so the chooser accounts for it as it does for running jobs.
+        """
+        expt_grid = ExperimentGrid(self.expt_dir, self.variables, self.grid_size, self.seed)
+        batch = []
+        for _ in range(n):
+            grid, values, durations = expt_grid.get_grid()
+            candidates = expt_grid.get_candidates()
+            pending = expt_grid.get_pending()
+            complete = expt_grid.get_complete()
+
+            job_id = self.chooser.next(grid, values, durations, candidates, pending, complete)
+
+            if isinstance(job_id, tuple):
+                (job_id, candidate) = job_id
+                job_id = expt_grid.add_to_grid(candidate)
+
+            expt_grid.set_submitted(job_id, 0)
+            job_config = expt_grid.get_params(job_id)
+            for i in job_config:
+                if len(job_config[i]) == 1:  # spearmint returns list, other methods return value.
+                    job_config[i] = job_config[i][0]
+                else:
+                    raise NotImplementedError("Parameter with dimension larger than 1 is not supported yet")
+            job_config["job_id"] = job_id
+            expt_grid.set_running(job_id)
+            batch.append(job_config)
+        return batch
+
+    def warm_start(self, history):
+        """
+        Previous jobs are added to the grid as completed points.
+        """
+        points = self.map_history(history)
+        if not points:
+            return
+        expt_grid = ExperimentGrid(self.expt_dir, self.variables, self.grid_size, self.seed)
+        for point, score in points:
+            candidate = []
+            for variable in self.variables:  # inverse of GridMap.get_params
+                value = point[variable.name]
+                if variable.type == "int":
+                    low, high = int(variable.range[0]), int(variable.range[1])
+                    candidate.append((value - low + 0.5) / (high - low + 1))
+                elif variable.type == "float":
+                    low, high = float(variable.range[0]), float(variable.range[1])
+                    candidate.append((value - low) / (high - low) if high > low else 0.)
+                else:
+                    candidate.append((variable.range.index(value) + 0.5) / len(variable.range))
+            job_id = expt_grid.add_to_grid(np.array(candidate))
+            expt_grid.set_complete(job_id, score * self.target, 0)
+
+    def is_prefetch_stale(self):
+        """
+        Proposals are outdated by new results once the chooser fits them (from 2 completed points),
+        never for the random and sequential choosers.
+        """
+        if self.engine in ("RandomChooser", "SequentialChooser"):
+            return False
+        return len(ExperimentGrid(self.expt_dir).get_complete()) >= 2
+
+    def discard(self, proposals):
+        """
+        Mark the grid points of unused proposals as candidates again.
+        """
+        expt_grid = ExperimentGrid(self.expt_dir)
+        for proposal in proposals:
+            expt_grid.set_candidate(proposal["job_id"])
+
     def save(self, path):
         msg = "Save and restore not supported yet"
         logger.fatal(msg)
@@ -8,7 +8,7 @@ RestAPI server using Flask
 
 """
 
-from flask import render_template, jsonify, request
+from flask import render_template, jsonify, request, Response
 from flask_cors import CORS
 import connexion
 import click
@@ -29,6 +29,7 @@ from ..ET.Connector.SQLiteConnector import SQLiteConnector
 
 from ..EE.Experiment import Experiment
 from ..aup import BasicConfig
+from ..metrics import REGISTRY, CONTENT_TYPE
 from aup.Proposer import get_proposer
 
 from threading import Lock
@@ -609,6 +610,11 @@ def get_job_stats(eid):
         return jsonify({'finished': finished, 'unfinished': unfinished})
     return None
 
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    # experiments started from the dashboard run in this process, see :mod:`aup.metrics`
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
 @app.route('/api/current_db', methods=['GET'])
 def get_current_db():
     db_path = app.app.config['db_file']
@@ -41,7 +41,8 @@ logger = logging.getLogger("aup")
 @click.option("--test", is_flag=True, help="Test one case to verify the code is working")
 @click.option("--user", default=None, help="User name for job scheduling")
 @click.option("--aup_folder", default=None, help="Specify customized aup folder")
-@click.option("--resume", default="none", help="Resume from previous task")
+@click.option("--resume", default="none",
+              help="Resume from previous task: experiment ID to replay its journal, or file saved by the proposer")
 @click.option("--log", default="info", type=click.Choice(["debug", "info", "warn", "error"]), help="Log level")
 @click.option("--sleep", default=1, type=click.FLOAT, help="Sleep interval to sync updates")
 @click.option("--launch_dashboard", is_flag=True, help="Launch the dashboard together with the experiment.")
@@ -62,6 +63,9 @@ def main(experiment_file, test, user, aup_folder, resume, log, sleep, launch_das
         "username": get_default_username(user),
         "sleep_time": sleep,
     }
+    if resume.isdigit():  # restart the experiment from its journal, see aup.EE.Journal
+        config["eid"] = int(resume)
+        config["resume"] = True
 
     if not launch_dashboard and dashboard_port is not None:
         logger.fatal("dashbord_port value given without launch_dashboard flag given.")
@@ -105,6 +109,8 @@ def main(experiment_file, test, user, aup_folder, resume, log, sleep, launch_das
         e.add_suspend_signal()
         if resume == "none":
             e.start()
+        elif resume.isdigit():
+            e.resume()
         else:
             e.resume(resume)
     except Exception as exp:
@@ -21,6 +21,9 @@ import inspect
 import functools
 import os
 import shutil
+import socket
+import array
+import traceback
 
 logger = logging.getLogger("aup-minimal")
 
@@ -35,10 +38,17 @@ user_callback_fn = None
 user_args = []
 user_kwargs = {}
 
+# set by :mod:`aup.EE.Resource.utils.ForkServer` while importing a job script,
+# to collect the `aup_args` functions instead of running them
+_fork_targets = None
+
 def print_result(result):
     """Function to print the result for :func:`parse_result`.
     This function should be the last line of your training code
 
+    If ``AUP_RESULT_FD`` is set by the resource manager, the result is also sent as a JSON line over this file
+    descriptor, and the output of the job is not parsed.
+
     :param result: result from training code
     :type result: str
     """
@@ -46,6 +56,13 @@ def print_result(result):
         result = ','.join([str(r) for r in result])
     else:
         result = str(result).lstrip()  # avoid line break
+    fd = os.environ.get("AUP_RESULT_FD")
+    if fd is not None:
+        try:
+            # one write, not mixed with results of other threads
+            os.write(int(fd), (json.dumps({"result": result}) + "\n").encode("utf-8"))
+        except (OSError, ValueError):
+            logger.warning("Failed to send the result over AUP_RESULT_FD=%s", fd)
     # force flush to get intermediate results in real time
     print("\n#Auptimizer:%s" % result, file=sys.stderr, flush=True)
 
@@ -55,6 +72,7 @@ class BasicConfig(dict):
     User-friendly :class:`dict` supports:
 
     * load and save for json/pickle format (.json/.pkl)
+    * load json from the standard input (``-``) or an inherited file descriptor (``/dev/fd/<n>``)
     * easy key/value access as config.key or config["key"]
     * compatible with :class:`dict`
 
@@ -64,14 +82,17 @@ class BasicConfig(dict):
     def load(self, filename):
         """Load config parameters from JSON/pickle file
 
-        :param filename: file name ends with [.json|.pkl]
+        :param filename: file name ends with [.json|.pkl], or ``-``/``/dev/fd/<n>`` for JSON sent by the resource manager
         :type filename: string
         :return: configuration parsed from file
         :rtype: aup.BasicConfig
         """
-        name = "_load_" + BasicConfig._get_format(filename)
-        func = getattr(self, name)
-        data = func(filename)
+        if BasicConfig.is_stream(filename):
+            data = BasicConfig._load_stream(filename)
+        else:
+            name = "_load_" + BasicConfig._get_format(filename)
+            func = getattr(self, name)
+            data = func(filename)
         if type(data) is not dict:
             raise TypeError("Config must be dict")
         self.update(data)
@@ -90,6 +111,22 @@ class BasicConfig(dict):
         func(filename)
         logger.debug("Config saved to %s" % filename)
 
+    @staticmethod
+    def is_stream(filename):
+        """
+        :return: True if the configuration is read from the standard input or an inherited file descriptor
+        :rtype: bool
+        """
+        return filename == "-" or filename.startswith("/dev/fd/")
+
+    @staticmethod
+    def _load_stream(filename):
+        if filename == "-":
+            return json.load(sys.stdin)
+        # read once, the descriptor is closed after
+        with os.fdopen(int(filename[len("/dev/fd/"):]), 'r') as f:
+            return json.load(f)
+
     @staticmethod
     def _get_format(filename):
         name = filename.split(".")[-1].lower()
@@ -173,6 +210,13 @@ def aup_args(func):
         frm = inspect.stack()[1]
         # get module from stack
         mod = inspect.getmodule(frm[0])
+        if _fork_targets is not None:
+            # the fork server runs it later, in a forked process for each job
+            _fork_targets.append(functools.partial(run, mod, **kwargs))
+            return
+        run(mod, filename, **kwargs)
+
+    def run(mod, filename, **kwargs):
         # get functions that contain "init" in name and call them
         functions_list = inspect.getmembers(sys.modules[mod.__name__], inspect.isfunction)
         functions_list = sorted(list(filter(lambda x: "init" in x[0], functions_list)))
@@ -260,4 +304,88 @@ def aup_save_model(callback_fn, *args, **kwargs):
 
     user_callback_fn = callback_fn
     user_args = args
-    user_kwargs = kwargs
\ No newline at end of file
+    user_kwargs = kwargs
+
+
+def _worker_send(sock, message):
+    sock.sendall(json.dumps(message).encode("utf-8"))
+
+
+def _worker_recv(sock):
+    # as :func:`aup.EE.Resource.utils.ForkServer.recv_message`, this file does not import the package
+    fds = array.array("i")
+    data, ancdata, _, _ = sock.recvmsg(1024 * 1024, socket.CMSG_LEN(2 * fds.itemsize))
+    for level, kind, cmsg_data in ancdata:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(cmsg_data[:len(cmsg_data) - (len(cmsg_data) % fds.itemsize)])
+    if not data:
+        return None, list(fds)
+    return json.loads(data.decode("utf-8")), list(fds)
+
+
+def aup_worker(trial, setup=None):
+    """Run the trials of a script, keeping what `setup` loads (frameworks, datasets, pretrained models) across trials.
+
+    Call it at the end of the script, in place of a decorated function::
+
+      def setup():
+          global data
+          data = load_data()
+
+      def trial(config):
+          return train(data, config.lr)
+
+      aup_worker(trial, setup)
+
+    Run as a normal job, it calls `setup` and `trial` once with the configuration file given as the first argument.
+    Started as a warm worker by the resource manager (see :mod:`aup.EE.Resource.utils.WarmWorker`), it calls `setup`
+    once, then `trial` for each job sent to it; the output of each trial goes to its job.
+
+    :param trial: computes the optimization target from a job configuration
+    :type trial: function object
+    :param setup: called once before the trials
+    :type setup: function object
+    """
+    fd = os.environ.pop("AUP_WORKER_FD", None)
+    if fd is None:
+        config = BasicConfig().load(sys.argv[1])
+        if setup is not None:
+            setup()
+        print_result(trial(config))
+        return
+
+    sock = socket.socket(fileno=int(fd))
+    if setup is not None:
+        setup()
+    _worker_send(sock, {"ready": True})
+    saved = os.dup(1), os.dup(2)
+    while True:
+        message, fds = _worker_recv(sock)
+        if message is None:
+            break
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(fds[0], 1)
+        os.dup2(fds[0], 2)
+        os.close(fds[0])
+        if len(fds) > 1:
+            os.environ["AUP_RESULT_FD"] = str(fds[1])
+        code = 0
+        try:
+            if message.get("data") is not None:
+                config = BasicConfig(**json.loads(message["data"]))
+            else:
+                config = BasicConfig().load(message["config"])
+            print_result(trial(config))
+        except Exception:
+            traceback.print_exc()
+            code = 1
+        sys.stdout.flush()
+        sys.stderr.flush()
+        # before the end of the output, which ends the job
+        _worker_send(sock, {"done": code})
+        if len(fds) > 1:
+            del os.environ["AUP_RESULT_FD"]
+            os.close(fds[1])
+        os.dup2(saved[0], 1)
+        os.dup2(saved[1], 2)
@@ -0,0 +1,371 @@
+"""
+..
+  Copyright (c) 2018 LG Electronics Inc.
+  SPDX-License-Identifier: GPL-3.0-or-later
+
+Benchmark the framework overhead
+================================
+
+:mod:`aup.benchmark` runs experiments end-to-end with trivial job scripts, to measure the time spent by
+**Auptimizer** itself for each job (proposer, database, job dispatch) rather than by the jobs::
+
+  python -m aup.benchmark --output benchmark.json
+
+Each combination of proposer, resource manager (``cpu`` or ``passive``) and script is run in a temporary
+folder with its own database.  The scripts do not import ``aup``, so the Python start up is the only cost of a job:
+
+* ``noop``: print the result and exit,
+* ``interm``: print ``--steps`` intermediate results, which are tracked in the database,
+* ``jitter``: sleep up to ``--jitter`` seconds before printing the result.
+
+For ``passive``, the results are typed in automatically instead of by the user.
+
+The report gives for each run:
+
+* ``jobs_per_second``: finished jobs divided by the time from :func:`Experiment.start` to the last result,
+* ``dispatch_latency``: percentiles (in seconds) of the time from a free slot (start of the experiment,
+  or result of a job) to the start of the next job,
+* ``db_calls_per_job`` and ``db_writes_per_job``: calls of the database connector for each job,
+* ``metrics``: count and mean time of the metrics in :mod:`aup.metrics` during the run.
+
+The JSON output also contains the version, host and options of the benchmark, to track regressions over time.
+
+Additional arguments
+--------------------
+
+.. program-output:: python3 -m aup.benchmark -h
+
+"""
+import contextlib
+import gc
+import json
+import logging
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+
+import click
+import coloredlogs
+import numpy as np
+from six.moves.configparser import ConfigParser
+
+from . import Experiment, BasicConfig, __version__
+from .EE.Resource import PassiveResourceManager  # module, see :func:`_passive_results`
+from .metrics import REGISTRY, SQLITE_CALL
+from .setupdb import sqlite
+from .utils import LOG_LEVEL
+
+logger = logging.getLogger("aup.benchmark")
+
+PROPOSERS = ("random", "sequence", "hyperopt", "spearmint", "hyperband", "bohb")
+RESOURCES = ("cpu", "passive")
+PERCENTILES = (50, 90, 99)
+READ_CALLS = ("get_", "is_", "maybe_")  # prefixes of the connector calls without writes
+
+_SCRIPT_HEAD = """#!%s
+import json
+import random
+import sys
+import time
+
+config = json.load(open(sys.argv[1]))
+"""
+
+SCRIPTS = {
+    "noop": """print("#Auptimizer:%%f" %% config["x"])
+""",
+    "interm": """for i in range(%(steps)d):
+    print("#Auptimizer:%%f" %% (config["x"] * (i + 1) / %(steps)d), flush=True)
+""",
+    "jitter": """time.sleep(random.uniform(0, %(jitter)f))
+print("#Auptimizer:%%f" %% config["x"])
+""",
+}
+
+
+def write_script(workdir, name, steps=10, jitter=0.1):
+    """
+    Write a trivial job script
+
+    :param workdir: folder of the script
+    :type workdir: str
+    :param name: one of noop, interm, jitter
+    :type name: str
+    :param steps: number of intermediate results for interm
+    :type steps: int
+    :param jitter: max sleep time in seconds for jitter
+    :type jitter: float
+    :return: script file name
+    :rtype: str
+    """
+    filename = "%s.py" % name
+    with open(os.path.join(workdir, filename), "w") as f:
+        f.write(_SCRIPT_HEAD % sys.executable)
+        f.write(SCRIPTS[name] % {"steps": steps, "jitter": jitter})
+    os.chmod(os.path.join(workdir, filename), 0o755)
+    return filename
+
+
+def proposer_config(proposer, n_samples):
+    """
+    :param proposer: proposer name
+    :type proposer: str
+    :param n_samples: number of jobs (hyperband and bohb decide on their own, close to it)
+    :type n_samples: int
+    :return: proposer part of the experiment configuration
+    :rtype: dict
+    """
+    param = {"name": "x", "range": [0, 1], "type": "float"}
+    if proposer == "sequence":
+        param["n"] = n_samples
+        return {"parameter_config": [param]}
+    if proposer == "hyperband":
+        return {"parameter_config": [param], "max_iter": 9, "eta": 3}
+    if proposer == "bohb":
+        return {"parameter_config": [param], "n_iterations": max(1, n_samples // 13),
+                "min_budget": 1, "max_budget": 9, "eta": 3}
+    if proposer == "spearmint":
+        param["size"] = 1
+    return {"parameter_config": [param], "n_samples": n_samples, "random_seed": 0}
+
+
+def create_environment(folder, n_parallel):
+    """
+    Create an aup environment with a new database, see :mod:`aup.setupdb.sqlite`
+
+    :param folder: folder of the environment
+    :type folder: str
+    :param n_parallel: number of cpu resources
+    :type n_parallel: int
+    :return: aup folder
+    :rtype: str
+    """
+    auppath = os.path.join(folder, ".aup")
+    os.makedirs(auppath)
+    config = ConfigParser()
+    config.optionxform = str
+    config.add_section("Auptimizer")
+    config.set("Auptimizer", "Auptimizer_PATH", auppath)
+    config.set("Auptimizer", "SQL_ENGINE", "sqlite")
+    config.set("Auptimizer", "SQLITE_FILE", os.path.join(auppath, "sqlite3.db"))
+    with open(os.path.join(auppath, "env.ini"), "w") as f:
+        config.write(f)
+    sqlite.create_database(config, ["benchmark"], n_parallel, "localhost")
+    return auppath
+
+
+class DispatchTimer(object):
+    """
+    Follow an experiment to measure the time from a free slot to the start of the next job
+
+    :param experiment: experiment, not started yet
+    :type experiment: Experiment
+    :param n_parallel: number of free slots at start
+    :type n_parallel: int
+    """
+
+    def __init__(self, experiment, n_parallel):
+        self.lock = threading.Lock()
+        self.free = deque()  # times of the free slots
+        self.latencies = []
+        self.finished = 0
+        self.last_result = None
+        self.n_parallel = n_parallel
+        self.update = experiment.update
+        self.run_job = experiment.resource_manager.run_job
+        experiment.update = self._update
+        experiment.resource_manager.run_job = self._run_job
+
+    def start(self):
+        with self.lock:
+            self.free.extend([time.perf_counter()] * self.n_parallel)
+
+    def _update(self, score, jid):
+        with self.lock:
+            self.last_result = time.perf_counter()
+            self.free.append(self.last_result)
+            if score not in ("ERROR", "EARLY STOPPED"):
+                self.finished += 1
+        return self.update(score, jid)
+
+    def _run_job(self, *args, **kwargs):
+        with self.lock:
+            if self.free:
+                self.latencies.append(time.perf_counter() - self.free.popleft())
+        return self.run_job(*args, **kwargs)
+
+
+def _snapshot():
+    return {name: metric.totals() for name, metric in REGISTRY.metrics.items() if metric.type == "histogram"}
+
+
+def _difference(before, after):
+    """
+    :return: count and total time of each metric and labels used between both snapshots
+    :rtype: {str: {tuple: (int, float)}}
+    """
+    result = dict()
+    for name, totals in after.items():
+        for key, (count, total) in totals.items():
+            count0, total0 = before.get(name, {}).get(key, (0, 0.))
+            if count > count0:
+                result.setdefault(name, {})[key] = (count - count0, total - total0)
+    return result
+
+
+@contextlib.contextmanager
+def _passive_results():
+    """
+    Type in random results for :class:`PassiveResourceManager`, instead of the user
+    """
+    original = PassiveResourceManager.input
+    PassiveResourceManager.input = lambda prompt: str(np.random.rand())
+    try:
+        yield
+    finally:
+        PassiveResourceManager.input = original
+
+
+def run_benchmark(proposer, resource, script, folder, n_samples=20, n_parallel=4, steps=10, jitter=0.1,
+                  sleep_time=0.1):
+    """
+    Run one experiment and measure the framework overhead
+
+    :param proposer: proposer name
+    :type proposer: str
+    :param resource: cpu or passive
+    :type resource: str
+    :param script: one of noop, interm, jitter
+    :type script: str
+    :param folder: empty folder for the environment, database and jobs
+    :type folder: str
+    :param n_samples: number of jobs
+    :type n_samples: int
+    :param n_parallel: number of parallel jobs (1 for passive)
+    :type n_parallel: int
+    :param steps: number of intermediate results for interm
+    :type steps: int
+    :param jitter: max sleep time in seconds for jitter
+    :type jitter: float
+    :param sleep_time: ``sleep_time`` of the experiment
+    :type sleep_time: float
+    :return: measures of the run
+    :rtype: dict
+    """
+    n_parallel = 1 if resource == "passive" else n_parallel
+    auppath = create_environment(folder, n_parallel)
+    exp_config = {
+        "name": "benchmark_%s_%s_%s" % (proposer, resource, script),
+        "proposer": proposer,
+        "script": write_script(folder, script, steps=steps, jitter=jitter),
+        "workingdir": folder,
+        "resource": resource,
+        "n_parallel": n_parallel,
+        "target": "max",
+        "resource_args": {"track_intermediate_results": script == "interm"},
+    }
+    exp_config.update(proposer_config(proposer, n_samples))
+
+    cwd = os.getcwd()
+    os.chdir(folder)  # the proposer is saved in the current folder
+    try:
+        with _passive_results():
+            experiment = Experiment(BasicConfig(**exp_config), username="benchmark", auppath=auppath,
+                                    sleep_time=sleep_time, request_stop_time=sleep_time)
+            timer = DispatchTimer(experiment, n_parallel)
+            before = _snapshot()
+            start = time.perf_counter()
+            timer.start()
+            experiment.start()
+            experiment.finish()
+            total = time.perf_counter() - start
+            after = _snapshot()
+            latencies, finished, last_result = timer.latencies, timer.finished, timer.last_result
+            # the spearmint chooser saves its state in the folder when deleted
+            del experiment, timer
+            gc.collect()
+    finally:
+        os.chdir(cwd)
+
+    used = _difference(before, after)
+    calls = {dict(key)["call"]: count for key, (count, _) in used.get(SQLITE_CALL.name, {}).items()}
+    n_jobs = len(latencies)
+    elapsed = (last_result or start + total) - start
+    return {
+        "proposer": proposer,
+        "resource": resource,
+        "script": script,
+        "n_parallel": n_parallel,
+        "jobs": n_jobs,
+        "finished_jobs": finished,
+        "seconds": total,
+        "jobs_per_second": finished / elapsed if elapsed > 0 else 0.,
+        "dispatch_latency": {"p%d" % p: float(np.percentile(latencies or [0.], p)) for p in PERCENTILES},
+        "db_calls_per_job": sum(calls.values()) / max(1, n_jobs),
+        "db_writes_per_job": sum(c for call, c in calls.items() if not call.startswith(READ_CALLS)) / max(1, n_jobs),
+        "metrics": {name + "".join("{%s=%s}" % label for label in key): {"count": count, "mean": seconds / count}
+                    for name, totals in sorted(used.items()) for key, (count, seconds) in sorted(totals.items())},
+    }
+
+
+@click.command(name="Auptimizer benchmark", context_settings=dict(help_option_names=['-h', '--help']))
+@click.option("--proposer", "proposers", multiple=True, type=click.Choice(PROPOSERS),
+              help="Proposers to run, all by default")
+@click.option("--resource", "resources", multiple=True, type=click.Choice(RESOURCES),
+              help="Resource managers to run, all by default")
+@click.option("--script", "scripts", multiple=True, type=click.Choice(sorted(SCRIPTS)),
+              help="Job scripts to run, all by default")
+@click.option("--n_samples", default=20, type=click.INT, help="Number of jobs of each experiment")
+@click.option("--n_parallel", default=4, type=click.INT, help="Number of parallel jobs for cpu")
+@click.option("--steps", default=10, type=click.INT, help="Number of intermediate results of the interm script")
+@click.option("--jitter", default=0.1, type=click.FLOAT, help="Max sleep time of the jitter script, in seconds")
+@click.option("--sleep", default=0.1, type=click.FLOAT, help="Sleep interval of the experiments")
+@click.option("--output", default=None, type=click.Path(), help="JSON file for the results")
+@click.option("--log", default="warn", type=click.Choice(["debug", "info", "warn", "error"]), help="Log level")
+def main(proposers, resources, scripts, n_samples, n_parallel, steps, jitter, sleep, output, log):
+    """Measure the overhead of Auptimizer for each job, with trivial job scripts
+    """
+    coloredlogs.install(level=LOG_LEVEL[log],
+                        fmt="%(asctime)-15s - %(name)s - %(levelname)s - %(message)s")
+    options = {"n_samples": n_samples, "n_parallel": n_parallel, "steps": steps, "jitter": jitter,
+               "sleep_time": sleep}
+    runs = []
+    for proposer in proposers or PROPOSERS:
+        for resource in resources or RESOURCES:
+            for script in scripts or sorted(SCRIPTS):
+                folder = tempfile.mkdtemp(prefix="aup_benchmark_")
+                try:
+                    run = run_benchmark(proposer, resource, script, folder, **options)
+                except Exception as e:
+                    logger.fatal("Benchmark of %s with %s and %s failed: %s" % (proposer, resource, script, e))
+                    run = {"proposer": proposer, "resource": resource, "script": script, "error": str(e)}
+                finally:
+                    shutil.rmtree(folder, ignore_errors=True)
+                runs.append(run)
+                if "error" not in run:
+                    print("%-10s %-8s %-7s %4d jobs %8.2f jobs/s  dispatch p50 %.4fs p99 %.4fs  %5.1f db calls/job" %
+                          (proposer, resource, script, run["jobs"], run["jobs_per_second"],
+                           run["dispatch_latency"]["p50"], run["dispatch_latency"]["p99"], run["db_calls_per_job"]))
+
+    report = {
+        "version": __version__,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "options": options,
+        "runs": runs,
+    }
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+        logger.info("Benchmark results saved in %s" % output)
+
+
+if __name__ == "__main__":
+    main()
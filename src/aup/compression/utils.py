@@ -119,7 +119,7 @@ def run_non_automatic_experiment(exp_config, aup_folder, user=None, eid=None, st
     request_stop_thr = threading.Thread(target=_check_status)
     request_stop_thr.start()
 
-    rid = resource_manager.get_available(user, exp_config["resource"])
+    rid = resource_manager.take_available(user, exp_config["resource"])
     if rid is None:
         logger.warning("Not enough resources to run compression")
         return eid
@@ -157,8 +157,8 @@ def run_non_automatic_experiment(exp_config, aup_folder, user=None, eid=None, st
         resource_manager.refresh()
     signal.signal(signal.SIGUSR1, lambda x, y: _force_refresh(x, y))
     
-    job.jid = resource_manager.connector.job_started(eid, rid, job_config)
-    resource_manager.run_job(job, rid, exp_config, update, **runtime_args)
+    job.jid = resource_manager.connector.start_job(eid, rid, job_config)
+    resource_manager.run_job(job, rid, exp_config, update, taken=True, **runtime_args)
 
     def _finish_callback():
         nonlocal finished
@@ -0,0 +1,337 @@
+"""
+..
+  Copyright (c) 2018 LG Electronics Inc.
+  SPDX-License-Identifier: GPL-3.0-or-later
+
+aup.metrics
+===========
+
+Counters and histograms of the time spent in the hot paths of an experiment, in the Prometheus text format.
+
+The following metrics are collected in :data:`REGISTRY`:
+
+================================ =========================================================================
+Name                             Content
+================================ =========================================================================
+aup_proposer_get_seconds         time to get new proposals (``call``: get, get_batch)
+aup_proposer_update_seconds      time to update the proposer with a result
+aup_sqlite_call_seconds          time of the SQLite connector calls, including the lock wait (``call``)
+aup_sqlite_retries_total         retries of the SQLite connector calls (``call``)
+aup_job_queue_seconds            time from the proposal of a job to the start of its process
+aup_job_runtime_seconds          running time of the job processes
+aup_result_parse_seconds         time to parse and save a result line of a job
+aup_early_stop_tick_seconds      time of one pass of the early stopping daemon
+================================ =========================================================================
+
+They are exposed, if ``metrics`` is set in the experiment configuration::
+
+  "metrics": {
+    "port": null,
+    "host": "127.0.0.1",
+    "log_interval": 60
+  }
+
+at ``http://<host>:<port>/metrics`` for Prometheus if ``port`` is set (0 for any free port),
+and in the log every ``log_interval`` seconds (0 to disable).
+The dashboard server (:mod:`aup.RestAPI.server`) also serves them at ``/metrics``.
+
+APIs
+----
+"""
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+from .utils import set_default_keyvalue
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 60, 300, 1800, 3600)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    items = list(key) + list(extra)
+    if not items:
+        return ""
+    return "{%s}" % ",".join('%s="%s"' % (k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in items)
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter(object):
+    """
+    Counter, e.g. of retries
+
+    :param name: metric name
+    :type name: str
+    :param documentation: help text
+    :type documentation: str
+    """
+    type = "counter"
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self.values = dict()  # labels -> count
+        self.lock = threading.Lock()
+
+    def inc(self, value=1, **labels):
+        key = _labels_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def get(self, **labels):
+        with self.lock:
+            return self.values.get(_labels_key(labels), 0)
+
+    def samples(self):
+        """
+        :return: lines of the metric in the Prometheus text format
+        :rtype: [str]
+        """
+        with self.lock:
+            values = sorted(self.values.items())
+        return ["%s%s %s" % (self.name, _format_labels(key), _format_value(value)) for key, value in values]
+
+    def summary(self):
+        with self.lock:
+            total = sum(self.values.values())
+        return "%s=%s" % (self.name, _format_value(total)) if total else None
+
+
+class _Timer(object):
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+class Histogram(object):
+    """
+    Histogram of durations, in seconds
+
+    :param name: metric name
+    :type name: str
+    :param documentation: help text
+    :type documentation: str
+    :param buckets: upper bounds of the buckets
+    :type buckets: [float]
+    """
+    type = "histogram"
+
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self.values = dict()  # labels -> [bucket counts, sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _labels_key(labels)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * len(self.buckets), 0., 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def time(self, **labels):
+        """
+        Measure the duration of a ``with`` block::
+
+          with histogram.time(call="get"):
+              ...
+        """
+        return _Timer(self, labels)
+
+    def count(self, **labels):
+        with self.lock:
+            entry = self.values.get(_labels_key(labels))
+            return entry[2] if entry is not None else 0
+
+    def totals(self):
+        """
+        :return: count and sum of the observations, by labels
+        :rtype: {tuple: (int, float)}
+        """
+        with self.lock:
+            return {key: (entry[2], entry[1]) for key, entry in self.values.items()}
+
+    def samples(self):
+        with self.lock:
+            values = sorted((key, ([c for c in entry[0]], entry[1], entry[2])) for key, entry in self.values.items())
+        lines = []
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, c in zip(self.buckets, counts):
+                cumulative += c
+                lines.append("%s_bucket%s %d" % (self.name, _format_labels(key, [("le", _format_value(float(bound)))]),
+                                                 cumulative))
+            lines.append("%s_sum%s %s" % (self.name, _format_labels(key), repr(total)))
+            lines.append("%s_count%s %d" % (self.name, _format_labels(key), count))
+        return lines
+
+    def summary(self):
+        with self.lock:
+            count = sum(entry[2] for entry in self.values.values())
+            total = sum(entry[1] for entry in self.values.values())
+        if not count:
+            return None
+        return "%s=%d/%.4fs" % (self.name, count, total / count)
+
+
+class Registry(object):
+    """
+    Collection of metrics, created once by name
+    """
+
+    def __init__(self):
+        self.metrics = dict()
+        self.lock = threading.Lock()
+
+    def _get(self, cls, name, documentation, **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, documentation, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError("Metric %s is already a %s" % (name, metric.type))
+        return metric
+
+    def counter(self, name, documentation):
+        """
+        :return: counter of the given name, created if needed
+        :rtype: Counter
+        """
+        return self._get(Counter, name, documentation)
+
+    def histogram(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        """
+        :return: histogram of the given name, created if needed
+        :rtype: Histogram
+        """
+        return self._get(Histogram, name, documentation, buckets=buckets)
+
+    def render(self):
+        """
+        :return: all metrics in the Prometheus text format
+        :rtype: str
+        """
+        with self.lock:
+            metrics = sorted(self.metrics.items())
+        lines = []
+        for name, metric in metrics:
+            lines.append("# HELP %s %s" % (name, metric.documentation))
+            lines.append("# TYPE %s %s" % (name, metric.type))
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """
+        :return: one line with the count and mean time (or total count) of the used metrics
+        :rtype: str
+        """
+        with self.lock:
+            metrics = sorted(self.metrics.items())
+        return " ".join(s for s in (metric.summary() for _, metric in metrics) if s is not None)
+
+
+REGISTRY = Registry()
+
+PROPOSER_GET = REGISTRY.histogram("aup_proposer_get_seconds", "Time to get new proposals from the proposer")
+PROPOSER_UPDATE = REGISTRY.histogram("aup_proposer_update_seconds", "Time to update the proposer with a result")
+SQLITE_CALL = REGISTRY.histogram("aup_sqlite_call_seconds", "Time of SQLite connector calls, including the lock wait")
+SQLITE_RETRIES = REGISTRY.counter("aup_sqlite_retries_total", "Retries of SQLite connector calls")
+JOB_QUEUE = REGISTRY.histogram("aup_job_queue_seconds", "Time from the proposal of a job to the start of its process")
+JOB_RUNTIME = REGISTRY.histogram("aup_job_runtime_seconds", "Running time of the job processes")
+RESULT_PARSE = REGISTRY.histogram("aup_result_parse_seconds", "Time to parse and save a result line of a job")
+EARLY_STOP_TICK = REGISTRY.histogram("aup_early_stop_tick_seconds", "Time of one pass of the early stopping daemon")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class MetricsExporter(object):
+    """
+    Serve the metrics over HTTP and log them periodically, as set by ``metrics`` in the experiment configuration
+
+    :param config: configuration of ``metrics``
+    :type config: dict
+    :param registry: metrics to export
+    :type registry: Registry
+    """
+
+    def __init__(self, config, registry=REGISTRY):
+        set_default_keyvalue("port", None, config, log=logger)
+        set_default_keyvalue("host", "127.0.0.1", config, log=logger)
+        set_default_keyvalue("log_interval", 60, config, log=logger)
+        self.registry = registry
+        self.log_interval = config["log_interval"]
+        self.server = None
+        self.port = None
+        self.closed = threading.Event()
+
+        if config["port"] is not None:
+            handler = type("Handler", (_Handler,), {"registry": registry})
+            self.server = _Server((config["host"], int(config["port"])), handler)
+            self.port = self.server.server_address[1]
+            threading.Thread(target=self.server.serve_forever, daemon=True).start()
+            logger.info("Metrics at http://%s:%d/metrics" % (config["host"], self.port))
+        if self.log_interval:
+            threading.Thread(target=self._log_loop, daemon=True).start()
+
+    def _log_loop(self):
+        while not self.closed.wait(self.log_interval):
+            self.log()
+
+    def log(self):
+        summary = self.registry.summary()
+        if summary:
+            logger.info("Metrics: %s" % summary)
+
+    def close(self):
+        self.closed.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
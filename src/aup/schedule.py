@@ -0,0 +1,68 @@
+"""
+..
+  Copyright (c) 2018 LG Electronics Inc.
+  SPDX-License-Identifier: GPL-3.0-or-later
+
+Run several experiments together
+================================
+
+:mod:`aup.schedule` runs experiments in one process, sharing the resources by fair-share
+(see :mod:`aup.EE.Scheduler`)::
+
+  python -m aup.schedule <experiment configuration> [<experiment configuration> ...]
+
+Experiments wait for free resources instead of failing when all resources are busy.
+
+Additional arguments
+--------------------
+
+.. program-output:: python3 -m aup.schedule -h
+
+"""
+import logging
+
+import click
+import coloredlogs
+
+from . import Experiment, BasicConfig
+from .EE.Scheduler import Scheduler
+from .utils import get_default_username
+
+_log_level = {"debug": logging.DEBUG, "info": logging.INFO, "warn": logging.WARN, "error": logging.ERROR}
+logger = logging.getLogger("aup")
+
+
+@click.command(name="Auptimizer scheduler", context_settings=dict(help_option_names=['-h', '--help']))
+@click.argument("experiment_files", nargs=-1, required=True, type=click.Path(exists=True))
+@click.option("--user", default=None, help="User name for job scheduling")
+@click.option("--aup_folder", default=None, help="Specify customized aup folder")
+@click.option("--log", default="info", type=click.Choice(["debug", "info", "warn", "error"]), help="Log level")
+@click.option("--sleep", default=1, type=click.FLOAT, help="Sleep interval to sync updates")
+def main(experiment_files, user, aup_folder, log, sleep):
+    """Run experiments sharing the same resources
+    \b\n
+    Arguments:
+        experiment_files {str} -- Experiment configurations, with optional `schedule` weight and priority.
+    """
+    coloredlogs.install(level=_log_level[log],
+                        fmt="%(asctime)-15s - %(name)s - %(levelname)s - %(message)s")
+    scheduler = Scheduler(sleep_time=sleep)
+    config = {
+        "username": get_default_username(user),
+        "sleep_time": sleep,
+        "scheduler": scheduler,
+    }
+    if aup_folder:
+        config["auppath"] = aup_folder
+    for experiment_file in experiment_files:
+        scheduler.add(Experiment(BasicConfig().load(experiment_file), **config))
+    try:
+        scheduler.join()
+    except KeyboardInterrupt:
+        logger.fatal("Stop scheduling at user's request, waiting for running jobs")
+        scheduler.stop()
+        scheduler.join()
+
+
+if __name__ == "__main__":
+    main()
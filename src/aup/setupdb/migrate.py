@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+"""
+..
+  Copyright (c) 2018 LG Electronics Inc.
+  SPDX-License-Identifier: GPL-3.0-or-later
+
+Upgrade database
+================
+
+Upgrade the database created by an older **Auptimizer** to the current schema (e.g. new indexes),
+**without** removing experiment history.
+It can run while experiments are using the database.
+
+Additional arguments
+--------------------
+
+.. program-output:: python3 -m aup.setupdb.migrate -h
+
+"""
+import click
+import coloredlogs
+from six.moves.configparser import ConfigParser
+
+from ..utils import LOG_LEVEL
+
+
+@click.command(name="Upgrade DB schema",
+               context_settings=dict(help_option_names=['-h', '--help']))
+@click.argument("env_file", type=click.Path(exists=True))
+@click.option("--timeout", default=30, type=click.FLOAT, help="time to wait for running experiments, in seconds")
+@click.option("--log", default="info", type=click.Choice(["debug", "info", "warn", "error"]), help="Log level")
+def main(env_file, timeout, log):
+    """Upgrade database defined in env.ini file, history remains.
+    \b\n
+    Copyright (C) 2018  LG Electronics Inc.
+    \b\n
+    GPL-3.0 License. This program comes with ABSOLUTELY NO WARRANTY;
+    \b\n
+    Arguments:
+        env_file {str}: Auptimizer environment file
+    """
+    coloredlogs.install(level=LOG_LEVEL[log], fmt="%(name)s - %(levelname)s - %(message)s")
+
+    config = ConfigParser()
+    config.read(env_file)
+
+    if config.get("Auptimizer", "SQL_ENGINE") == "sqlite":
+        from . import sqlite
+        sqlite.migrate(config, timeout=timeout)
+    else:
+        raise KeyError("%s is not implemented" % config.get("Auptimizer", "SQL_ENGINE"))
+
+
+if __name__ == "__main__":
+    main()
@@ -12,13 +12,19 @@ If needed, it can be used as
 
 .. program-output:: python3 -m aup.setupdb.sqlite -h
 
+The version of the schema is kept in ``PRAGMA user_version``.
+Databases created by an older version are upgraded in place by :func:`migrate`
+(see :mod:`aup.setupdb.migrate`), applying the statements of :data:`MIGRATIONS` after their version.
+
 APIs
 ----
 """
 import sqlite3
 import os
 import click
+import psutil
 import json
+import socket
 import logging
 import coloredlogs
 from ..utils import get_default_username, LOG_LEVEL
@@ -27,12 +33,105 @@ from six.moves.configparser import ConfigParser
 
 logger = logging.getLogger("aup.setupdb.sqlite")
 
+# statements (or functions of the cursor) upgrading the schema from version i to i+1,
+# safe to run on the tables created by create_database, which stay those of version 0
+MIGRATIONS = [
+    # indexes of the queries by experiment and job, multiple_result added in 1.5
+    ["""CREATE TABLE IF NOT EXISTS multiple_result
+        (mrid INTEGER PRIMARY KEY NOT NULL, label_order INTEGER, value REAL, receive_time INTEGER, \
+            jid INTEGER, irid INTEGER, eid INTEGER, is_last_result INTERGER,
+        FOREIGN KEY(jid) REFERENCES job(jid),
+        FOREIGN KEY(irid) REFERENCES intermediate_result(irid),
+        FOREIGN KEY(eid) REFERENCES experiment(eid));""",
+     "CREATE INDEX IF NOT EXISTS job_eid_idx ON job(eid, status, score);",
+     "CREATE INDEX IF NOT EXISTS intermediate_result_jid_idx ON intermediate_result(jid, num);",
+     "CREATE INDEX IF NOT EXISTS multiple_result_eid_idx ON multiple_result(eid, jid, label_order);",
+     "CREATE INDEX IF NOT EXISTS job_attempt_jid_idx ON job_attempt(jid, num);"],
+    # result cache, the column may be added already by SQLiteConnector.prepare_result_cache
+    [lambda cursor: _add_column(cursor, "job", "job_hash", "TEXT NULL"),
+     "CREATE INDEX IF NOT EXISTS job_hash_idx ON job(job_hash);"],
+    # owner of the placeholders of the write-behind connectors, see delete_placeholders
+    [lambda cursor: _add_column(cursor, "intermediate_result", "owner", "TEXT NULL")],
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
 
 def _create_connection(db_file):
     filename = os.path.expanduser(db_file)
     return sqlite3.connect(filename)
 
 
+def _add_column(cursor, table, column, definition):
+    if column not in [i[1] for i in cursor.execute("PRAGMA table_info(%s)" % table).fetchall()]:
+        cursor.execute("ALTER TABLE %s ADD COLUMN %s %s" % (table, column, definition))
+
+
+def _migrate(cursor, version):
+    for statements in MIGRATIONS[version:]:
+        for statement in statements:
+            if callable(statement):
+                statement(cursor)
+            else:
+                cursor.execute(statement)
+    cursor.execute("PRAGMA user_version = %d" % SCHEMA_VERSION)
+
+
+def placeholder_owner(pid=None):
+    """Owner of the placeholder rows of a process, see :func:`delete_placeholders`
+
+    :param pid: process ID, the current process by default
+    :type pid: int
+    :return: ``<host>:<process ID>:<process start time>``
+    :rtype: str
+    """
+    process = psutil.Process(pid)
+    return "%s:%d:%d" % (socket.gethostname(), process.pid, int(process.create_time()))
+
+
+def prepare_placeholders(cursor):
+    """Add the ``owner`` column of the placeholders to ``intermediate_result``, if the database is not migrated yet
+
+    :param cursor: cursor of the database
+    :type cursor: sqlite3.Cursor
+    """
+    _add_column(cursor, "intermediate_result", "owner", "TEXT NULL")
+
+
+def _exited(owner):
+    host, pid, start = owner.rsplit(":", 2)
+    if host != socket.gethostname():
+        raise ValueError("placeholder of another host")
+    try:
+        return int(psutil.Process(int(pid)).create_time()) != int(start)  # else the process ID is reused
+    except psutil.NoSuchProcess:
+        return True
+
+
+def delete_placeholders(cursor):
+    """Delete the placeholder rows of ``intermediate_result`` left by the connectors which did not close, e.g. after
+    a crash (see :mod:`aup.ET.Connector.SQLiteConnector`).
+
+    A placeholder keeps its owner (see :func:`placeholder_owner`), it is deleted once the owner process has exited.
+    The placeholders of other hosts sharing the database, or without owner, are kept.
+
+    :param cursor: cursor of the database, in a transaction
+    :type cursor: sqlite3.Cursor
+    :return: number of deleted rows
+    :rtype: int
+    """
+    prepare_placeholders(cursor)
+    cursor.execute("SELECT irid, owner FROM intermediate_result WHERE jid IS NULL AND owner IS NOT NULL")
+    stale = []
+    for irid, owner in cursor.fetchall():
+        try:
+            if _exited(owner):
+                stale.append((irid,))
+        except ValueError:  # can't be checked from this host
+            continue
+    cursor.executemany("DELETE FROM intermediate_result WHERE irid=? AND jid IS NULL", stale)
+    return len(stale)
+
+
 def _insert_resource(config, res_name, cursor, name, type):
     if not config.has_option("Auptimizer", res_name):
         return
@@ -109,6 +208,8 @@ def create_database(config, usernames, cpu, name):
         FOREIGN KEY(irid) REFERENCES intermediate_result(irid),
         FOREIGN KEY(eid) REFERENCES experiment(eid));""")
 
+    _migrate(c, 0)
+
     for username in usernames:
         # currently no specific limitation
         c.execute("INSERT INTO user (name, permission) VALUES (?,?)", (username, "all"))
@@ -144,6 +245,43 @@ def reset(config):
     conn.close()
 
 
+def migrate(config, timeout=30):
+    """Upgrade the schema of an existing database to :data:`SCHEMA_VERSION`, keeping its content.
+
+    The upgrade runs in one transaction, waiting for the experiments writing to the database.
+
+    :param config: contains ``SQLITE_FILE`` under ``Auptimizer`` section
+    :type config: configparser.ConfigParser
+    :param timeout: time to wait for the database locked by other connections, in seconds
+    :type timeout: float
+    :return: versions of the schema before and after the upgrade
+    :rtype: (int, int)
+    """
+    conn = sqlite3.connect(os.path.expanduser(config.get("Auptimizer", "SQLITE_FILE")), timeout=timeout,
+                           isolation_level=None)
+    c = conn.cursor()
+    try:
+        c.execute("BEGIN IMMEDIATE")
+        version = c.execute("PRAGMA user_version").fetchone()[0]
+        if version > SCHEMA_VERSION:
+            raise ValueError("Database version %d is newer than this Auptimizer (%d)" % (version, SCHEMA_VERSION))
+        if version < SCHEMA_VERSION:
+            _migrate(c, version)
+        delete_placeholders(c)
+        c.execute("COMMIT")
+    except BaseException:
+        if conn.in_transaction:
+            c.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    if version < SCHEMA_VERSION:
+        logger.info("SQLite3 Database is upgraded from version %d to %d" % (version, SCHEMA_VERSION))
+    else:
+        logger.info("SQLite3 Database is up to date (version %d)" % version)
+    return version, SCHEMA_VERSION
+
+
 @click.command(name="create Auptimizer database, prefer to use aup.setupdb.reset instead of calling this directly",
                context_settings=dict(help_option_names=['-h', '--help']))
 @click.argument("env_file", type=click.Path(exists=True))
@@ -16,6 +16,7 @@ from __future__ import print_function
 
 import sys
 
+import json
 import logging
 import os
 from os import path
@@ -64,11 +65,16 @@ def get_default_connector(auppath=DEFAULT_AUPTIMIZER_PATH, log=logger):
     if "SQL_ENGINE" not in config:
         raise KeyError("No SQL setup for SQL_ENGINE in %s"%auppath)
     elif config["SQL_ENGINE"] == "sqlite":
-        from .ET.Connector.SQLiteConnector import SQLiteConnector
+        from .ET.Connector.SQLiteConnector import BUSY_TIMEOUT, FLUSH_ROWS, SQLiteConnector
         if "SQLITE_FILE" not in config:
             raise KeyError("SQLITE_FILE is missing in %s for sqlite setup"%auppath)
         logger.info("Use default connector at %s" % config["SQLITE_FILE"])
-        return SQLiteConnector(path.expanduser(config["SQLITE_FILE"]))
+        wal = str(config.get("SQLITE_WAL", "false")).lower() in ("1", "true", "yes", "on")
+        busy_timeout = float(config.get("SQLITE_BUSY_TIMEOUT", BUSY_TIMEOUT))
+        flush_interval = float(config.get("SQLITE_FLUSH_INTERVAL", 0))
+        flush_rows = int(config.get("SQLITE_FLUSH_ROWS", FLUSH_ROWS))
+        return SQLiteConnector(path.expanduser(config["SQLITE_FILE"]), wal=wal, busy_timeout=busy_timeout,
+                               flush_interval=flush_interval, flush_rows=flush_rows)
     else:
         raise KeyError("SQL setup for %s is not supported" % config["SQLITE_FILE"])
 
@@ -168,16 +174,39 @@ def parse_result(result, log=logger):
 
 def parse_one_line(result, log=logger):
     if "#Auptimizer:" in result:
-        result = result[12:]
-        try:
-            return [float(result)]
-        except ValueError:
-            logger.debug("Cannot convert the result to float - trying to convert the result to a list")
-            return [float(f) for f in result.split(',')]
+        return parse_result_values(result[12:])
 
     return None
 
 
+def parse_result_values(result):
+    """
+    Parse the value of a result, as formatted by :func:`print_result`
+
+    :param result: one value, or comma separated values for multiple results
+    :type result: str
+    :return: main result followed by the secondary ones
+    :rtype: [float]
+    """
+    try:
+        return [float(result)]
+    except ValueError:
+        logger.debug("Cannot convert the result to float - trying to convert the result to a list")
+        return [float(f) for f in result.split(',')]
+
+
+def parse_result_message(message):
+    """
+    Parse a result sent over the result channel (see :func:`print_result`)
+
+    :param message: one JSON line
+    :type message: bytes | str
+    :return: main result followed by the secondary ones
+    :rtype: [float]
+    """
+    return parse_result_values(json.loads(message)["result"])
+
+
 def set_default_keyvalue(key, value, d, inplace=True, log=logger):
     """Set default value for dict if key is not defined
 
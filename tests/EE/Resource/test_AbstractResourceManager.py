@@ -2,9 +2,17 @@
 Copyright (c) 2018 LG Electronics Inc.
 SPDX-License-Identifier: GPL-3.0-or-later
 """
+import sqlite3
 import unittest
 import os
+import time
+import psutil
+from unittest import mock
+from six.moves import configparser
+
 from aup.EE.Resource import AbstractResourceManager
+from aup.ET.Connector.SQLiteConnector import SQLiteConnector
+from aup.setupdb import sqlite
 
 
 class AbsResourceManagerTestCase(unittest.TestCase):
@@ -20,6 +28,93 @@ class AbsResourceManagerTestCase(unittest.TestCase):
             t = AbstractResourceManager.get_resource_manager(k, self.connector, self.n_parallel, auppath=self.auppath)
             self.assertIsInstance(t, AbstractResourceManager.AbstractResourceManager)
 
+    def test_load_finished_jobs(self):
+        db_file = os.path.join("tests", "data", "sqlite3.db")
+        config = configparser.ConfigParser()
+        config.add_section("Auptimizer")
+        config.set("Auptimizer", "SQLITE_FILE", db_file)
+        sqlite.create_database(config, ["test"], 1, "test")
+        self.addCleanup(os.remove, db_file)
+        connector = SQLiteConnector(db_file)
+        eid = connector.start_experiment("test", "exp", "{}")
+        jid = connector.job_started(eid, 1, "{}")
+        for score in (1., 2.):
+            connector.save_intermediate_result(jid, score)
+        connector.job_finished(eid, jid, 2., status="FINISHED")
+
+        # created as in Experiment, which sets the experiment ID afterwards
+        rm = AbstractResourceManager.get_resource_manager("cpu", connector, 1, auppath=self.auppath,
+                                                          track_intermediate_results=True,
+                                                          early_stop={"aup_policy": "median", "aup_policy_steps": 1})
+        self.assertDictEqual(rm.early_stop_index.finished, {})
+        connector.resume_experiment(eid)
+        rm.eid = eid
+        self.assertDictEqual(rm.early_stop_index.finished, {jid: 2.})
+        rm.finish()
+
+    def test_take_available(self):
+        db_file = os.path.join("tests", "data", "sqlite3.db")
+        config = configparser.ConfigParser()
+        config.add_section("Auptimizer")
+        config.set("Auptimizer", "SQLITE_FILE", db_file)
+        sqlite.create_database(config, ["test"], 2, "test")
+        self.addCleanup(os.remove, db_file)
+        connector = SQLiteConnector(db_file)
+        rm = AbstractResourceManager.get_resource_manager("cpu", connector, 2, auppath=self.auppath)
+        rm.placement.view.refresh = 60
+        rids = rm.placement.view.free("cpu")
+        self.assertEqual(len(rids), 2)
+
+        # taken by another process, the view of this one is outdated
+        conn = sqlite3.connect(db_file)
+        conn.execute("UPDATE resource SET status='busy' WHERE rid=?", (rids[0],))
+        conn.commit()
+        conn.close()
+        with mock.patch.object(rm.placement, "select", side_effect=lambda free, config=None: free[0]):
+            self.assertEqual(rm.take_available("test", "cpu"), rids[1])
+            self.assertIsNone(rm.take_available("test", "cpu"))
+        self.assertFalse(connector.take_available_resource(rids[1]))
+        connector.free_used_resource(rids[1])
+        self.assertTrue(connector.take_available_resource(rids[1]))
+        connector.close()
+
+    def test_curve_fitting_timeout(self):
+        rm = AbstractResourceManager.get_resource_manager("cpu", None, 1, auppath=self.auppath,
+                                                          track_intermediate_results=True,
+                                                          early_stop={"aup_policy": "curve_fitting",
+                                                                      "aup_policy_steps": 1,
+                                                                      "curve_fitting_max_iters": 100,
+                                                                      "curve_fitting_timeout": 1,
+                                                                      "curve_fitting_mcmc_iters": 10 ** 9,
+                                                                      "curve_fitting_tolerance": -1,
+                                                                      "curve_fitting_workers": 1})
+        rm.early_stop_daemon_finished = True
+        rm.early_stop_daemon.join()
+        rm.run_curve_fitting([0.9 - 0.5 * i ** -0.8 for i in range(1, 21)], 1, 20, 0.95, 1.)
+        future = rm.curve_fitting_fits[1][0]
+        pool = rm.curve_fitting_pool
+        start = time.time()
+        while not future.running() and time.time() - start < 120:
+            time.sleep(0.1)
+        time.sleep(1)
+        with mock.patch("os.kill", wraps=os.kill) as kill:
+            rm.check_curve_fitting()
+        # the running fit can't be canceled, its process is terminated
+        self.assertIsNone(rm.curve_fitting_pool)
+        self.assertDictEqual(rm.curve_fitting_fits, {})
+        pids = [args[0] for args, _ in kill.call_args_list]
+        self.assertTrue(pids)
+        start = time.time()
+        while any(psutil.pid_exists(pid) for pid in pids) and time.time() - start < 10:
+            time.sleep(0.1)
+        self.assertFalse(any(psutil.pid_exists(pid) for pid in pids))
+
+        # the next fit starts a new pool
+        rm.run_curve_fitting([0.9 - 0.5 * i ** -0.8 for i in range(1, 21)], 1, 20, 0.95, 1.)
+        self.assertIsNotNone(rm.curve_fitting_pool)
+        self.assertIsNot(rm.curve_fitting_pool, pool)
+        self.assertIn(1, rm.curve_fitting_fits)
+        rm.recycle_curve_fitting_pool()
 
 if __name__ == '__main__':
     unittest.main()
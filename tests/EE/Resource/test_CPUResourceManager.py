@@ -3,14 +3,22 @@ Copyright (c) 2018 LG Electronics Inc.
 SPDX-License-Identifier: GPL-3.0-or-later
 """
 import os
+import subprocess
+import sys
+import time
 import unittest
+from unittest import mock
 from shutil import copyfile
 from shutil import rmtree
 import json
 
-from aup import BasicConfig
+from aup import BasicConfig, metrics
 from aup.EE.Job import Job
-from aup.EE.Resource.CPUResourceManager import CPUResourceManager
+from aup.EE.Resource.CPUResourceManager import CPUResourceManager, OUTPUT_TAIL, _OutputTail
+from aup.EE.Resource.utils.Admission import AdmissionControl
+from aup.EE.Resource.utils.cpu_affinity import CorePool, parse_cpulist, partition_cores, pin
+from aup.EE.Resource.utils.ForkServer import python_command
+from aup.EE.Resource.utils.ResourceSelectorExecutor import ResourceSelectorExecutor
 from aup.utils import get_default_connector
 
 class CPUResourceManagerTestCase(unittest.TestCase):
@@ -43,9 +51,11 @@ class CPUResourceManagerTestCase(unittest.TestCase):
         def callback(*args):
             self.val = -1
 
+        runs = metrics.JOB_RUNTIME.count()
         self.rm.run(self.job, self.rm.get_available("test", "cpu"), {}, callback)
         self.rm.executor.shutdown(wait=True)
         self.assertEqual(self.val, -1)
+        self.assertEqual(metrics.JOB_RUNTIME.count(), runs + 1)
 
     def test_fail_run(self):
         def callback(*args):
@@ -66,6 +76,348 @@ class CPUResourceManagerTestCase(unittest.TestCase):
         self.rm.suspend()
         self.assertListEqual([1, 0.1], self.rm.finish())
 
+class CPUResourceManagerSelectorTestCase(CPUResourceManagerTestCase):
+    def setUp(self):
+        copyfile(self.ori_db, self.bk_db)
+        self.connector = get_default_connector(self.auppath)
+        self.rm = CPUResourceManager(self.connector, self.n_parallel, eid=1, executor="selector")
+
+    def test_unknown_executor(self):
+        self.assertRaises(ValueError, CPUResourceManager, self.connector, self.n_parallel, executor="unknown")
+
+    def test_closed_output(self):
+        # a process closing its output but still running does not block the other ones
+        executor = ResourceSelectorExecutor()
+        lines = []
+        silent = subprocess.Popen(["sh", "-c", "exec >&-; sleep 3"], stdout=subprocess.PIPE)
+        slow = executor.submit(silent, lines.append, lambda stopped, error: "silent")
+        time.sleep(0.5)
+        start = time.time()
+        proc = subprocess.Popen(["sh", "-c", "echo done"], stdout=subprocess.PIPE)
+        fast = executor.submit(proc, lines.append, lambda stopped, error: "fast")
+        self.assertEqual(fast.result(timeout=2), "fast")
+        self.assertLess(time.time() - start, 2)
+        self.assertFalse(slow.done())
+        self.assertListEqual(lines, [b"done\n"])
+        self.assertEqual(slow.result(timeout=10), "silent")
+        executor.shutdown(wait=True)
+
+    @unittest.skipUnless(hasattr(os, "sched_getaffinity"), "CPU affinity is not supported")
+    def test_pinning(self):
+        rm = CPUResourceManager(self.connector, 2, eid=1, executor="selector", cores_per_job=1)
+        pinned = []
+
+        def record(pid, cores):
+            pin(pid, cores)
+            pinned.append((cores, os.sched_getaffinity(pid)))
+
+        results = []
+        rids = [rm.get_available("test", "cpu"), rm.get_available("test2", "cpu")]
+        with mock.patch("aup.EE.Resource.CPUResourceManager.pin", record):
+            for jid, rid in enumerate(rids):
+                job = Job("task11.py", BasicConfig({"x": 0}), "./tests/data")
+                job.jid = jid
+                rm.run(job, rid, {}, lambda *args: results.append(args))
+        rm.executor.shutdown(wait=True)
+        self.assertListEqual(pinned, [(rm.core_pool.cores(rid), set(rm.core_pool.cores(rid))) for rid in rids])
+        self.assertListEqual(sorted(results), [(0, 0), (0, 1)])
+
+class CPUResourceManagerPinningTestCase(CPUResourceManagerTestCase):
+    def setUp(self):
+        copyfile(self.ori_db, self.bk_db)
+        self.connector = get_default_connector(self.auppath)
+        self.rm = CPUResourceManager(self.connector, self.n_parallel, eid=1, cores_per_job="auto")
+
+    def test_core_pool(self):
+        self.assertListEqual(parse_cpulist("0-2,5\n"), [0, 1, 2, 5])
+        self.assertListEqual(partition_cores([[0, 1, 2], [3, 4, 5]], 2), [[0, 1], [3, 4], [2, 5]])
+        pool = CorePool(2, 2, cores=[0, 1, 2, 3])
+        cores = pool.cores(7)
+        self.assertEqual(len(cores), 2)
+        self.assertListEqual(sorted(cores + pool.cores(3)), [0, 1, 2, 3])
+        self.assertListEqual(pool.cores(7), cores)
+        kwargs = {"env": {"PATH": "/bin"}}
+        self.assertListEqual(pool.apply(3, kwargs), pool.cores(3))
+        self.assertEqual(kwargs["env"]["OMP_NUM_THREADS"], "2")
+        self.assertEqual(kwargs["env"]["PATH"], "/bin")
+        self.assertNotIn("preexec_fn", kwargs)
+        if hasattr(os, "sched_setaffinity"):
+            core = min(os.sched_getaffinity(0))
+            proc = subprocess.Popen(["sleep", "5"])
+            pin(proc.pid, [core])
+            self.assertSetEqual(os.sched_getaffinity(proc.pid), {core})
+            proc.kill()
+            proc.wait()
+        self.assertRaises(ValueError, CorePool, 0, 1)
+
+class CPUResourceManagerAdmissionTestCase(CPUResourceManagerTestCase):
+    def setUp(self):
+        copyfile(self.ori_db, self.bk_db)
+        self.connector = get_default_connector(self.auppath)
+        self.rm = CPUResourceManager(self.connector, self.n_parallel, eid=1, admission={"max_parallel": 4})
+
+    def test_admission(self):
+        self.assertEqual(self.rm.parallel_limit(2), 2)
+        self.assertTrue(self.rm.admit(0))
+        admission = AdmissionControl({"dynamic": True, "max_parallel": 4, "max_load": 0}, 2)
+        self.assertEqual(admission.limit(2), 4)
+        self.assertTrue(admission.admit(0))
+        self.assertFalse(admission.admit(1))
+        admission.close()
+
+        admission = AdmissionControl({"max_load": 1000, "min_free_memory": 1024 ** 3}, 2)
+        admission.track(1, os.getpid())
+        self.assertGreater(admission.expected_memory(), 0)
+        self.assertFalse(admission.admit(1))
+        admission.untrack(1)
+        self.assertEqual(len(admission.history), 1)
+        admission.close()
+
+class CPUResourceManagerForkServerTestCase(CPUResourceManagerTestCase):
+    def setUp(self):
+        copyfile(self.ori_db, self.bk_db)
+        self.connector = get_default_connector(self.auppath)
+        self.rm = CPUResourceManager(self.connector, self.n_parallel, eid=1, fork_server={}, cores_per_job=1)
+
+    def tearDown(self):
+        self.rm.fork_servers.close()
+        super(CPUResourceManagerForkServerTestCase, self).tearDown()
+
+    def test_fork_server(self):
+        self.assertTupleEqual(python_command("./test_Job.py", "./tests/EE"), (["/usr/bin/env", "python"],
+                                                                              "./test_Job.py", []))
+        self.assertTupleEqual(python_command("python3 task5.py --a", "."), (["python3"], "task5.py", ["--a"]))
+        self.assertIsNone(python_command("./missing.py", "./tests/data"))
+
+        results = []
+        for jid in (1, 2):
+            job = Job("task5.py", BasicConfig({"x": jid}), "./tests/data")
+            job.jid = jid
+            self.rm.run(job, self.rm.get_available("test", "cpu"), {}, lambda *args: results.append(args))
+        # jobs without aup_args run as usual
+        self.rm.run(self.job, self.rm.get_available("test", "cpu"), {}, lambda *args: results.append(args))
+        self.rm.executor.shutdown(wait=True)
+        self.assertListEqual(sorted(results), [(7, 1), (8, 2), (10, 0)])
+        servers = self.rm.fork_servers.servers
+        self.assertEqual(len(servers), 2)
+        self.assertIn(None, servers.values())
+        self.assertTrue(all(server.alive() for server in servers.values() if server is not None))
+
+    def test_call_arguments(self):
+        # the arguments passed by the script to the aup_args function still override the configuration
+        results = []
+        job = Job("task13.py", BasicConfig({"x": 1, "y": 1}), "./tests/data")
+        job.jid = 1
+        self.rm.run(job, self.rm.get_available("test", "cpu"), {}, lambda *args: results.append(args))
+        self.rm.executor.shutdown(wait=True)
+        self.assertListEqual(results, [(11, 1)])
+        self.assertIsNotNone(self.rm.fork_servers.servers[("./task13.py", os.path.abspath("./tests/data"))])
+
+    def test_exit_code(self):
+        os.makedirs(os.path.join("tests", "data", "jobs"), exist_ok=True)
+        procs = []
+        for x in (1, -3, 0):
+            config_path = os.path.join("jobs", "exit%d.json" % x)
+            BasicConfig({"x": x}).save(os.path.join("tests", "data", config_path))
+            procs.append(self.rm.fork_servers.start("task12.py", os.path.abspath("./tests/data"), config_path))
+        self.assertListEqual([proc.wait() for proc in procs], [0, 3, -9])
+        self.assertIn(b"#Auptimizer:1\n", procs[0].stdout.read())
+        self.assertEqual(procs[1].poll(), 3)
+        for proc in procs:
+            proc.stdout.close()
+
+class CPUResourceManagerWarmWorkerTestCase(CPUResourceManagerTestCase):
+    def setUp(self):
+        copyfile(self.ori_db, self.bk_db)
+        self.connector = get_default_connector(self.auppath)
+        self.rm = CPUResourceManager(self.connector, self.n_parallel, eid=1, warm_workers={"max_trials": 2})
+
+    def tearDown(self):
+        self.rm.warm_workers.close()
+        super(CPUResourceManagerWarmWorkerTestCase, self).tearDown()
+
+    def test_warm_worker(self):
+        results = []
+        rid = self.rm.get_available("test", "cpu")
+        for x in (1, 2, 3):
+            job = Job("task10.py", BasicConfig({"x": x}), "./tests/data")
+            job.jid = x
+            self.rm.run(job, rid, {}, lambda *args: results.append(args))
+            start = time.time()
+            while len(results) < x and time.time() - start < 60:
+                time.sleep(0.1)
+        self.rm.executor.shutdown(wait=True)
+        # setup once for two trials, then the worker is restarted
+        self.assertListEqual(results, [(111, 1), (122, 2), (113, 3)])
+        worker = self.rm.warm_workers.workers[("./task10.py", os.path.abspath("./tests/data"), rid)]
+        self.assertTrue(worker.alive())
+        with open(os.path.join("tests", "data", "jobs", "2.0.out")) as f:
+            self.assertIn("setup 1, trial 2", f.read())
+
+    def test_interpreter_script(self):
+        # scripts started by an interpreter, e.g. `python3 train.py`, run in a warm worker too
+        results = []
+        rid = self.rm.get_available("test", "cpu")
+        for x in (1, 2):
+            job = Job("%s task10.py" % sys.executable, BasicConfig({"x": x}), "./tests/data")
+            job.jid = x
+            self.rm.run(job, rid, {}, lambda *args: results.append(args))
+            start = time.time()
+            while len(results) < x and time.time() - start < 60:
+                time.sleep(0.1)
+        self.rm.executor.shutdown(wait=True)
+        self.assertListEqual(results, [(111, 1), (122, 2)])
+        self.assertIsNotNone(self.rm.warm_workers.workers[("%s task10.py" % sys.executable,
+                                                           os.path.abspath("./tests/data"), rid)])
+
+class CPUResourceManagerConfigChannelTestCase(CPUResourceManagerTestCase):
+    def setUp(self):
+        copyfile(self.ori_db, self.bk_db)
+        self.connector = get_default_connector(self.auppath)
+        self.rm = CPUResourceManager(self.connector, self.n_parallel, eid=1, config_channel="fd")
+
+    def test_config_channel(self):
+        self.assertRaises(ValueError, CPUResourceManager, self.connector, self.n_parallel, config_channel="unknown")
+        rm = CPUResourceManager(self.connector, 2, eid=1, config_channel="stdin", fork_server={}, warm_workers={},
+                                result_channel=True)
+        results = []
+        for i, (rm, script) in enumerate([(self.rm, "task5.py"), (rm, "task5.py"), (rm, "task10.py")]):
+            job = Job(script, BasicConfig({"x": 1}), "./tests/data")
+            job.jid = 100 + i
+            rm.run(job, rm.get_available("test", "cpu"), {}, lambda *args: results.append(args))
+        self.rm.executor.shutdown(wait=True)
+        rm.executor.shutdown(wait=True)
+        rm.fork_servers.close()
+        rm.warm_workers.close()
+        self.assertListEqual(sorted(results), [(7, 100), (7, 101), (111, 102)])
+        for jid in (100, 101, 102):
+            self.assertFalse(os.path.exists(os.path.join("tests", "data", "jobs", "%d.json" % jid)))
+
+class CPUResourceManagerResultChannelTestCase(CPUResourceManagerTestCase):
+    def setUp(self):
+        copyfile(self.ori_db, self.bk_db)
+        self.connector = get_default_connector(self.auppath)
+        self.rm = CPUResourceManager(self.connector, self.n_parallel, eid=1, result_channel=True)
+
+    def test_result_channel(self):
+        results = []
+        selector = CPUResourceManager(self.connector, self.n_parallel, eid=1, result_channel=True,
+                                      executor="selector")
+        for jid, rm in ((100, self.rm), (101, selector)):
+            job = Job("task5.py", BasicConfig({"x": 1}), "./tests/data")
+            job.jid = jid
+            rm.run(job, rm.get_available("test", "cpu"), {}, lambda *args: results.append(args))
+        self.rm.executor.shutdown(wait=True)
+        selector.executor.shutdown(wait=True)
+        self.assertListEqual(sorted(results), [(7, 100), (7, 101)])
+        with open(os.path.join("tests", "data", "jobs", "100.0.out")) as f:
+            self.assertIn("#Auptimizer:7", f.read())  # still in the log
+
+    def test_stdout_results(self):
+        # results printed to the output without print_result are parsed from the output
+        results = []
+        selector = CPUResourceManager(self.connector, self.n_parallel, eid=1, result_channel=True,
+                                      executor="selector")
+        for jid, rm in ((100, self.rm), (101, selector)):
+            job = Job("task11.py", BasicConfig({"x": 0}), "./tests/data")
+            job.jid = jid
+            rm.run(job, rm.get_available("test", "cpu"), {}, lambda *args: results.append(args))
+        self.rm.executor.shutdown(wait=True)
+        selector.executor.shutdown(wait=True)
+        self.assertListEqual(sorted(results), [(0, 100), (0, 101)])
+
+    def test_stdout_streamed(self):
+        # the intermediate results printed to the output are saved while the job runs
+        saved = []
+        selector = CPUResourceManager(self.connector, self.n_parallel, eid=1, result_channel=True,
+                                      executor="selector")
+        with mock.patch.object(CPUResourceManager, "append_interm_res",
+                               side_effect=lambda jid, score: saved.append((jid, score))):
+            for jid, rm in ((100, self.rm), (101, selector)):
+                job = Job("task11.py", BasicConfig({"x": 5}), "./tests/data")
+                job.jid = jid
+                rm.run(job, rm.get_available("test", "cpu"), {}, lambda *args: None)
+            start = time.time()
+            while len(saved) < 2 and time.time() - start < 4:
+                time.sleep(0.1)
+            self.assertListEqual(sorted(saved), [(100, 1.5), (101, 1.5)])
+            self.assertFalse(any(future.done() for future in self.rm.running + selector.running))
+            self.rm.executor.shutdown(wait=True)
+            selector.executor.shutdown(wait=True)
+        self.assertListEqual(sorted(saved), [(100, 1.5), (100, 5), (101, 1.5), (101, 5)])
+
+    def test_output_tail(self):
+        output = _OutputTail()
+        for _ in range(3 * OUTPUT_TAIL // 1000):
+            output.append(b"x" * 999 + b"\n")
+        output.append(b"last\n")
+        self.assertLessEqual(len(output.data), 2 * OUTPUT_TAIL)
+        self.assertEqual(len(str(output)), OUTPUT_TAIL)
+        self.assertTrue(str(output).endswith("last\n"))
+
+class CPUResourceManagerWatchdogTestCase(unittest.TestCase):
+    n_parallel = 2
+    auppath = os.path.join("tests", "data", ".aup")
+    ori_db = os.path.join(auppath, "sqlite3.db")
+    bk_db = os.path.join(auppath, "bk.db")
+
+    def setUp(self):
+        copyfile(self.ori_db, self.bk_db)
+        self.connector = get_default_connector(self.auppath)
+        self.results = []
+
+    def tearDown(self):
+        copyfile(self.bk_db, self.ori_db)
+        os.remove(self.bk_db)
+
+    def callback(self, score, jid):
+        self.results.append((score, jid))
+
+    def run_job(self, rm, x, jid):
+        job = Job("task9.py", BasicConfig({"x": x}), "./tests/data")
+        job.jid = jid
+        rm.run_job(job, rm.get_available("test", "cpu"), {}, self.callback)
+
+    def test_no_output(self):
+        rm = CPUResourceManager(self.connector, self.n_parallel, eid=1, watchdog={"no_output": 1, "interval": 0.1})
+        start = time.time()
+        self.run_job(rm, 30, 1)
+        rm.executor.shutdown(wait=True)
+        self.assertLess(time.time() - start, 10)
+        self.assertListEqual(self.results, [("ERROR", 1)])
+        rm.watchdog.close()
+
+    def test_timeout_after_result(self):
+        # the intermediate result printed before hanging is not the result of the job
+        rm = CPUResourceManager(self.connector, self.n_parallel, eid=1, watchdog={"timeout": 2, "interval": 0.1})
+        job = Job("task11.py", BasicConfig({"x": 30}), "./tests/data")
+        job.jid = 1
+        start = time.time()
+        rm.run_job(job, rm.get_available("test", "cpu"), {}, self.callback)
+        rm.executor.shutdown(wait=True)
+        self.assertLess(time.time() - start, 20)
+        self.assertListEqual(self.results, [("ERROR", 1)])
+        rm.watchdog.close()
+
+    def test_speculative(self):
+        rm = CPUResourceManager(self.connector, self.n_parallel, eid=1,
+                                watchdog={"speculative": True, "min_finished": 1, "interval": 0.1})
+        rm.watchdog.durations.append(0.5)
+        job = Job("task9.py", BasicConfig({"x": 30}), "./tests/data")
+        job.jid = 1
+        rm.run_job(job, rm.get_available("test", "cpu"), {}, self.callback)
+        while (1, 0) not in rm.watchdog.jobs:
+            time.sleep(0.1)
+        # the copy of the straggler runs the same configuration, make it finish first
+        job.config = BasicConfig({"x": 0})
+        start = time.time()
+        while not self.results and time.time() - start < 20:
+            time.sleep(0.1)
+        rm.executor.shutdown(wait=True)
+        self.assertListEqual(self.results, [(0, 1)])
+        self.assertLess(time.time() - start, 20)
+        rm.watchdog.close()
+
 class CPUResourceManagerEarlyStopTestCase(unittest.TestCase):
     n_parallel = 1
     auppath = os.path.join("tests", "data", ".aup")
@@ -0,0 +1,73 @@
+"""
+Copyright (c) 2018 LG Electronics Inc.
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+import random
+import unittest
+
+import numpy as np
+
+from aup.EE.Resource.utils.EarlyStopIndex import EarlyStopIndex
+
+
+class EarlyStopIndexTestCase(unittest.TestCase):
+    def _check(self, index, results, maximize, step):
+        best_fn = np.max if maximize else np.min
+        for jid, vals in results.items():
+            comp = {j: v for j, v in results.items() if len(v) >= step and j != jid}
+            if len(vals) < step:
+                self.assertEqual(index.count_others(jid, step), 0)
+                continue
+            self.assertEqual(index.count_others(jid, step), len(comp))
+            if not comp:
+                continue
+            median, average = index.median(jid, step)
+            self.assertAlmostEqual(median, np.median([np.average(v[:step]) for v in comp.values()]))
+            self.assertAlmostEqual(average, np.average(vals[:step]))
+            best, own = index.best(jid, step)
+            self.assertEqual(best, best_fn([best_fn(v[:step]) for v in comp.values()]))
+            self.assertEqual(own, best_fn(vals[:step]))
+            best_vals = sorted([(j, best_fn(v[:step])) for j, v in list(comp.items()) + [(jid, vals)]],
+                               key=lambda t: t[1], reverse=not maximize)
+            rank = next(idx for idx, (j, _) in enumerate(best_vals) if j == jid) + 1
+            self.assertEqual(index.rank(jid, step), (rank, len(best_vals), own))
+
+    def test_statistics(self):
+        rng = random.Random(0)
+        for maximize in (True, False):
+            index = EarlyStopIndex(maximize, policy_steps=2)
+            results = dict()
+            for jid in range(8):
+                index.start(jid)
+                results[jid] = []
+                for _ in range(rng.randint(1, 8)):
+                    value = float(rng.randint(0, 5))  # with ties
+                    index.append(jid, value)
+                    results[jid].append(value)
+            for step in (2, 4, 6, 8):
+                self._check(index, results, maximize, step)
+
+            index.exclude(3)
+            index.start(5)  # retried
+            results.pop(3)
+            results[5] = []
+            for step in (2, 4, 6, 8):
+                self._check(index, results, maximize, step)
+            self.assertEqual(index.count_others(3, 2), 0)
+
+    def test_finished(self):
+        index = EarlyStopIndex(maximize=False, policy_steps=1)
+        self.assertIsNone(index.finished_best())
+        index.add_finished(1, [3., 2., 4.])
+        index.append(2, 1.)
+        self.assertEqual(index.finished_best(), 2.)
+        index.finish(2)
+        self.assertEqual(index.finished_best(), 1.)
+        index.exclude(2)
+        self.assertEqual(index.finished_best(), 2.)
+        self.assertEqual(index.values(1), [3., 2., 4.])
+        self.assertEqual(index.count_others(1, 1), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+"""
+Copyright (c) 2018 LG Electronics Inc.
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+import unittest
+
+from aup.ET.Connector.ResourceView import ResourceView
+from aup.EE.Resource.utils.Placement import get_placement
+
+
+class FakeConnector(object):
+    def __init__(self):
+        self.resources = [(1, "a", "cpu", "free"), (2, "a", "cpu", "free"),
+                          (3, "b", "cpu", "free"), (4, "b", "cpu", "busy"), (5, "b", "gpu", "free")]
+        self.n_queries = 0
+
+    def get_resources(self):
+        self.n_queries += 1
+        return list(self.resources)
+
+
+class PlacementTestCase(unittest.TestCase):
+    def setUp(self):
+        self.connector = FakeConnector()
+
+    def placement(self, name):
+        view = ResourceView(self.connector, refresh=60)
+        placement = get_placement(name, self.connector, view.name)
+        placement._view = view
+        return placement
+
+    def test_view(self):
+        view = ResourceView(self.connector, refresh=60)
+        self.assertListEqual(view.free("cpu"), [1, 2, 3])
+        self.assertListEqual(view.free("cpu", rid_blacklist=[1, 3]), [2])
+        self.assertListEqual(view.free("cpu", rid_blacklist=[1, 2, 3]), [1, 2, 3])
+        view.mark(None, "busy")
+        self.assertEqual(self.connector.n_queries, 1)
+        # no free resource left in memory, reload from database
+        self.assertListEqual(view.free("cpu"), [1, 2, 3])
+        self.assertEqual(self.connector.n_queries, 2)
+
+    def test_unknown(self):
+        self.assertRaises(ValueError, get_placement, "none", self.connector, str)
+
+    def test_sticky(self):
+        placement = self.placement("sticky")
+        placement.started(3)
+        for _ in range(10):
+            self.assertEqual(placement.select([1, 2, 5]), 5)
+
+    def test_least_loaded(self):
+        placement = self.placement("least_loaded")
+        placement.view.free("cpu")
+        self.assertIn(placement.select([1, 2, 3]), [1, 2])
+        placement.view.mark(1, "busy")
+        placement.view.mark(2, "busy")
+        self.assertEqual(placement.select([3]), 3)
+        placement.view.mark(1, "free")
+        self.assertEqual(placement.select([1, 3]), 3)
+        placement.view.mark(2, "free")
+        self.assertIn(placement.select([1, 2, 3]), [1, 2])
+
+    def test_failure_aware(self):
+        placement = self.placement("failure_aware")
+        placement.view.free("cpu")
+        placement.started(1)
+        placement.finished(1, failed=True)
+        for _ in range(10):
+            self.assertEqual(placement.select([1, 2, 3]), 3)
+
+    def test_affinity(self):
+        placement = self.placement("affinity")
+        placement.view.free("cpu")
+        self.assertTrue(placement.needs_config)
+        placement.started(3, {"x": 1, "tid": 0, "n_iterations": 1})
+        placement.finished(3)
+        placement.started(1, {"x": 2, "tid": 1, "n_iterations": 1})
+        placement.view.mark(1, "busy")
+        # promoted configuration goes back to its host, even if more loaded
+        self.assertEqual(placement.select([2, 3], {"x": 1, "tid": 0, "n_iterations": 3}), 3)
+        self.assertEqual(placement.select([2, 3], {"x": 3, "tid": 2, "n_iterations": 1}), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+"""
+Copyright (c) 2018 LG Electronics Inc.
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from aup.EE.Resource.utils.curve_fitting import CurveFittingCache, CurveModel, predict_final
+
+
+class CurveFittingTestCase(unittest.TestCase):
+    rng = np.random.RandomState(1)
+    x = np.arange(1, 31)
+    interm_res = list(0.9 - 0.5 * x ** -0.8 + rng.randn(30) * 0.005)
+    final = 0.9 - 0.5 * 100 ** -0.8
+
+    def test_predict(self):
+        model = CurveModel(100, seed=0)
+        self.assertAlmostEqual(model.predict(self.interm_res), self.final, delta=0.02)
+
+    def test_convergence(self):
+        model = CurveModel(100, mcmc_iters=100000, tolerance=1e-3, seed=0)
+        model.interm_res = np.asarray(self.interm_res)
+        model.step = len(self.interm_res)
+        funcs = model.filter_curve(model.fit_theta())
+        samples, its = model.mcmc_sampling(*model.curves(funcs, model.fit_theta()))
+        self.assertLess(its, 100000)
+        self.assertEqual(samples.shape, (CurveModel.NUM_INSTANCE, len(funcs)))
+        np.testing.assert_allclose(samples.sum(axis=1), 1.)
+
+    def test_process_pool(self):
+        with ProcessPoolExecutor(max_workers=2) as pool:
+            futures = [pool.submit(predict_final, self.interm_res[:n], 100, seed=0) for n in (20, 30)]
+            for future in futures:
+                prediction, state = future.result(timeout=60)
+                self.assertAlmostEqual(prediction, self.final, delta=0.02)
+                self.assertGreater(state["iterations"], 0)
+
+    def test_warm_start(self):
+        prediction, state = predict_final(self.interm_res, 100, seed=0)
+        warm_prediction, warm_state = predict_final(self.interm_res, 100, seed=1, state=state)
+        self.assertAlmostEqual(warm_prediction, prediction, delta=1e-3)
+        self.assertEqual(warm_state["iterations"], CurveModel.CHECK_ITERS)
+        self.assertLess(warm_state["iterations"], state["iterations"])
+
+    def test_cache(self):
+        cache = CurveFittingCache()
+        self.assertIsNone(cache.get(1))
+        cache.update(1, {"params": {"linear": [1., 2.]}, "weights": {}})
+        cache.update(2, {"params": {"linear": [3., 4.], "pow3": [1., 1., 1.]}, "weights": {}})
+        self.assertEqual(cache.get(1)["params"]["linear"], [1., 2.])
+        cache.finish(1)
+        cache.finish(2)
+        np.testing.assert_allclose(cache.get(3)["params"]["linear"], [2., 3.])
+        np.testing.assert_allclose(cache.get(3)["params"]["pow3"], [1., 1., 1.])
+        cache.update(3, {"params": {}, "weights": {}})
+        cache.drop(3)
+        self.assertNotIn(3, cache.states)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,11 +2,15 @@
 Copyright (c) 2018 LG Electronics Inc.
 SPDX-License-Identifier: GPL-3.0-or-later
 """
+import threading
+import time
 import unittest
 import os
 from shutil import copyfile, rmtree
+from unittest import mock
 
 from aup import Experiment, BasicConfig
+from aup.EE.Scheduler import Scheduler
 from aup.compression.utils import adjust_compression_config
 
 
@@ -35,6 +39,149 @@ class ExperimentTestCase(unittest.TestCase):
         exp.finish()
         self.assertDictEqual(exp.pending_jobs, {})
 
+    def test_proposer_process(self):
+        config = BasicConfig().load(self.path)
+        config["proposer_process"] = {}
+        exp = Experiment(config, username="test", auppath=self.auppath)
+        exp.start()
+        exp.finish()
+        self.assertDictEqual(exp.pending_jobs, {})
+        self.assertFalse(exp.proposer.process.is_alive())
+
+    def test_prefetch(self):
+        config = BasicConfig().load(self.path)
+        config["prefetch"] = {"depth": 2}
+        exp = Experiment(config, username="test", auppath=self.auppath)
+        exp.start()
+        exp.finish()
+        self.assertDictEqual(exp.pending_jobs, {})
+        self.assertEqual(len(exp.proposals), 0)
+        self.assertEqual(exp.proposer.counter, 10)
+
+    def test_prefetch_stale(self):
+        config = BasicConfig().load(self.path)
+        config["prefetch"] = {"depth": 1}
+        exp = Experiment(config, username="test", auppath=self.auppath)
+        self.assertEqual(exp.stale_after, 2)
+        computing, computed = threading.Event(), threading.Event()
+        get_batch = exp.proposer.get_batch
+
+        def slow_get_batch(n):
+            computing.set()
+            computed.wait(10)
+            return get_batch(n)
+
+        with mock.patch.object(exp.proposer, "get_batch", side_effect=slow_get_batch), \
+                mock.patch.object(exp.proposer, "is_prefetch_stale", return_value=True):
+            exp.prefetcher = threading.Thread(target=exp._prefetch, daemon=True)
+            exp.prefetcher.start()
+            exp.prefetch_request.set()
+            self.assertTrue(computing.wait(10))
+            # the proposal is computed without the lock of the dispatcher
+            self.assertTrue(exp.lock.acquire(timeout=5))
+            exp.lock.release()
+            computed.set()
+            deadline = time.time() + 10
+            while not exp.proposals and time.time() < deadline:
+                time.sleep(0.1)
+            self.assertEqual(len(exp.proposals), 1)
+            exp._check_stale_proposals()
+            self.assertEqual(len(exp.proposals), 1)
+            exp._check_stale_proposals()
+            self.assertEqual(len(exp.proposals), 0)
+        exp.start()
+        exp.finish()
+        self.assertDictEqual(exp.pending_jobs, {})
+        self.assertEqual(exp.proposer.counter, 10)
+
+    def test_result_cache(self):
+        config = BasicConfig().load(self.path)
+        config["result_cache"] = {}
+        exp = Experiment(config, username="test", auppath=self.auppath)
+        exp.start()
+        best = exp.finish()
+        n_jobs = len(os.listdir(os.path.join("tests", "jobs")))
+
+        config = BasicConfig().load(self.path)
+        config["result_cache"] = {"ttl": 3600}
+        exp = Experiment(config, username="test", auppath=self.auppath)
+        exp.start()
+        self.assertDictEqual(exp.pending_jobs, {})
+        self.assertEqual(exp.finish()[1], best[1])
+        self.assertEqual(len(os.listdir(os.path.join("tests", "jobs"))), n_jobs)
+        os.remove("exp%d.pkl" % exp.eid)
+
+    def test_warm_start(self):
+        config = BasicConfig().load(self.path)
+        config["warm_start"] = {"eids": [1, 2], "max_points": 5}
+        config["n_samples"] = 2
+        exp = Experiment(config, username="test", auppath=self.auppath)
+        self.assertEqual(config["warm_start"]["max_points"], 5)
+        exp.start()
+        exp.finish()
+        self.assertDictEqual(exp.pending_jobs, {})
+        os.remove("exp%d.pkl" % exp.eid)
+
+    def test_journal(self):
+        config = BasicConfig().load(self.path)
+        config["n_samples"] = 4
+        config["journal"] = {"snapshot_every": 3}
+        exp = Experiment(config, username="test", auppath=self.auppath)
+        exp.start()
+        best = exp.finish()
+        n_jobs = len(os.listdir(os.path.join("tests", "jobs")))
+
+        config = BasicConfig().load(self.path)
+        config["n_samples"] = 4
+        config["journal"] = {}
+        exp = Experiment(config, username="test", auppath=self.auppath, eid=exp.eid, resume=True)
+        exp.resume()
+        self.assertEqual(exp.proposer.counter, 4)
+        self.assertEqual(exp.finish()[1], best[1])
+        self.assertEqual(len(os.listdir(os.path.join("tests", "jobs"))), n_jobs)
+        for f in os.listdir("."):
+            if f.startswith("exp%d." % exp.eid):
+                os.remove(f)
+
+    def test_scheduler(self):
+        scheduler = Scheduler()
+        experiments = []
+        for weight, n_samples in ((1, 1), (2, 3)):
+            config = BasicConfig().load(self.path)
+            config["n_samples"] = n_samples
+            config["n_parallel"] = 4
+            config["schedule"] = {"weight": weight}
+            experiments.append(Experiment(config, username="test", auppath=self.auppath, scheduler=scheduler))
+        short, long = experiments
+        # the jobs of the long experiment hold their resources until the short one is finished
+        finished = threading.Event()
+        busy = []
+        finish_job = long.resource_manager.finish_job
+        finish = short.finish
+
+        def hold_job(*args, **kwargs):
+            finished.wait(60)
+            return finish_job(*args, **kwargs)
+
+        def check_finish():
+            result = finish()
+            held = set(long.resource_manager.jobs.values())
+            busy.extend(rid for rid, _, _, status in long.connector.get_resources() if rid in held and status == "busy")
+            finished.set()
+            return result
+
+        long.resource_manager.finish_job = hold_job
+        short.finish = check_finish
+        for exp in experiments:
+            scheduler.add(exp)
+        scheduler.join()
+        self.assertTrue(finished.is_set())
+        self.assertNotEqual(busy, [])  # not freed by the short experiment
+        for exp, n_samples in zip(experiments, (1, 3)):
+            self.assertDictEqual(exp.pending_jobs, {})
+            self.assertEqual(exp.proposer.counter, n_samples)
+            os.remove("exp%d.pkl" % exp.eid)
+
     def test_job_retries(self):
         exp = Experiment(BasicConfig().load(os.path.join("tests", "data", "exp6.json")),
                          username="test", auppath=os.path.join("tests", "data", ".aup"))
@@ -43,6 +190,114 @@ class ExperimentTestCase(unittest.TestCase):
         self.assertDictEqual(exp.pending_jobs, {})
         self.assertEqual(jid, 10)
 
+    def test_take_resource_once(self):
+        exp = Experiment(BasicConfig().load(self.path), username="test", auppath=self.auppath)
+        connector = exp.resource_manager.connector
+        with mock.patch.object(connector, "take_available_resource",
+                               wraps=connector.take_available_resource) as take:
+            exp.start()
+            exp.finish()
+        self.assertDictEqual(exp.pending_jobs, {})
+        # each job takes its resource once, when it is chosen
+        self.assertEqual(take.call_count, exp.proposer.counter)
+
+
+class ExperimentDispatchTest(unittest.TestCase):
+    """Job completions handled by the dispatcher thread, with jobs run by the test"""
+    path = os.path.join("tests", "data", "exp5.json")
+    auppath = os.path.join("tests", "data", ".aup")
+    ori_db = os.path.join(auppath, "sqlite3.db")
+    bk_db = os.path.join(auppath, "bk.db")
+
+    def setUp(self):
+        copyfile(self.ori_db, self.bk_db)
+
+    def tearDown(self):
+        copyfile(self.bk_db, self.ori_db)
+        os.remove(self.bk_db)
+
+    def _experiment(self, **config):
+        exp_config = BasicConfig().load(self.path)
+        exp_config.update(config)
+        exp = Experiment(exp_config, username="test", auppath=self.auppath, sleep_time=0.1, request_stop_time=0.1)
+        self.started = []
+        self.free = True
+
+        def run_job(job, rid, exp_config, call_back_func, **kwargs):
+            exp.resource_manager.jobs[job.jid] = rid
+            self.started.append(job.jid)
+
+        exp.resource_manager.run_job = run_job
+        exp.resource_manager.job_failed = lambda jid: exp.resource_manager.jobs[jid]
+        exp.resource_manager.get_available = lambda *args, **kwargs: 1 if self.free else None
+        exp.resource_manager.take_available = exp.resource_manager.get_available
+        return exp
+
+    def _wait(self, condition, timeout=10):
+        end = time.time() + timeout
+        while not condition() and time.time() < end:
+            time.sleep(0.01)
+        self.assertTrue(condition())
+
+    def test_order(self):
+        exp = self._experiment()
+        processed = []
+        active = []
+
+        def process_result(score, jid):
+            active.append(jid)
+            self.assertEqual(len(active), 1)  # one result at a time
+            time.sleep(0.001)
+            processed.append((score, jid))
+            active.remove(jid)
+
+        exp._process_result = process_result
+        exp.dispatcher = threading.Thread(target=exp._dispatch, daemon=True)
+        exp.dispatcher.start()
+        threads = [threading.Thread(target=lambda t=t: [exp.update(i, t) for i in range(20)]) for t in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        exp._stop_dispatcher()
+        self.assertEqual(len(processed), 80)
+        for t in range(4):
+            self.assertListEqual([score for score, jid in processed if jid == t], list(range(20)))
+        exp.connector.close()
+
+    def test_deferred_retry(self):
+        exp = self._experiment(n_samples=1, job_failure={"ignore_fail": True, "job_retries": 1})
+        exp.start()
+        self._wait(lambda: len(self.started) == 1)
+        jid = self.started[0]
+
+        self.free = False
+        exp.update("ERROR", jid)
+        self._wait(lambda: len(exp.retry_jobs) == 1)
+        self.assertIn(jid, exp.pending_jobs)
+        time.sleep(0.3)  # the dispatcher keeps trying
+        self.assertListEqual(self.started, [jid])
+
+        self.free = True
+        self._wait(lambda: len(self.started) == 2)
+        self.assertListEqual(self.started, [jid, jid])
+        self.assertEqual(len(exp.retry_jobs), 0)
+        exp.update(1., jid)
+        self.assertEqual(exp.finish()[0], jid)
+        self.assertDictEqual(exp.pending_jobs, {})
+        os.remove("exp%d.pkl" % exp.eid)
+
+    def test_finish_wakeup(self):
+        exp = self._experiment(n_samples=1)
+        exp.sleep_time = 30  # finish() must not wait for the timeout
+        exp.start()
+        self._wait(lambda: len(self.started) == 1)
+        threading.Timer(0.2, exp.update, (1., self.started[0])).start()
+        start = time.time()
+        self.assertEqual(exp.finish()[0], self.started[0])
+        self.assertLess(time.time() - start, 10)
+        os.remove("exp%d.pkl" % exp.eid)
+
 
 class ExperimentCompressionTest(unittest.TestCase):
     path = os.path.join("tests", "data", "exp7.json")
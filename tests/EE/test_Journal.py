@@ -0,0 +1,93 @@
+"""
+Copyright (c) 2018 LG Electronics Inc.
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from aup.EE.Job import Job
+from aup.EE.Journal import Journal
+from aup.Proposer.RandomProposer import RandomProposer
+
+
+def make_job(config, jid):
+    job = Job("none", config)
+    job.jid = jid
+    return job
+
+
+class JournalTestCase(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.config = {"n_samples": 10, "parameter_config": [{"name": "x", "type": "float", "range": [0, 1]}]}
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def run_jobs(self, proposer, journal, n):
+        for jid in range(n):
+            proposal = proposer.get()
+            journal.proposed([proposal])
+            proposer.increment_job_counter()
+            journal.result(proposal, proposal["x"], jid)
+            proposer.update(proposal["x"], make_job(proposal, jid))
+            journal.checkpoint(proposer)
+
+    def test_replay(self):
+        proposer = RandomProposer(dict(self.config))
+        journal = Journal(1, {"path": self.path, "snapshot_every": 0})
+        self.run_jobs(proposer, journal, 3)
+        pending = proposer.get()
+        journal.proposed([pending])
+        journal.close()
+        expected = proposer.get()  # after the pending proposal
+
+        replayed = RandomProposer(dict(self.config))
+        journal = Journal(1, {"path": self.path})
+        self.assertEqual(journal.replay(replayed, make_job), [pending])
+        self.assertEqual(replayed.counter, 3)
+        self.assertEqual(replayed.get(), expected)
+        journal.close()
+
+    def test_snapshot(self):
+        proposer = RandomProposer(dict(self.config))
+        journal = Journal(2, {"path": self.path, "snapshot_every": 4})
+        self.run_jobs(proposer, journal, 3)
+        self.assertEqual(journal.generation, 1)
+        self.assertEqual(len(journal.load()), 3)  # snapshot and one job
+        self.assertTrue(os.path.isfile(journal.path + ".1"))
+        self.run_jobs(proposer, journal, 2)
+        self.assertFalse(os.path.isfile(journal.path + ".1"))
+        running = proposer.get()
+        journal.proposed([running])
+        proposer.increment_job_counter()
+        self.assertTrue(journal.snapshot(proposer))
+        journal.close()
+        with open(journal.path, "a") as f:
+            f.write('{"event": "res')  # interrupted while writing
+        expected = proposer.get()
+
+        replayed = RandomProposer(dict(self.config))
+        journal = Journal(2, {"path": self.path})
+        self.assertEqual(journal.replay(replayed, make_job), [running])
+        self.assertEqual(replayed.counter, 5)
+        self.assertEqual(replayed.get(), expected)
+        journal.close()
+
+    def test_diverged(self):
+        proposer = RandomProposer(dict(self.config, random_seed=1))
+        journal = Journal(3, {"path": self.path, "snapshot_every": 0})
+        self.run_jobs(proposer, journal, 2)
+        journal.close()
+
+        # another random state proposes other values, the resume fails instead of going on with them
+        replayed = RandomProposer(dict(self.config, random_seed=2))
+        journal = Journal(3, {"path": self.path})
+        self.assertRaises(RuntimeError, journal.replay, replayed, make_job)
+        journal.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+"""
+Copyright (c) 2018 LG Electronics Inc.
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from aup.EE.ResultCache import code_fingerprint
+
+
+class ResultCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        with open(os.path.join(self.path, "train.py"), "w") as f:
+            f.write("print(1)")
+        with open(os.path.join(self.path, "model.py"), "w") as f:
+            f.write("a = 1")
+        with open(os.path.join(self.path, "data.txt"), "w") as f:
+            f.write("0")
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_fingerprint(self):
+        h = code_fingerprint("python train.py", self.path, ["*.py"])
+        self.assertEqual(h, code_fingerprint("python train.py", self.path, ["*.py"]))
+        self.assertNotEqual(h, code_fingerprint("python3 train.py", self.path, ["*.py"]))
+
+        with open(os.path.join(self.path, "data.txt"), "w") as f:
+            f.write("1")
+        self.assertEqual(h, code_fingerprint("python train.py", self.path, ["*.py"]))
+
+        with open(os.path.join(self.path, "model.py"), "w") as f:
+            f.write("a = 2")
+        self.assertNotEqual(h, code_fingerprint("python train.py", self.path, ["*.py"]))
+        self.assertNotEqual(code_fingerprint("python train.py", self.path, []),
+                            code_fingerprint("python train.py", self.path, ["*.txt"]))
+
+
+if __name__ == '__main__':
+    unittest.main()
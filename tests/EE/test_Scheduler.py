@@ -0,0 +1,94 @@
+"""
+Copyright (c) 2018 LG Electronics Inc.
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+import threading
+import unittest
+
+from aup.EE.Scheduler import Scheduler
+
+
+class FakeExperiment(object):
+    def __init__(self, eid, pool, n_parallel=10, **schedule):
+        self.eid = eid
+        self.exp_config = {"schedule": schedule}
+        self.pool = pool  # free resources shared by the experiments
+        self.n_parallel = n_parallel
+        self.pending_jobs = {}
+        self.done = threading.Event()
+
+    def start(self):
+        pass
+
+    def finish(self):
+        self.done.wait()
+
+    def wanted_jobs(self):
+        return self.n_parallel - len(self.pending_jobs)
+
+    def run_scheduled_job(self):
+        if not self.pool:
+            return False
+        self.pending_jobs[len(self.pending_jobs)] = self.pool.pop()
+        return True
+
+
+class SchedulerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = Scheduler(sleep_time=100)  # only allocate on demand
+        self.pool = list(range(6))
+        self.experiments = []
+
+    def tearDown(self):
+        for exp in self.experiments:
+            exp.done.set()
+        self.scheduler.join()
+        self.scheduler.stopped = True
+
+    def add(self, **kwargs):
+        exp = FakeExperiment(len(self.experiments), self.pool, **kwargs)
+        self.experiments.append(exp)
+        return self.scheduler.add(exp)
+
+    def test_weight(self):
+        a = self.add(weight=1)
+        b = self.add(weight=2)
+        self.assertEqual(self.scheduler.allocate(), 6)
+        self.assertEqual(len(a.pending_jobs), 2)
+        self.assertEqual(len(b.pending_jobs), 4)
+
+    def test_priority(self):
+        a = self.add(n_parallel=2)
+        b = self.add(n_parallel=3, priority=1)
+        self.scheduler.allocate()
+        self.assertEqual(len(a.pending_jobs), 2)
+        self.assertEqual(len(b.pending_jobs), 3)
+        self.assertEqual(self.pool, [0])
+
+    def test_queue(self):
+        del self.pool[:]
+        a = self.add()
+        self.assertEqual(self.scheduler.allocate(), 0)
+        self.pool.append(0)
+        self.assertEqual(self.scheduler.allocate(), 1)
+        self.assertEqual(len(a.pending_jobs), 1)
+
+    def test_usage(self):
+        a = self.add()
+        self.scheduler.entries[0].usage = 10.
+        b = self.add(weight=2)
+        self.assertEqual(self.scheduler.entries[1].usage, 20.)
+        a.pending_jobs[-1] = -1
+        b.pending_jobs[-1] = -1
+        b.pending_jobs[-2] = -2
+        self.scheduler.entries[0].usage = 5.  # equal share of running jobs, a used less resources
+        self.pool[:] = [0]
+        self.scheduler.allocate()
+        self.assertEqual(len(a.pending_jobs), 2)
+
+    def test_invalid_weight(self):
+        self.assertRaises(ValueError, self.add, weight=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
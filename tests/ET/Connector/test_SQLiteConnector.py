@@ -4,11 +4,16 @@ SPDX-License-Identifier: GPL-3.0-or-later
 """
 import os
 import sqlite3
+import subprocess
+import threading
 import unittest
 from six.moves import configparser
 
-from aup.ET.Connector.SQLiteConnector import SQLiteConnector
+from aup import metrics
+from aup.ET.Connector.ResourceView import ResourceView
+from aup.ET.Connector.SQLiteConnector import IRID_BLOCK, SQLiteConnector, _reading
 from aup.setupdb import sqlite
+from aup.setupdb.sqlite import placeholder_owner
 
 
 class SQLiteConnectorTestCase(unittest.TestCase):
@@ -53,6 +58,43 @@ class SQLiteConnectorTestCase(unittest.TestCase):
         self.assertEqual({1, 2}, set(rids))
         connector.close()
 
+    def test_resource_view(self):
+        """Test in-memory resource table, updated by all connectors of the database"""
+        connector = SQLiteConnector(self.db_file)
+        view = ResourceView.get(connector, refresh=60)
+        view.load()
+        self.assertListEqual(view.free('gpu'), [1, 2])
+
+        other = SQLiteConnector(self.db_file)
+        other.take_available_resource(1)
+        self.assertListEqual(view.free('gpu'), [2])
+        other.free_all_resources()
+        self.assertListEqual(view.free('gpu'), [1, 2])
+        other.close()
+        connector.close()
+
+    def test_resource_view_closed(self):
+        """Test the shared resource view still reloads once one of its connectors is closed"""
+        connector = SQLiteConnector(self.db_file)
+        view = ResourceView.get(connector, refresh=0)
+        other = SQLiteConnector(self.db_file)
+        self.assertIs(ResourceView.get(other, refresh=0), view)
+        other.take_available_resource(1)
+        other.close()  # e.g. another experiment of the process finished
+        self.assertListEqual(view.free('gpu'), [2])
+        connector.free_used_resource(1)
+        self.assertListEqual(view.free('gpu'), [1, 2])
+        connector.close()
+
+    def test_metrics(self):
+        """Test latency of connector calls"""
+        count = metrics.SQLITE_CALL.count(call="get_resource_type")
+        connector = SQLiteConnector(self.db_file)
+        connector.get_resource_type()
+        connector.close()
+        self.assertEqual(metrics.SQLITE_CALL.count(call="get_resource_type"), count + 1)
+        self.assertIn('aup_sqlite_call_seconds_count{call="get_resource_type"}', metrics.REGISTRY.render())
+
     def test_experiment(self):
         """test experiment start and stop"""
         connector = SQLiteConnector(self.db_file)
@@ -69,6 +111,53 @@ class SQLiteConnectorTestCase(unittest.TestCase):
 
         self.assertRaises(ValueError, connector.get_all_experiment, "not-exist")
 
+    def test_result_cache(self):
+        """test job lookup by hash"""
+        connector = SQLiteConnector(self.db_file)
+        connector.prepare_result_cache()
+        connector.prepare_result_cache()
+        eid = connector.start_experiment(self.name, 'exp1', '{}')
+        jid1 = connector.job_started(eid, 1, "job1", job_hash="abc")
+        self.assertIsNone(connector.get_cached_result("abc"))
+        connector.job_finished(1, jid1, 0.5, "FINISHED")
+        self.assertTupleEqual(connector.get_cached_result("abc"), (jid1, 0.5))
+        self.assertTupleEqual(connector.get_cached_result("abc", ttl=60), (jid1, 0.5))
+        self.assertIsNone(connector.get_cached_result("abd"))
+
+        jid2 = connector.save_cached_job(eid, "job1", 0.5)
+        self.assertListEqual(connector.get_best_result(eid), [jid1, 0.5])
+        self.assertTupleEqual(connector.get_cached_result("abc"), (jid1, 0.5))
+        self.assertNotEqual(jid1, jid2)
+        connector.close()
+
+    def test_finished_jobs(self):
+        """test loading previous jobs"""
+        connector = SQLiteConnector(self.db_file)
+        eid = connector.start_experiment(self.name, 'exp1', '{}')
+        for i in range(3):
+            jid = connector.job_started(eid, 1, {"x": i})
+            connector.job_finished(1, jid, float(i), "FINISHED")
+        connector.job_started(eid, 1, {"x": 3})
+        self.assertListEqual(connector.get_finished_jobs([eid]), [({"x": 2}, 2.), ({"x": 1}, 1.), ({"x": 0}, 0.)])
+        self.assertListEqual(connector.get_finished_jobs([eid], 1), [({"x": 2}, 2.)])
+        self.assertListEqual(connector.get_finished_jobs([eid + 1]), [])
+        connector.close()
+
+    def test_resume_experiment(self):
+        """test restarting an experiment after a crash"""
+        connector = SQLiteConnector(self.db_file)
+        eid = connector.start_experiment(self.name, 'exp1', '{}')
+        jid = connector.job_started(eid, 1, {"x": 0})
+        connector.job_finished(1, jid, 0., "FINISHED")
+        connector.take_available_resource(2)
+        connector.job_started(eid, 2, {"x": 1})
+        connector.end_experiment(eid, "FAILED")
+        connector.resume_experiment(eid)
+        self.assertListEqual(connector.get_finished_jobs([eid]), [({"x": 0}, 0.)])
+        self.assertIn(2, connector.get_available_resource(self.username, 'gpu'))
+        self.assertEqual(connector.maybe_get_experiment_status(eid), "RUNNING")
+        connector.close()
+
     def test_job(self):
         """test job start and stop"""
         connector = SQLiteConnector(self.db_file)
@@ -87,6 +176,18 @@ class SQLiteConnectorTestCase(unittest.TestCase):
         self.assertListEqual(connector.get_best_result(1, maximize=False), [jid2, -100.])
         connector.close()
 
+    def test_close_unlocks(self):
+        """Test closing a connector after a query not fully fetched, e.g. several best jobs"""
+        connector = SQLiteConnector(self.db_file)
+        eid = connector.start_experiment(self.name, 'exp1', '{}')
+        for _ in range(2):
+            connector.job_finished(1, connector.job_started(eid, 1, "job"), 1.)
+        self.assertEqual(connector.get_best_result(eid)[1], 1.)
+        connector.close()
+        other = SQLiteConnector(self.db_file, busy_timeout=0.1)
+        self.assertTrue(other.free_used_resource(1))  # the database is not kept locked by the closed connector
+        other.close()
+
     def test_reset(self):
         connector = SQLiteConnector(self.db_file)
         eid = connector.start_experiment(self.name, 'exp1', '{}')
@@ -236,5 +337,194 @@ class SQLiteConnectorTestCase(unittest.TestCase):
         self.assertEqual(ir[jid2][1], 75.)
         self.assertEqual(ir[jid2][2], 100.)
 
+    def test_wal(self):
+        """Test WAL mode, with one connection by thread"""
+        connector = SQLiteConnector(self.db_file, wal=True, busy_timeout=5)
+        try:
+            self.assertEqual(connector.cursor.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+            self.assertEqual(connector.cursor.execute("PRAGMA synchronous").fetchone()[0], 1)  # NORMAL
+            eid = connector.start_experiment(self.name, 'exp1', '{}')
+            jids = [connector.job_started(eid, 1, "job%d" % i) for i in range(4)]
+
+            errors = []
+
+            def work(jid):
+                try:
+                    for i in range(20):
+                        connector.save_intermediate_result(jid, float(i))
+                        self.assertEqual(len(connector.get_intermediate_results_job(jid)), i + 1)
+                    connector.job_finished(1, jid, 1., status="FINISHED")
+                except Exception as e:  # pragma: no cover
+                    errors.append(e)
+
+            threads = [threading.Thread(target=work, args=(jid,)) for jid in jids]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            self.assertListEqual(errors, [])
+            ir = connector.get_intermediate_results_experiment(eid, status="FINISHED")
+            self.assertSetEqual(set(ir), set(jids))
+            self.assertListEqual(ir[jids[0]], [float(i) for i in range(20)])
+            self.assertGreaterEqual(len(connector._connections), 1)
+
+            # a failed write is rolled back and does not keep the database locked
+            self.assertRaises(sqlite3.IntegrityError, connector.start_job_attempt, 99, jids[0])
+            other = sqlite3.connect(self.db_file, timeout=1)
+            other.execute("UPDATE resource SET status='free'")
+            other.commit()
+            other.close()
+        finally:
+            connector.close()
+        self.assertTrue(connector.is_closed())
+        self.assertRaises(sqlite3.ProgrammingError, connector.get_resource_type)
+        for suffix in ("-wal", "-shm"):
+            if os.path.isfile(self.db_file + suffix):  # pragma: no cover
+                os.remove(self.db_file + suffix)
+
+    def test_wal_close(self):
+        """Test closing the connections in WAL mode while other threads read the database"""
+        connector = SQLiteConnector(self.db_file, wal=True, busy_timeout=5)
+        started, release = threading.Event(), threading.Event()
+        self.addCleanup(release.set)
+        results = []
+
+        @_reading
+        def slow_query(self):
+            self.cursor.execute("SELECT count(*) FROM resource")
+            started.set()
+            release.wait()
+            results.append(self.cursor.fetchone()[0])
+
+        reader = threading.Thread(target=slow_query, args=(connector,), daemon=True)
+        reader.start()
+        started.wait()
+        closer = threading.Thread(target=connector.close, daemon=True)
+        closer.start()
+        closer.join(0.5)
+        self.assertTrue(closer.is_alive())  # waits for the running query
+        release.set()
+        reader.join()
+        closer.join()
+        self.assertEqual(len(results), 1)
+        # the thread keeping its connection gets the same error as the others
+        self.assertRaises(sqlite3.ProgrammingError, slow_query, connector)
+        for suffix in ("-wal", "-shm"):
+            if os.path.isfile(self.db_file + suffix):  # pragma: no cover
+                os.remove(self.db_file + suffix)
+
+    def test_write_behind(self):
+        """Test queued intermediate and multiple results"""
+        connector = SQLiteConnector(self.db_file, flush_interval=3600, flush_rows=1000)
+        eid = connector.start_experiment(self.name, 'exp1', '{}')
+        jid = connector.job_started(eid, 1, "{}")
+        jid2 = connector.job_started(eid, 1, "{}")
+        other = sqlite3.connect(self.db_file)
+
+        def written():
+            return other.execute("SELECT count(*) FROM intermediate_result WHERE jid IS NOT NULL").fetchone()[0]
+
+        irids = []
+        for i in range(3):
+            irids.append(connector.save_intermediate_result(jid, float(i)))
+            connector.save_multiple_results(jid, irids[-1], eid, ["a", "b"], [float(i), -float(i)])
+        self.assertEqual(written(), 0)
+        self.assertListEqual(irids, list(range(irids[0], irids[0] + 3)))
+
+        # a result saved by another connection is written after the reserved block
+        other.execute("INSERT INTO intermediate_result (num, jid, score) VALUES (0, ?, 5.)", (jid2,))
+        other.commit()
+        self.assertGreater(other.execute("SELECT max(irid) FROM intermediate_result").fetchone()[0], irids[-1])
+
+        self.assertListEqual(connector.get_intermediate_results_job(jid), [0., 1., 2.])  # flushed before reading
+        self.assertEqual(written(), 4)
+        self.assertEqual(connector.save_intermediate_result(jid2, 6.), irids[-1] + 1)
+        connector.job_finished(1, jid2, 6., status="FINISHED")
+        self.assertListEqual(other.execute("SELECT num, score FROM intermediate_result WHERE jid=? ORDER BY num",
+                                           (jid2,)).fetchall(), [(0, 5.), (1, 6.)])
+        connector.set_last_multiple_results(eid, jid, 2)
+        self.assertListEqual(other.execute("""SELECT ir.num, mr.label_order, mr.value, mr.is_last_result
+                                           FROM multiple_result mr JOIN intermediate_result ir ON mr.irid = ir.irid
+                                           WHERE mr.jid=? ORDER BY mr.mrid""", (jid,)).fetchall(),
+                             [(0, 1, 0., 0), (0, 2, 0., 0), (1, 1, 1., 0), (1, 2, -1., 0),
+                              (2, 1, 2., 1), (2, 2, -2., 1)])
+
+        # rows are written when the queue is full
+        connector.flush_rows = 2
+        connector.save_intermediate_result(jid, 3.)
+        self.assertEqual(written(), 5)
+        connector.save_intermediate_result(jid, 4.)
+        self.assertEqual(written(), 7)
+        connector.save_intermediate_result(jid, 5.)
+        connector.close()
+        self.assertEqual(written(), 8)
+        self.assertEqual(other.execute("SELECT count(*) FROM intermediate_result WHERE jid IS NULL").fetchone()[0], 0)
+        other.close()
+
+    def test_write_behind_interleaved(self):
+        """Test a connector writing at once while another one queues the results, and the placeholders of a crash"""
+        queued = SQLiteConnector(self.db_file, flush_interval=3600)
+        immediate = SQLiteConnector(self.db_file)
+        eid = immediate.start_experiment(self.name, 'exp1', '{}')
+        jid, jid2 = immediate.job_started(eid, 1, "{}"), immediate.job_started(eid, 1, "{}")
+        irids = []
+        for i in range(3):
+            irids.append(queued.save_intermediate_result(jid, float(i)))
+            irids.append(immediate.save_intermediate_result(jid2, float(i)))
+        queued.flush()
+        self.assertEqual(len(set(irids)), 6)
+        self.assertListEqual(queued.get_intermediate_results_job(jid), [0., 1., 2.])
+        self.assertListEqual(queued.get_intermediate_results_job(jid2), [0., 1., 2.])
+        # the block reserved by the queued connector is skipped
+        self.assertGreater(min(irids[1::2]), max(irids[0::2]) + 1)
+
+        def placeholders():
+            return immediate.cursor.execute("SELECT count(*) FROM intermediate_result WHERE jid IS NULL").fetchone()[0]
+
+        # the placeholders of the running connectors are kept by the connectors starting
+        other = SQLiteConnector(self.db_file, flush_interval=3600)
+        self.assertEqual(placeholders(), 1)
+        irids.append(queued.save_intermediate_result(jid, 3.))  # still in the reserved block
+        irids.append(other.save_intermediate_result(jid2, 3.))  # in a new block
+        queued.flush()
+        other.flush()
+        self.assertEqual(len(set(irids)), 8)
+        self.assertEqual(placeholders(), 2)
+        queued.close()
+        other.close()
+        self.assertEqual(placeholders(), 0)
+        self.assertListEqual(immediate.get_intermediate_results_job(jid), [0., 1., 2., 3.])
+        self.assertListEqual(immediate.get_intermediate_results_job(jid2), [0., 1., 2., 3.])
+
+        # placeholder of a process which exited without closing its connector, and of another host
+        proc = subprocess.Popen(["sleep", "10"])
+        owner = placeholder_owner(proc.pid)
+        proc.kill()
+        proc.wait()
+        last = max(irids) + IRID_BLOCK
+        immediate.cursor.executemany("INSERT INTO intermediate_result (irid, owner) VALUES (?, ?)",
+                                     [(last, owner), (last + IRID_BLOCK, "other-" + owner)])
+        immediate.connector.commit()
+        SQLiteConnector(self.db_file).close()
+        self.assertEqual(placeholders(), 1)
+        immediate.close()
+
+    def test_write_behind_failure(self):
+        """Test the queued results are kept when they can't be written"""
+        connector = SQLiteConnector(self.db_file, busy_timeout=0.1, flush_interval=3600)
+        eid = connector.start_experiment(self.name, 'exp1', '{}')
+        jid = connector.job_started(eid, 1, "{}")
+        irid = connector.save_intermediate_result(jid, 1.)
+        connector.save_multiple_results(jid, irid, eid, ["a"], [1.])
+        other = sqlite3.connect(self.db_file)
+        other.execute("BEGIN EXCLUSIVE")
+        self.assertRaises(sqlite3.OperationalError, connector.flush)
+        other.rollback()
+        other.close()
+        connector.flush()
+        self.assertListEqual(connector.get_intermediate_results_job(jid), [1.])
+        self.assertEqual(connector.cursor.execute("SELECT count(*) FROM multiple_result").fetchone()[0], 1)
+        connector.close()
+
 if __name__ == '__main__':
     unittest.main()
@@ -7,6 +7,15 @@ from aup.Proposer import AbstractProposer as AP
 
 
 class AbstractTestCase(unittest.TestCase):
+    def test_to_space(self):
+        self.assertEqual(AP._to_space({"type": "int", "range": [0, 3]}, 2.0), 2)
+        self.assertIsNone(AP._to_space({"type": "int", "range": [0, 3]}, 2.5))
+        self.assertIsNone(AP._to_space({"type": "float", "range": [0, 1]}, 1.5))
+        self.assertIsNone(AP._to_space({"type": "float", "range": [0, 1]}, "0.5"))
+        self.assertEqual(AP._to_space({"type": "choice", "range": ["a", "b"]}, "b"), "b")
+        self.assertIsNone(AP._to_space({"type": "choice", "range": ["a", "b"]}, "c"))
+        self.assertEqual(AP.point_key({"a": 0.1 + 0.2}), AP.point_key({"a": 0.3}))
+
     def test_create_param_config(self):
         self.assertRaises(ValueError, AP.create_param_config, 'name', [0, 1], 'wrong_type')
         self.assertRaises(ValueError, AP.create_param_config, 'name', [0, 1, 2], 'int')
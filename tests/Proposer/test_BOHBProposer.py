@@ -33,6 +33,13 @@ class BOHBTestCase(TestCase):
             v = cf.get('choice')
             self.assertTrue(v in (1, 2, 3))
 
+    def test_warm_start(self):
+        from aup.Proposer import BOHBProposer as bohb
+        proposer = bohb.BOHBProposer({"parameter_config": self.config, "target": "min"})
+        proposer.warm_start([({"choice": 1 + i % 3, "float": 0.05 * i, "int": i % 10 + 1, "n_iterations": 1}, i)
+                             for i in range(20)])
+        self.assertIn(1, proposer.config_generator.kde_models)
+
     def test_nsample(self):
         from aup.Proposer import BOHBProposer as bohb
         proposer = bohb.BOHBProposer({"parameter_config":self.config,"target":"min"})
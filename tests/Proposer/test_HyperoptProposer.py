@@ -55,6 +55,58 @@ class HyperOptTestCase(unittest.TestCase):
         os.remove(sav)
         os.rmdir(path)
 
+    def test_get_batch(self):
+        p = hp.HyperoptProposer(self.pc)
+        for _ in range(2):
+            batch = p.get_batch(3)
+            self.assertEqual(len(batch), 3)
+            for c in batch:
+                p.increment_job_counter()
+                self.assertIn(c['x'], [0, 1])
+                p.update(c['y'], Job("none", c))
+        self.assertEqual(len(set(c['tid'] for c in batch)), 3)
+        self.assertEqual(len(p.trials), 6)
+
+    def test_prefetch_stale(self):
+        self.pc["n_samples"] = 30
+        p = hp.HyperoptProposer(self.pc)
+        for c in p.get_batch(20):
+            self.assertFalse(p.is_prefetch_stale())
+            p.increment_job_counter()
+            p.update(c['y'], Job("none", c))
+        self.assertTrue(p.is_prefetch_stale())  # tpe models the results after its startup trials
+
+        self.pc["engine"] = "rand"
+        p = hp.HyperoptProposer(self.pc)
+        for c in p.get_batch(20):
+            p.increment_job_counter()
+            p.update(c['y'], Job("none", c))
+        self.assertFalse(p.is_prefetch_stale())
+
+    def test_discard(self):
+        p = hp.HyperoptProposer(self.pc)
+        batch = p.get_batch(3)
+        self.assertFalse(p.is_prefetch_stale())
+        p.discard(batch[1:])
+        self.assertEqual(len(p.trials), 1)
+        p.increment_job_counter()
+        p.update(batch[0]['y'], Job("none", batch[0]))
+        discarded = set(c['tid'] for c in batch[1:])
+        batch = p.get_batch(2)
+        self.assertEqual(len(set(c['tid'] for c in batch)), 2)
+        self.assertFalse(discarded & set(c['tid'] for c in batch))
+        self.assertEqual(len(p.trials), 3)
+        self.assertListEqual(p.trials.tids, sorted(p.trials.tids))
+
+    def test_warm_start(self):
+        p = hp.HyperoptProposer(self.pc)
+        p.warm_start([({"x": 0, "y": 0.5, "z": 1.}, 1.), ({"x": 0, "y": 0.2, "z": 0}, 2.),
+                      ({"x": 1, "y": 0.5, "z": 1.}, 3.), ({"x": 0, "y": 2., "z": 1.}, 4.)])
+        self.assertEqual(len(p.trials), 2)
+        self.assertListEqual(sorted(p.trials.losses()), [1., 2.])
+        c = p.get()
+        self.assertEqual(c['tid'], 2)
+
     def test_failed(self):
         p = hp.HyperoptProposer(self.pc)
         c = p.get()
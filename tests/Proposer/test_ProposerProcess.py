@@ -0,0 +1,81 @@
+"""
+Copyright (c) 2018 LG Electronics Inc.
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+import unittest
+
+import os
+import tempfile
+import time
+
+from aup.EE.Job import Job
+from aup.Proposer import ProposerStatus
+from aup.Proposer.ProposerProcess import ProposerProcess
+
+
+class ProposerProcessTestCase(unittest.TestCase):
+    def setUp(self):
+        config = {'proposer': 'random', 'n_samples': 5, 'random_seed': 10,
+                  'parameter_config': [{'name': 'x', 'type': 'float'}],
+                  'proposer_process': {'prefetch': 2}}
+        self.p = ProposerProcess(config)
+
+    def tearDown(self):
+        self.p.close()
+
+    def test_get_batch(self):
+        self.assertEqual(self.p.nSamples, 5)
+        batch = self.p.get_batch(3)
+        self.assertEqual(len(batch), 3)
+        self.assertEqual(len(set(c['x'] for c in batch)), 3)
+        for c in batch:
+            self.p.increment_job_counter()
+            self.p.update(c['x'], Job("none", c))
+        self.assertEqual(len(self.p.get_batch(10)), 2)
+        self.assertEqual(self.p.counter, 3)
+
+        self.p.increment_job_counter()
+        self.p.increment_job_counter()
+        self.assertIsNone(self.p.get())
+        self.assertEqual(self.p.get_status(), ProposerStatus.FINISHED)
+
+    def test_save_reload(self):
+        self.assertIn('x', self.p.get())
+        self.p.increment_job_counter()
+        path = tempfile.mkdtemp()
+        sav = os.path.join(path, 'test.pkl')
+        self.p.save(sav)
+        self.p.increment_job_counter()
+        self.p.reload(sav)
+        self.assertEqual(self.p.counter, 1)
+        os.remove(sav)
+        os.rmdir(path)
+
+    def test_failed_update(self):
+        self.assertIn('x', self.p.get())
+        self.p.increment_job_counter()
+        self.p.update(1., None)  # fails in the worker
+        for _ in range(100):
+            if self.p.get_status() == ProposerStatus.FAILED:
+                break
+            time.sleep(0.05)
+        self.assertEqual(self.p.get_status(), ProposerStatus.FAILED)
+        self.assertListEqual(self.p.get_batch(1), [])
+
+        # the error is read before the reply of the next request
+        p = ProposerProcess({'proposer': 'random', 'n_samples': 5, 'random_seed': 10,
+                             'parameter_config': [{'name': 'x', 'type': 'float'}], 'proposer_process': {}})
+        try:
+            with tempfile.TemporaryDirectory() as path:
+                p.failed(None)
+                p.save(os.path.join(path, 'test.pkl'))
+                self.assertEqual(p.status, ProposerStatus.FAILED)
+        finally:
+            p.close()
+
+    def test_failed_init(self):
+        self.assertRaises(RuntimeError, ProposerProcess, {'proposer': 'random', 'proposer_process': {}})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -7,16 +7,21 @@ import unittest
 import os
 import tempfile
 
+from numpy import random
+
 from aup.EE.Job import Job
 from aup.Proposer import RandomProposer as rp
 
 
 class MyTestCase(unittest.TestCase):
+    def setUp(self):
+        self.rng = random.RandomState(0)
+
     def test_random_int(self):
         d = [1, 10]
         all_opt = set(range(1, 11))
         f = rp._random_int(d)
-        t = set(f() for _ in range(10000))
+        t = set(f(self.rng) for _ in range(10000))
         self.assertSetEqual(all_opt, t, "Low chance to miss numbers")
         self.assertRaises(ValueError, rp._random_int, [1, 2, 3])
 
@@ -24,7 +29,7 @@ class MyTestCase(unittest.TestCase):
         d = [-10, 10]
         f = rp._random_float(d)
         for i in range(100):
-            v = f()
+            v = f(self.rng)
             self.assertLessEqual(v, d[1])
             self.assertLessEqual(d[0], v)
         self.assertRaises(ValueError, rp._random_float, [1, 2, 3])
@@ -33,7 +38,7 @@ class MyTestCase(unittest.TestCase):
         d = [str(i) for i in range(10)]
         f = rp._random_choice(d)
         for i in range(100):
-            self.assertIn(f(), d)
+            self.assertIn(f(self.rng), d)
 
         self.assertRaises(ValueError, rp._random_choice, [])
 
@@ -61,6 +66,17 @@ class MyTestCase(unittest.TestCase):
         os.remove(sav)
         os.rmdir(path)
 
+    def test_own_random_state(self):
+        config = {'n_samples': 10, 'random_seed': 10, 'parameter_config': [{'name': 'x', 'type': 'float'}]}
+        m = rp.RandomProposer(dict(config))
+        expected = [m.get_param()['x'] for _ in range(3)]
+        m = rp.RandomProposer(dict(config))
+        values = [m.get_param()['x']]
+        rp.RandomProposer(dict(config, random_seed=11))  # e.g. created by another experiment of the scheduler
+        random.seed(0)
+        values += [m.get_param()['x'] for _ in range(2)]
+        self.assertListEqual(values, expected)
+
     def test_reset(self):
         config = {'n_samples': 10, 'random_seed': 10, 'parameter_config': [{'name': 'x', 'type': 'int'}]}
         m = rp.RandomProposer(config)
@@ -76,6 +92,25 @@ class MyTestCase(unittest.TestCase):
         m.increment_job_counter()
         self.assertEqual(m.counter, 1)
 
+    def test_get_batch(self):
+        config = {'n_samples': 5, 'random_seed': 10, 'parameter_config': [{'name': 'x', 'type': 'float'}]}
+        p = rp.RandomProposer(config)
+        batch = p.get_batch(3)
+        self.assertEqual(len(batch), 3)
+        self.assertEqual(len(set(c['x'] for c in batch)), 3)
+        self.assertEqual(p.counter, 0)
+        for _ in batch:
+            p.increment_job_counter()
+        self.assertEqual(len(p.get_batch(10)), 2)
+
+    def test_warm_start(self):
+        config = {'n_samples': 10, 'random_seed': 10, 'parameter_config': [{'name': 'x', 'type': 'int'}]}
+        p = rp.RandomProposer(config)
+        p.warm_start([({'x': 0}, 1.), ({'x': 5}, 1.)])
+        for _ in range(10):
+            self.assertEqual(p.get()['x'], 1)
+            p.increment_job_counter()
+
     def test_failed(self):
         config = {'n_samples': 10, 'random_seed': 10, 'parameter_config': [{'name': 'x', 'type': 'int'}]}
         p = rp.RandomProposer(config)
@@ -122,6 +122,32 @@ class SequenceTestCase(TestCase):
             rp.check_termination()
         self.assertTrue(param1 == {"x1": 10, "x2": "c"})
 
+    def test_batch(self):
+        self.pc["parameter_config"] = [
+            {"name": "x1", "type": "int", "range": [0, 2]},
+            {"name": "x2", "type": "choice", "range": ["a", "b"]}
+        ]
+        rp = get_proposer("sequence")(self.pc)
+        batch = rp.get_batch(4)
+        self.assertListEqual(batch, [{"x1": 0, "x2": "a"}, {"x1": 1, "x2": "a"},
+                                     {"x1": 2, "x2": "a"}, {"x1": 0, "x2": "b"}])
+        for _ in batch:
+            rp.increment_job_counter()
+        self.assertListEqual(rp.get_batch(4), [{"x1": 1, "x2": "b"}, {"x1": 2, "x2": "b"}])
+
+    def test_warm_start(self):
+        self.pc["parameter_config"] = [
+            {"name": "x1", "type": "int", "range": [0, 2]},
+            {"name": "x2", "type": "choice", "range": ["a", "b"]}
+        ]
+        rp = get_proposer("sequence")(self.pc)
+        rp.warm_start([({"x1": 0, "x2": "a"}, 1.), ({"x1": 2.0, "x2": "a", "tid": 1}, 2.),
+                       ({"x1": 3, "x2": "a"}, 3.), ({"x1": 1}, 4.)])
+        self.assertEqual(rp.nSamples, 4)
+        batch = rp.get_batch(10)
+        self.assertListEqual(batch, [{"x1": 1, "x2": "a"}, {"x1": 0, "x2": "b"},
+                                     {"x1": 1, "x2": "b"}, {"x1": 2, "x2": "b"}])
+
     def test_gen(self):
         self.assertRaises(KeyError, sp._AbstractGen.get_gen, {'type': 'wrong'})
 
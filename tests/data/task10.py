@@ -0,0 +1,20 @@
+#!/usr/bin/env python3
+
+from aup import aup_worker
+
+# counts the setups and trials of a warm worker
+
+setups = 0
+trials = 0
+
+def setup():
+  global setups
+  setups += 1
+
+def trial(config):
+  global trials
+  trials += 1
+  print("setup %d, trial %d" % (setups, trials))
+  return config["x"] + 10 * trials + 100 * setups
+
+aup_worker(trial, setup)
@@ -0,0 +1,13 @@
+#!/usr/bin/env python3
+
+import json
+import sys
+from time import sleep
+
+# reports an intermediate result, then hangs for x seconds (without importing aup, to start at once)
+
+with open(sys.argv[1]) as f:
+    config = json.load(f)
+print("#Auptimizer:1.5", flush=True)
+sleep(config["x"])
+print("#Auptimizer:%s" % config["x"])
@@ -0,0 +1,18 @@
+#!/usr/bin/env python3
+
+import os
+import signal
+import sys
+from aup import aup_args, print_result
+
+# exits with code -x if x < 0, is killed if x == 0
+
+@aup_args
+def exit_code(x):
+  if x < 0:
+    sys.exit(-x)
+  if x == 0:
+    os.kill(os.getpid(), signal.SIGKILL)
+  print_result(x)
+
+exit_code(sys.argv[1])
@@ -0,0 +1,12 @@
+#!/usr/bin/env python3
+
+import sys
+from aup import aup_args
+
+# y is only set by the call below, not by the configuration
+
+@aup_args
+def add(x, y=0):
+  return x + y
+
+add(sys.argv[1], y=10)
@@ -0,0 +1,14 @@
+#!/usr/bin/env python3
+
+import sys
+from aup import aup_args
+from time import sleep
+
+# silent for x seconds, to test hung jobs
+
+@aup_args
+def iteration(x):
+  sleep(x)
+  return x
+
+iteration(sys.argv[1])
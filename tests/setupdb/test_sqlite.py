@@ -2,7 +2,12 @@
 Copyright (c) 2018 LG Electronics Inc.
 SPDX-License-Identifier: GPL-3.0-or-later
 """
+import os
+import sqlite3
+import tempfile
 import unittest
+from unittest import mock
+
 from aup.setupdb import sqlite
 
 from six.moves.configparser import ConfigParser
@@ -14,6 +19,82 @@ class SQLITETestCase(unittest.TestCase):
     def test_createDB(self):
         self.assertRaises(Exception, sqlite.create_database, self.config, ['test'], 4, 'test')
 
+    def test_migrate(self):
+        db_file = os.path.join("tests", "data", "migrate.db")
+        config = ConfigParser()
+        config.add_section("Auptimizer")
+        config.set("Auptimizer", "SQLITE_FILE", db_file)
+        sqlite.create_database(config, ['test'], 1, 'test')
+        conn = sqlite3.connect(db_file)
+        try:
+            self.assertEqual(conn.execute("PRAGMA user_version").fetchone()[0], sqlite.SCHEMA_VERSION)
+            self.assertTupleEqual(sqlite.migrate(config), (sqlite.SCHEMA_VERSION, sqlite.SCHEMA_VERSION))
+
+            # database of an older version, with history
+            indexes = "SELECT name FROM sqlite_master WHERE type='index' AND sql IS NOT NULL"
+            for name, in conn.execute(indexes).fetchall():
+                conn.execute("DROP INDEX %s" % name)
+            conn.execute("DROP TABLE multiple_result")
+            conn.execute("INSERT INTO job (jid, eid, score, status) VALUES (1, 1, 0.5, 'FINISHED')")
+            # placeholder of a write-behind connector, written before the owner column
+            conn.execute("INSERT INTO intermediate_result (irid, num) VALUES (1024, ?)", (os.getpid(),))
+            conn.execute("PRAGMA user_version = 0")
+            conn.commit()
+            self.assertTupleEqual(sqlite.migrate(config), (0, sqlite.SCHEMA_VERSION))
+            # placeholders of a running process, of a process which exited (its ID being reused),
+            # of another host and without owner
+            host, pid, start = sqlite.placeholder_owner().rsplit(":", 2)
+            conn.executemany("INSERT INTO intermediate_result (irid, owner) VALUES (?, ?)",
+                             [(2048, sqlite.placeholder_owner()), (3072, "%s:%s:%d" % (host, pid, int(start) - 1)),
+                              (4096, "other-%s:%s:%s" % (host, pid, start)), (5120, None)])
+            conn.commit()
+            self.assertTupleEqual(sqlite.migrate(config), (sqlite.SCHEMA_VERSION, sqlite.SCHEMA_VERSION))
+            self.assertSetEqual({name for name, in conn.execute(indexes)},
+                                {"job_eid_idx", "intermediate_result_jid_idx", "multiple_result_eid_idx",
+                                 "job_attempt_jid_idx", "job_hash_idx"})
+            self.assertEqual(conn.execute("SELECT count(*) FROM multiple_result").fetchone()[0], 0)
+            self.assertEqual(conn.execute("SELECT score FROM job WHERE jid=1").fetchone()[0], 0.5)
+            self.assertListEqual(conn.execute("SELECT irid FROM intermediate_result ORDER BY irid").fetchall(),
+                                 [(1024,), (2048,), (4096,), (5120,)])
+            plan = conn.execute("EXPLAIN QUERY PLAN SELECT num, score FROM intermediate_result WHERE jid=? "
+                                "ORDER BY num", (1,)).fetchall()
+            self.assertIn("intermediate_result_jid_idx", str(plan))
+
+            conn.execute("PRAGMA user_version = %d" % (sqlite.SCHEMA_VERSION + 1))
+            conn.commit()
+            self.assertRaises(ValueError, sqlite.migrate, config)
+        finally:
+            conn.close()
+            os.remove(db_file)
+
+
+    def test_migrate_schema(self):
+        def schema(db_file):
+            conn = sqlite3.connect(db_file)
+            try:
+                tables = [name for name, in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")]
+                return {table: (conn.execute("PRAGMA table_info(%s)" % table).fetchall(),
+                                sorted(index[1:] + tuple(conn.execute("PRAGMA index_info(%s)" % index[1]).fetchall())
+                                       for index in conn.execute("PRAGMA index_list(%s)" % table)))
+                        for table in tables}
+            finally:
+                conn.close()
+
+        with tempfile.TemporaryDirectory() as path:
+            configs = []
+            for name in ("fresh.db", "baseline.db"):
+                config = ConfigParser()
+                config.add_section("Auptimizer")
+                config.set("Auptimizer", "SQLITE_FILE", os.path.join(path, name))
+                configs.append(config)
+            sqlite.create_database(configs[0], ['test'], 1, 'test')
+            with mock.patch.object(sqlite, "_migrate"):  # tables of the first version
+                sqlite.create_database(configs[1], ['test'], 1, 'test')
+            baseline = schema(os.path.join(path, "baseline.db"))
+            self.assertNotIn("job_hash", [column[1] for column in baseline["job"][0]])
+            self.assertTupleEqual(sqlite.migrate(configs[1]), (0, sqlite.SCHEMA_VERSION))
+            self.assertDictEqual(schema(os.path.join(path, "baseline.db")), schema(os.path.join(path, "fresh.db")))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -4,9 +4,11 @@ SPDX-License-Identifier: GPL-3.0-or-later
 """
 import unittest
 
+import io
 import json
 import os
 import pickle
+import sys
 
 from aup import BasicConfig
 
@@ -79,6 +81,22 @@ class BasicConfigTestCase(unittest.TestCase):
         self.assertEqual(data.b, 2)
         self.assertEqual(data["c"], 3)
 
+    def test_stream(self):
+        r, w = os.pipe()
+        with os.fdopen(w, "w") as f:
+            json.dump(self.d, f)
+        data = BasicConfig().load("/dev/fd/%d" % r)
+        self.assertDictEqual(self.d, data)
+        self.assertRaises(OSError, os.close, r)  # closed after reading
+
+        stdin = sys.stdin
+        sys.stdin = io.StringIO(json.dumps({"b": 2}))
+        try:
+            data = BasicConfig().load("-")
+        finally:
+            sys.stdin = stdin
+        self.assertEqual(data.b, 2)
+
     def test_type(self):
         data = BasicConfig()
         self.assertRaises(TypeError, data.load, self.wrong_read)
@@ -0,0 +1,36 @@
+"""
+Copyright (c) 2018 LG Electronics Inc.
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+import shutil
+import tempfile
+import unittest
+
+from aup import benchmark
+
+
+class BenchmarkTestCase(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_cpu(self):
+        run = benchmark.run_benchmark("random", "cpu", "interm", self.folder, n_samples=4, n_parallel=2, steps=3)
+        self.assertEqual(run["jobs"], 4)
+        self.assertEqual(run["finished_jobs"], 4)
+        self.assertGreater(run["jobs_per_second"], 0)
+        self.assertLessEqual(run["dispatch_latency"]["p50"], run["dispatch_latency"]["p99"])
+        self.assertGreaterEqual(run["db_calls_per_job"], run["db_writes_per_job"])
+        self.assertEqual(run["metrics"]["aup_job_runtime_seconds"]["count"], 4)
+        self.assertEqual(run["metrics"]["aup_sqlite_call_seconds{call=save_intermediate_result}"]["count"], 12)
+
+    def test_passive(self):
+        run = benchmark.run_benchmark("sequence", "passive", "noop", self.folder, n_samples=3)
+        self.assertEqual(run["n_parallel"], 1)
+        self.assertEqual(run["finished_jobs"], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
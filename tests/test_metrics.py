@@ -0,0 +1,53 @@
+"""
+Copyright (c) 2018 LG Electronics Inc.
+SPDX-License-Identifier: GPL-3.0-or-later
+"""
+import unittest
+from urllib.request import urlopen
+
+from aup import metrics
+
+
+class MetricsTestCase(unittest.TestCase):
+    def test_registry(self):
+        registry = metrics.Registry()
+        counter = registry.counter("test_total", "count")
+        self.assertIs(counter, registry.counter("test_total", "count"))
+        self.assertRaises(ValueError, registry.histogram, "test_total", "count")
+        counter.inc(call="a")
+        counter.inc(2, call="a")
+        self.assertEqual(counter.get(call="a"), 3)
+
+        histogram = registry.histogram("test_seconds", "time", buckets=(0.1, 1))
+        histogram.observe(0.05, call="a")
+        histogram.observe(0.5, call="a")
+        with histogram.time(call="b"):
+            pass
+        self.assertEqual(histogram.count(call="a"), 2)
+        self.assertEqual(histogram.count(call="b"), 1)
+
+        text = registry.render()
+        self.assertIn("# TYPE test_total counter", text)
+        self.assertIn('test_total{call="a"} 3', text)
+        self.assertIn("# TYPE test_seconds histogram", text)
+        self.assertIn('test_seconds_bucket{call="a",le="0.1"} 1', text)
+        self.assertIn('test_seconds_bucket{call="a",le="1.0"} 2', text)
+        self.assertIn('test_seconds_bucket{call="a",le="+Inf"} 2', text)
+        self.assertIn('test_seconds_count{call="a"} 2', text)
+        self.assertIn("test_total=3", registry.summary())
+        self.assertIn("test_seconds=3/", registry.summary())
+
+    def test_exporter(self):
+        registry = metrics.Registry()
+        registry.counter("test_total", "count").inc()
+        exporter = metrics.MetricsExporter({"port": 0, "log_interval": 0}, registry=registry)
+        try:
+            with urlopen("http://127.0.0.1:%d/metrics" % exporter.port, timeout=5) as response:
+                self.assertIn("text/plain", response.headers["Content-Type"])
+                self.assertIn("test_total 1", response.read().decode("utf-8"))
+        finally:
+            exporter.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
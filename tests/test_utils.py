@@ -73,6 +73,22 @@ class UtilTestCase(unittest.TestCase):
         self.assertEqual(v.strip(), "#Auptimizer:0.1")
         sys.stderr = tmp_out
 
+    def test_result_channel(self):
+        r, w = os.pipe()
+        tmp_out = sys.stderr
+        sys.stderr = StringIO()
+        os.environ["AUP_RESULT_FD"] = str(w)
+        try:
+            utils.print_result([0.1, 2])
+        finally:
+            del os.environ["AUP_RESULT_FD"]
+            sys.stderr = tmp_out
+            os.close(w)
+        with os.fdopen(r, "rb") as f:
+            message = f.readline()
+        self.assertListEqual(utils.parse_result_message(message), [0.1, 2.])
+        self.assertListEqual(utils.parse_result_message('{"result": "0.5"}'), [0.5])
+
     def test_set_default_keyvalue(self):
         d = {}
         nd = utils.set_default_keyvalue("a", "b", d, inplace=False)
@@ -5,8 +5,13 @@ SPDX-License-Identifier: GPL-3.0-or-later
 import unittest
 from six import PY2
 from os import path
+import importlib
+import subprocess
+import sys
 from aup import aup_args
 
+aup_module = importlib.import_module("aup.aup")  # `aup.aup` is the package, rebound by `import aup.compression`
+
 @unittest.skipIf(PY2, "Wrapper supports Python3 only.")
 class WrapperTestCase(unittest.TestCase):
     file1 = path.join("tests", "data", "wrapper1.json")
@@ -52,6 +57,29 @@ class WrapperTestCase(unittest.TestCase):
         iteration(self.file2)
         self.assertEqual(var, 7)
 
+    def test_fork_targets(self):
+        global var
+
+        var = 0
+        targets = aup_module._fork_targets = []
+        try:
+            @aup_args
+            def test4(x):
+                return x
+            test4(self.file1)
+        finally:
+            aup_module._fork_targets = None
+        self.assertEqual(var, 0)
+        self.assertEqual(len(targets), 1)
+        targets[0](self.file1)
+        self.assertEqual(var, 1)
+
+    def test_worker_script(self):
+        # outside of a warm worker, setup and trial run once
+        output = subprocess.check_output([sys.executable, path.join("tests", "data", "task10.py"), self.file1],
+                                         stderr=subprocess.STDOUT)
+        self.assertIn(b"#Auptimizer:111", output)
+
 # check that this is called before
 # each "aup_args annotated" function call
 # because it contains "init" in its name